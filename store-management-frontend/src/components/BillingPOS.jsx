@@ -12,7 +12,7 @@ import {
   FaCashRegister, FaUser, FaPercentage, FaBox
 } from 'react-icons/fa';
 
-import { fetchProducts, fetchProductDetail, createSaleInvoice } from '../services/api';
+import { searchProducts, fetchProductDetail, createSaleInvoice } from '../services/api';
 
 const initialFormData = {
   product: '',
@@ -38,25 +38,25 @@ const BillingPOS = () => {
   const [error, setError] = useState(null);
   const [success, setSuccess] = useState(null);
 
-  useEffect(() => {
-    const loadProducts = async () => {
-      try {
-        const response = await fetchProducts();
-        const processed = response.data.map(p => ({
-          ...p,
-          mrp: parseFloat(p.mrp) || 0
-        }));
-        setProducts(processed);
-      } catch (err) {
-        setError("Failed to load products.");
-      }
-    };
-    loadProducts();
-  }, []);
+  // Server-side search returns a slim payload (id, name, mrp, stock_quantity)
+  const loadProducts = async (term) => {
+    try {
+      const response = await searchProducts(term, 50);
+      const processed = response.data.map(p => ({
+        ...p,
+        mrp: parseFloat(p.mrp) || 0
+      }));
+      setProducts(processed);
+    } catch (err) {
+      setError("Failed to load products.");
+    }
+  };
 
-  const filteredProducts = products.filter(p =>
-    p.name.toLowerCase().includes(searchTerm.toLowerCase())
-  );
+  // Debounce typing so we query once the cashier pauses
+  useEffect(() => {
+    const timer = setTimeout(() => loadProducts(searchTerm), 200);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
 
   const handleChange = (e) => {
     const { name, value } = e.target;
@@ -180,8 +180,7 @@ const BillingPOS = () => {
       setDiscountRate(0);
       setSelectedProductDetails(null);
 
-      const updated = await fetchProducts();
-      setProducts(updated.data.map(p => ({ ...p, mrp: parseFloat(p.mrp) || 0 })));
+      await loadProducts(searchTerm);
 
     } catch (err) {
       setError("Sale failed. Check details.");
@@ -225,7 +224,7 @@ const BillingPOS = () => {
                   </tr>
                 </thead>
                 <tbody>
-                  {filteredProducts.map(p => (
+                  {products.map(p => (
                     <tr
                       key={p.id}
                       onClick={() => handleProductSelect(p.id)}
@@ -234,8 +233,8 @@ const BillingPOS = () => {
                       <td>{p.name}</td>
                       <td>₹{p.mrp.toFixed(2)}</td>
                       <td>
-                        <Badge bg={p.stock_details?.quantity > 0 ? "success" : "danger"}>
-                          {p.stock_details?.quantity || 0}
+                        <Badge bg={p.stock_quantity > 0 ? "success" : "danger"}>
+                          {p.stock_quantity || 0}
                         </Badge>
                       </td>
                     </tr>
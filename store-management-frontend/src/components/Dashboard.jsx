@@ -1,14 +1,38 @@
 // store-management-frontend/src/components/Dashboard.jsx
 
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Container, Row, Col, Card, Alert, Table, Badge, Spinner } from 'react-bootstrap';
 
 import { 
     fetchDashboardStats, 
-    fetchLowStockList, 
+    fetchLowStockChanges, 
     fetchProfitMargins 
 } from '../services/api';
 
+// How often the low-stock list is refreshed from the change feed
+const LOW_STOCK_POLL_MS = 30000;
+
+// Applies low-stock feed entries (oldest first) to the list shown on the dashboard
+const applyLowStockChanges = (products, changes) => {
+  const byId = new Map(products.map(p => [p.id, p]));
+  changes.forEach(change => {
+    if (change.is_low) {
+      byId.set(change.product, {
+        id: change.product,
+        name: change.name,
+        category_name: change.category_name,
+        stock_details: {
+          quantity: change.quantity,
+          low_stock_threshold: change.low_stock_threshold,
+        },
+      });
+    } else {
+      byId.delete(change.product);
+    }
+  });
+  return [...byId.values()].sort((a, b) => a.name.localeCompare(b.name));
+};
+
 // Icons
 import { 
     FaBoxOpen, 
@@ -26,6 +50,7 @@ const Dashboard = () => {
   const [loading, setLoading] = useState(true);
   const [marginLoading, setMarginLoading] = useState(true);
   const [error, setError] = useState(null);
+  const lowStockCursor = useRef(null);
 
   // Fetch Dashboard + Low Stock + Profit
   useEffect(() => {
@@ -33,12 +58,13 @@ const Dashboard = () => {
       try {
         const [statsRes, lowStockRes, marginRes] = await Promise.all([
           fetchDashboardStats(),
-          fetchLowStockList(),
+          fetchLowStockChanges(),
           fetchProfitMargins(),
         ]);
 
         setStats(statsRes.data);
-        setLowStockProducts(lowStockRes.data);
+        lowStockCursor.current = lowStockRes.data.cursor;
+        setLowStockProducts(applyLowStockChanges([], lowStockRes.data.changes));
         setMargins(marginRes.data);
 
         setLoading(false);
@@ -55,6 +81,29 @@ const Dashboard = () => {
     loadDashboardData();
   }, []);
 
+  // Poll the low-stock feed: only changes since the last cursor come back
+  useEffect(() => {
+    const pollLowStock = async () => {
+      if (lowStockCursor.current === null) return;
+      try {
+        let more = true;
+        while (more) {
+          const res = await fetchLowStockChanges(lowStockCursor.current);
+          lowStockCursor.current = res.data.cursor;
+          more = res.data.more;
+          if (res.data.changes.length > 0) {
+            setLowStockProducts(prev => applyLowStockChanges(prev, res.data.changes));
+          }
+        }
+      } catch (err) {
+        console.error("Low stock refresh failed:", err);
+      }
+    };
+
+    const timer = setInterval(pollLowStock, LOW_STOCK_POLL_MS);
+    return () => clearInterval(timer);
+  }, []);
+
   if (loading) {
     return (
       <Container className="mt-5 text-center">
@@ -138,7 +187,9 @@ const Dashboard = () => {
           <Card className="text-center bg-white h-100 shadow">
             <Card.Body>
               <FaChartLine className="icon-large text-info mb-3" size={45} />
-              <Card.Title className="text-muted">Revenue (Last 7 Days)</Card.Title>
+              <Card.Title className="text-muted">
+                Revenue since {new Date(`${stats.recent_revenue_since}T00:00`).toLocaleDateString()}
+              </Card.Title>
               <Card.Text className="fs-3 fw-bold text-dark">
                 ₹ {stats.recent_revenue.toLocaleString()}
               </Card.Text>
@@ -138,10 +138,13 @@ export const fetchSuppliers = () => api.get('/suppliers/');
 export const fetchPurchases = () => api.get('/purchases/'); 
 export const fetchDashboardStats = () => api.get('/dashboard/stats/');
 export const fetchLowStockList = () => api.get('/dashboard/low-stock/');
+// Incremental low-stock feed: omit `since` for the current list, then poll with the returned cursor
+export const fetchLowStockChanges = (since) => api.get('/dashboard/low-stock/changes/', { params: since === undefined ? {} : { since } });
 export const fetchSalesHistory = () => api.get('/history/sales/');
 export const fetchPurchaseHistory = () => api.get('/history/purchases/');
 export const fetchProfitMargins = () => api.get('/dashboard/margins/');
 export const fetchProductDetail = (id) => api.get(`/products/${id}/`);
+export const searchProducts = (q, limit = 20) => api.get('/products/search/', { params: { q, limit } });
 
 // --- PRODUCT OPERATIONS (CRUD) ---
 export const createProduct = (productData) => api.post('/products/', productData);
@@ -158,13 +161,23 @@ export const deleteSupplier = (supplierId) => api.delete(`/suppliers/${supplierI
 export const createPurchase = (purchaseData) => api.post('/purchases/', purchaseData); 
 export const updatePurchase = (purchaseId, purchaseData) => api.put(`/purchases/${purchaseId}/`, purchaseData);
 export const deletePurchase = (purchaseId) => api.delete(`/purchases/${purchaseId}/`);
+// Whole supplier delivery in one request: { supplier, invoice_number, lines: [...] }
+export const receiveGoods = (receiptData) => api.post('/purchases/bulk/', receiptData);
 
 // --- SALES OPERATIONS (CUD) ---
 export const createSaleInvoice = (invoiceData) => api.post('/sales/', invoiceData);
 export const updateSaleInvoice = (invoiceId, invoiceData) => api.put(`/sales/${invoiceId}/`, invoiceData); 
+// Offline till sync: a list of bills, each reported back as created or failed
+export const bulkIngestSales = (invoices) => api.post('/sales/bulk/', invoices);
 
 // --- EXPORT / REPORTS ---
 export const exportSalesCSV = () => api.get('/export/sales/', { responseType: 'blob' }); 
+// params: { days, category, supplier, include_expired, group_by: 'product' | 'category' | 'supplier' }
+export const fetchNearExpiry = (params) => api.get('/reports/near-expiry/', { params });
+// params: { from, to, period: 'day' | 'week' | 'month' | 'year', supplier, product }
+export const fetchSupplierAnalytics = (params) => api.get('/reports/suppliers/', { params });
+// params: { all: true } to include products that are not due for reordering
+export const fetchReorderSuggestions = (params) => api.get('/reorder-suggestions/', { params });
 
 // --- AUTHENTICATION FUNCTIONS (Use publicApi for token and register) ---
 
@@ -0,0 +1,140 @@
+# inventory/async_views.py
+
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.http import JsonResponse
+from rest_framework import exceptions
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .cache import add_validators, check_validators
+from .models import Batch
+from .serializers import ProductValuesSerializer
+from .views import DashboardStatsView, LowStockListView, ProfitMarginView
+
+# Async (ASGI) variants of the dashboard read endpoints, under /api/async/.
+# DRF views are synchronous, so these are plain Django async views that run
+# DRF's authenticators themselves and return the same JSON as the sync views.
+
+
+def _json(data, status=200):
+    # DRF's encoder, so decimals and dates render as in the sync views
+    return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder)
+
+
+def _authenticate(request):
+    for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        result = authenticator().authenticate(request)
+        if result is not None:
+            return result[0]
+    return None
+
+
+def _unauthorized(request, detail):
+    response = _json({'detail': detail}, status=401)
+    response['WWW-Authenticate'] = api_settings.DEFAULT_AUTHENTICATION_CLASSES[0]().authenticate_header(request)
+    return response
+
+
+def async_api_view(validator_namespaces=()):
+    """
+    Wraps an async view: requires an authenticated user (the same
+    authenticators as the DRF views), turns DRF's ValidationError into a 400,
+    and answers conditional GETs from the `validator_namespaces` versions
+    (see inventory.cache) before the view runs.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            try:
+                user = await sync_to_async(_authenticate)(request)
+            except exceptions.AuthenticationFailed as exc:
+                return _unauthorized(request, exc.detail)
+            if user is None or not user.is_active:
+                return _unauthorized(request, exceptions.NotAuthenticated.default_detail)
+            request.user = user
+
+            if validator_namespaces:
+                not_modified, etag, last_modified = await sync_to_async(check_validators)(
+                    request, validator_namespaces
+                )
+                if not_modified is not None:
+                    return add_validators(not_modified, etag, last_modified)
+            try:
+                response = await view(request, *args, **kwargs)
+            except exceptions.ValidationError as exc:
+                return _json(exc.detail, status=400)
+            if validator_namespaces and response.status_code == 200:
+                add_validators(response, etag, last_modified)
+            return response
+        return wrapped
+    return decorator
+
+
+def _release_request_connections():
+    # Hands the request thread's connections back (to the pool, with the
+    # pooled backends) so it holds none while the fan-out queries wait for theirs
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+def _on_own_connection(query):
+    def run():
+        close_old_connections()
+        try:
+            return query()
+        finally:
+            # Closes the worker thread's connection unless CONN_MAX_AGE keeps it
+            close_old_connections()
+    return run
+
+
+async def run_concurrently(*queries):
+    """
+    Runs independent, synchronous ORM callables at the same time.
+
+    Django's async ORM (aget, async for, ...) runs every query of a request
+    on one thread, one after another, so gathering those gains nothing. With
+    ASYNC_QUERY_CONCURRENCY each callable gets its own worker thread, and
+    so its own database connection, and the queries overlap in the
+    database. They then also run outside the request's transaction.
+
+    The request thread's own connection is released first: otherwise, with a
+    pool of N connections, N requests each holding one while waiting for
+    more would exhaust it between them.
+
+    Returns: The callables' results, in order.
+    """
+    if not getattr(settings, 'ASYNC_QUERY_CONCURRENCY', True):
+        return [await sync_to_async(query)() for query in queries]
+    await sync_to_async(_release_request_connections)()
+    return await asyncio.gather(*(
+        sync_to_async(_on_own_connection(query), thread_sensitive=False)() for query in queries
+    ))
+
+
+@async_api_view(validator_namespaces=('snapshot',))
+async def dashboard_stats(request):
+    # One single-row read (it may roll the revenue window, a write)
+    return _json(await sync_to_async(DashboardStatsView.stats)())
+
+
+@async_api_view(validator_namespaces=('product',))
+async def low_stock_list(request):
+    # Products and their in-stock batches are independent queries: run both at once
+    products, batches = await run_concurrently(
+        lambda: list(ProductValuesSerializer().values(LowStockListView.products())),
+        lambda: list(ProductValuesSerializer.active_batch_rows(Batch.objects.filter(product__stock__is_low=True))),
+    )
+    return _json(ProductValuesSerializer(batch_rows=batches).to_representation(products))
+
+
+@async_api_view()
+async def profit_margins(request):
+    rows = ProfitMarginView.margins(request)
+    return _json([row async for row in rows])
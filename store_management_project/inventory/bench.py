@@ -0,0 +1,340 @@
+# inventory/bench.py
+
+import asyncio
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.db.utils import load_backend
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .cache import catalogue_cache
+from .models import Category, Product
+from .utils import ingest_sales, receive_goods
+
+BASELINE_PATH = Path(__file__).with_name('bench_baseline.json')
+
+# Per unit of scale
+PRODUCTS = 50
+INVOICES = 200
+BATCHES_PER_PRODUCT = 3
+LINES_PER_INVOICE = 3
+HISTORY_DAYS = 30
+
+# Smallest baseline the tolerance is applied to, per metric
+NOISE_FLOORS = {'wall_ms': 5, 'peak_kb': 64}
+
+
+def generate(scale=1, seed=1234):
+    """
+    Builds a synthetic store through the real write paths: PRODUCTS * scale
+    products in five categories, BATCHES_PER_PRODUCT batches each (one goods
+    receipt) and INVOICES * scale bills spread over the last HISTORY_DAYS days.
+
+    Returns: The list of products created.
+    """
+    rng = random.Random(seed)
+    categories = [Category.objects.get_or_create(name=f'Bench category {i}')[0] for i in range(5)]
+
+    # 1. Catalogue (one by one, so the search index and snapshot receivers run)
+    products = [
+        Product.objects.create(
+            name=f'Bench product {i:05d}', category=categories[i % len(categories)],
+            base_price=Decimal('10.00'), mrp=Decimal('12.00'),
+        )
+        for i in range(PRODUCTS * scale)
+    ]
+
+    # 2. Stock: one delivery, several batches per product with spread-out expiries
+    today = timezone.localdate()
+    receive_goods([
+        {
+            'product_id': product.id,
+            'purchase_quantity': 10 * INVOICES * scale,
+            'unit_purchase_price': Decimal(rng.randint(100, 900)) / 100,
+            'batch_number_input': f'BENCH-{b}',
+            'batch_number': f'BENCH-{b}',
+            'expiry_date': today + timedelta(days=rng.randint(30, 900)),
+        }
+        for product in products for b in range(BATCHES_PER_PRODUCT)
+    ], invoice_number='BENCH')
+
+    # 3. Sales history, uploaded the way offline tills do it
+    now = timezone.now()
+    bills = [
+        {
+            'customer_name': 'Bench',
+            'discount_rate': Decimal('0.00'),
+            'tax_rate': Decimal('5.00'),
+            'sale_date': now - timedelta(minutes=rng.randint(0, HISTORY_DAYS * 24 * 60)),
+            'items': [
+                (product.id, rng.randint(1, 5), Decimal('12.00'))
+                for product in rng.sample(products, LINES_PER_INVOICE)
+            ],
+        }
+        for _ in range(INVOICES * scale)
+    ]
+    for start in range(0, len(bills), 500):
+        ingest_sales(bills[start:start + 500])
+    return products
+
+
+def scenarios(products):
+    """(name, method, path, payload) for each hot path the suite measures."""
+    product = products[0]
+    return [
+        ('product_list', 'get', '/api/products/', None),
+        ('product_list_page', 'get', '/api/products/?page_size=50', None),
+        ('sale_create', 'post', '/api/sales/', {
+            'customer_name': 'Bench',
+            'items': [
+                {'product': p.id, 'sold_quantity': 1, 'unit_sale_price': '12.00'} for p in products[:LINES_PER_INVOICE]
+            ],
+        }),
+        ('dashboard_stats', 'get', '/api/dashboard/stats/', None),
+        ('profit_margins', 'get', '/api/dashboard/margins/?group_by=product', None),
+        ('sales_export', 'get', '/api/export/sales/?detail=items', None),
+        ('purchase_create', 'post', '/api/purchases/', {
+            'product': product.id, 'purchase_quantity': 5, 'unit_purchase_price': '3.00',
+            'batch_number_input': 'BENCH-NEW',
+        }),
+    ]
+
+
+def _request(client, method, path, payload):
+    response = getattr(client, method)(path, payload, format='json')
+    if response.streaming:
+        b''.join(response.streaming_content)
+    if response.status_code >= 400:
+        raise AssertionError(f"{method.upper()} {path} returned {response.status_code}")
+    return response
+
+
+def measure(client, method, path, payload=None, repeat=3):
+    """
+    Runs one request `repeat` times for the median wall time, then once more
+    with query capture and tracemalloc (which would skew the timing).
+
+    Returns: A dict with queries, wall_ms and peak_kb.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        _request(client, method, path, payload)
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            _request(client, method, path, payload)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'queries': len(queries),
+        'wall_ms': round(statistics.median(timings) * 1000, 2),
+        'peak_kb': round(peak / 1024),
+    }
+
+
+def run(scale=1, repeat=3):
+    """Generates data at `scale` and measures every scenario; returns {scenario: measurements}."""
+    products = generate(scale)
+    user, _ = User.objects.get_or_create(username='bench')
+    client = APIClient()
+    client.force_authenticate(user)
+    # Measure the database paths: a cache hit would hide query-count regressions
+    enabled, catalogue_cache.enabled = catalogue_cache.enabled, False
+    try:
+        return {
+            name: measure(client, method, path, payload, repeat)
+            for name, method, path, payload in scenarios(products)
+        }
+    finally:
+        catalogue_cache.enabled = enabled
+
+
+def load_baseline(scale):
+    """Stored measurements for `scale`, or None."""
+    if not BASELINE_PATH.exists():
+        return None
+    return json.loads(BASELINE_PATH.read_text()).get(str(scale))
+
+
+def save_baseline(scale, results):
+    baselines = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    baselines[str(scale)] = results
+    BASELINE_PATH.write_text(json.dumps(baselines, indent=2, sort_keys=True) + '\n')
+
+
+def regressions(results, baseline, tolerance=3.0):
+    """
+    Compares results with a baseline. Query counts may not grow at all; wall
+    time and peak memory may grow up to `tolerance` times (machines differ).
+
+    Returns: A list of human-readable regression messages (empty if none).
+    """
+    problems = []
+    for name, measured in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if measured['queries'] > expected['queries']:
+            problems.append(f"{name}: {measured['queries']} queries (baseline {expected['queries']})")
+        for metric, floor in NOISE_FLOORS.items():
+            # Tiny baselines are mostly noise; give them a floor before applying the tolerance
+            limit = max(expected[metric], floor) * tolerance
+            if measured[metric] > limit:
+                problems.append(f"{name}: {metric} {measured[metric]} (baseline {expected[metric]}, limit {limit:g})")
+    return problems
+
+
+# Dashboard reads served both by the sync DRF views and by inventory.async_views
+CONCURRENT_PATHS = {
+    'dashboard_stats': 'dashboard/stats/',
+    'low_stock': 'dashboard/low-stock/',
+    'profit_margins': 'dashboard/margins/?group_by=product',
+}
+
+
+def _summary(latencies, wall):
+    latencies = sorted(latencies)
+    return {
+        'requests_per_s': round(len(latencies) / wall, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2),
+        'p95_ms': round(latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000, 2),
+    }
+
+
+def load_sync(path, token, requests, concurrency):
+    """`requests` GETs of a sync view from `concurrency` threads (WSGI-style, a thread per request)."""
+    def fetch(_):
+        started = time.perf_counter()
+        response = Client().get(path, HTTP_AUTHORIZATION=token)
+        if response.status_code != 200:
+            raise AssertionError(f"GET {path} returned {response.status_code}")
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(fetch, range(requests)))
+    return _summary(latencies, time.perf_counter() - started)
+
+
+def load_async(path, token, requests, concurrency):
+    """`requests` GETs of an async view through the ASGI handler, at most `concurrency` in flight."""
+    async def run():
+        client = AsyncClient()
+        limit = asyncio.Semaphore(concurrency)
+
+        async def fetch():
+            async with limit:
+                started = time.perf_counter()
+                response = await client.get(path, headers={'Authorization': token})
+                if response.status_code != 200:
+                    raise AssertionError(f"GET {path} returned {response.status_code}")
+                return time.perf_counter() - started
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(fetch() for _ in range(requests)))
+        return _summary(latencies, time.perf_counter() - started)
+    return asyncio.run(run())
+
+
+def run_concurrent(token, requests=200, concurrency=20):
+    """Returns {scenario: {'sync': summary, 'async': summary}} for every CONCURRENT_PATHS entry."""
+    return {
+        name: {
+            'sync': load_sync(f'/api/{path}', token, requests, concurrency),
+            'async': load_async(f'/api/async/{path}', token, requests, concurrency),
+        }
+        for name, path in CONCURRENT_PATHS.items()
+    }
+
+
+# Connection handling compared by connection_load(): (label, pooled engine?, CONN_MAX_AGE)
+CONNECTION_PROFILES = [
+    ('fresh', False, 0),
+    ('persistent', False, 60),
+    ('pooled', True, 0),
+]
+POOLED_ENGINES = {
+    'django.db.backends.mysql': 'inventory.db.backends.mysql',
+    'django.db.backends.sqlite3': 'inventory.db.backends.sqlite3',
+}
+
+
+def connection_load(settings_dict, threads=8, requests=100, query='SELECT 1'):
+    """
+    Simulates `requests` API requests on each of `threads` threads for every
+    CONNECTION_PROFILES entry, against the database of `settings_dict`. Each
+    thread has its own connection object, as in Django. Around every request
+    it does what Django's request_started / request_finished handlers do
+    (close_if_unusable_or_obsolete), and runs `query` in between.
+
+    Returns: {profile: {'connections_opened', 'requests_per_s', 'avg_ms'}}
+    """
+    stock_engine = {pooled: stock for stock, pooled in POOLED_ENGINES.items()}.get(
+        settings_dict['ENGINE'], settings_dict['ENGINE']
+    )
+    results = {}
+    for label, pooled, max_age in CONNECTION_PROFILES:
+        profile = {
+            **settings_dict,
+            'ENGINE': POOLED_ENGINES[stock_engine] if pooled else stock_engine,
+            'CONN_MAX_AGE': max_age,
+            'CONN_HEALTH_CHECKS': True,
+            'POOL': {**(settings_dict.get('POOL') or {}), 'SIZE': threads},
+        }
+        alias = f'bench_{label}'
+        opened = []
+
+        def count(sender, connection, **kwargs):
+            # connect() on a pooled backend may just check a connection out of the pool
+            if connection.alias == alias and not getattr(connection, '_pool_reused', False):
+                opened.append(1)
+
+        def client(_):
+            wrapper = load_backend(profile['ENGINE']).DatabaseWrapper(profile, alias)
+            latencies = []
+            for _ in range(requests):
+                started = time.perf_counter()
+                wrapper.close_if_unusable_or_obsolete()
+                with wrapper.cursor() as cursor:
+                    cursor.execute(query)
+                    cursor.fetchall()
+                wrapper.close_if_unusable_or_obsolete()
+                latencies.append(time.perf_counter() - started)
+            wrapper.close()
+            return latencies
+
+        connection_created.connect(count)
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(threads) as pool:
+                latencies = [latency for thread in pool.map(client, range(threads)) for latency in thread]
+            wall = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(count)
+            if pooled:
+                load_backend(profile['ENGINE']).DatabaseWrapper(profile, alias).pool.close_idle()
+
+        results[label] = {
+            'connections_opened': len(opened),
+            'requests_per_s': round(len(latencies) / wall, 1),
+            'avg_ms': round(statistics.mean(latencies) * 1000, 3),
+        }
+    return results
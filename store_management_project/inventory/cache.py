@@ -0,0 +1,207 @@
+# inventory/cache.py
+
+import hashlib
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+# Which cached payloads each model's rows appear in. Product payloads embed
+# the category name, the stock row and the active batches.
+NAMESPACES_BY_MODEL = {
+    'inventory.Category': ('category', 'product'),
+    'inventory.Supplier': ('supplier',),
+    'inventory.Product': ('product',),
+    'inventory.Stock': ('product',),
+    'inventory.Batch': ('product',),
+}
+
+# Bumped by InventorySnapshot whenever the dashboard figures change
+NAMESPACES = ('category', 'supplier', 'product', 'snapshot')
+
+
+class CatalogueCache:
+    """
+    Read-through cache for serialized catalogue payloads (category, supplier
+    and product lists and details), stored in one of Django's caches.
+
+    Every namespace has a version number kept in the cache itself; it is part
+    of each key, so bumping it invalidates every payload of the namespace at
+    once (old entries are never read again and age out). Versions start from
+    the clock, so a version key that was evicted can never come back with a
+    number whose stale entries are still around.
+
+    The versions double as HTTP validators (see conditional_response): a
+    bump also records the time of the change for Last-Modified. Both only
+    hold across worker processes if the cache is shared by all of them,
+    which the production settings require.
+
+    Hits and misses are counted per namespace, per process.
+    """
+
+    def __init__(self, alias, timeout, enabled=True):
+        self.alias = alias
+        self.timeout = timeout
+        self.enabled = enabled
+        self.hits = Counter()
+        self.misses = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def version(self, namespace):
+        key = f'catalogue:{namespace}:version'
+        version = self.backend.get(key)
+        if version is None:
+            self.backend.add(key, time.time_ns(), timeout=None)
+            version = self.backend.get(key)
+        return version
+
+    def bump(self, namespace):
+        # A fresh clock value rather than incr(): concurrent bumps from other
+        # processes can never collapse into one (not every shared backend
+        # increments atomically)
+        self.backend.set(f'catalogue:{namespace}:version', time.time_ns(), timeout=None)
+        self.backend.set(f'catalogue:{namespace}:modified', int(time.time()), timeout=None)
+
+    def validators(self, namespaces, key):
+        """
+        ETag and Last-Modified for a payload built from `namespaces`, read from
+        the cache alone. Both also change at local midnight, so day-relative
+        figures (the dashboard's recent revenue) are never reported unmodified
+        across days.
+
+        Returns: (etag, last_modified timestamp)
+        """
+        today = timezone.localdate()
+        versions = self.backend.get_many([f'catalogue:{ns}:version' for ns in namespaces])
+        if len(versions) < len(namespaces):
+            versions = {ns: self.version(ns) for ns in namespaces}
+        fingerprint = f"{key}|{today.isoformat()}|{sorted(versions.items())}"
+        etag = '"%s"' % hashlib.md5(fingerprint.encode(), usedforsecurity=False).hexdigest()
+
+        midnight = timezone.make_aware(datetime.combine(today, datetime.min.time())).timestamp()
+        modified = self.backend.get_many([f'catalogue:{ns}:modified' for ns in namespaces]).values()
+        return etag, int(max([midnight, *modified]))
+
+    def invalidate(self, *namespaces):
+        """
+        Bumps the namespaces now, so the writing request reads its own
+        writes, and again on commit, so a payload cached by a concurrent
+        request from the pre-commit data does not outlive the transaction.
+        """
+        for namespace in namespaces:
+            self.bump(namespace)
+            transaction.on_commit(lambda namespace=namespace: self.bump(namespace))
+
+    def get_or_set(self, namespace, key, build):
+        """
+        Returns the cached payload for `key`, or calls build() and caches its result.
+
+        Returns: (payload, hit) where hit tells whether the cache answered.
+        """
+        if not self.enabled:
+            return build(), False
+        full_key = f'catalogue:{namespace}:{self.version(namespace)}:{key}'
+        payload = self.backend.get(full_key)
+        hit = payload is not None
+        with self._lock:
+            (self.hits if hit else self.misses)[namespace] += 1
+        if not hit:
+            payload = build()
+            self.backend.set(full_key, payload, self.timeout)
+        return payload, hit
+
+    def stats(self):
+        """Per-namespace hits, misses, hit ratio and current version."""
+        with self._lock:
+            hits, misses = self.hits.copy(), self.misses.copy()
+        stats = {}
+        for namespace in NAMESPACES:
+            total = hits[namespace] + misses[namespace]
+            stats[namespace] = {
+                'hits': hits[namespace],
+                'misses': misses[namespace],
+                'hit_ratio': round(hits[namespace] / total, 3) if total else None,
+                'version': self.version(namespace),
+            }
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits.clear()
+            self.misses.clear()
+
+
+catalogue_cache = CatalogueCache(
+    alias=getattr(settings, 'CATALOGUE_CACHE_ALIAS', 'default'),
+    timeout=getattr(settings, 'CATALOGUE_CACHE_TIMEOUT', 300),
+    enabled=getattr(settings, 'CATALOGUE_CACHE_ENABLED', True),
+)
+
+
+def invalidate_catalogue(sender, **kwargs):
+    catalogue_cache.invalidate(*NAMESPACES_BY_MODEL[sender._meta.label])
+
+
+# Lazy senders: this module is imported by models.py, so it cannot import the models
+for _label in NAMESPACES_BY_MODEL:
+    post_save.connect(invalidate_catalogue, sender=_label, dispatch_uid=f'catalogue-save-{_label}')
+    post_delete.connect(invalidate_catalogue, sender=_label, dispatch_uid=f'catalogue-delete-{_label}')
+
+
+
+def check_validators(request, namespaces):
+    """
+    Returns: (not_modified, etag, last_modified), where not_modified is the
+    304 (or 412) response to send when the client's If-None-Match /
+    If-Modified-Since still match the namespaces' versions, else None.
+    """
+    etag, last_modified = catalogue_cache.validators(namespaces, request.get_full_path())
+    return get_conditional_response(request, etag=etag, last_modified=last_modified), etag, last_modified
+
+
+def add_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Browsers may keep the payload but must revalidate it before every use
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def conditional_response(request, namespaces, build):
+    """
+    Answers a GET/HEAD with 304 Not Modified when the client's copy is still
+    current, without calling build(). Otherwise returns build()'s response
+    with ETag and Last-Modified. Only the cache is read to decide, never the
+    database.
+    """
+    not_modified, etag, last_modified = check_validators(request, namespaces)
+    if not_modified is not None:
+        return add_validators(not_modified, etag, last_modified)
+    response = build()
+    if response.status_code != 200:
+        return response
+    return add_validators(response, etag, last_modified)
+
+
+def conditional_get(*namespaces):
+    """View method decorator for conditional_response (apply to get/list/retrieve)."""
+    def decorator(handler):
+        @wraps(handler)
+        def wrapped(view, request, *args, **kwargs):
+            return conditional_response(request, namespaces, lambda: handler(view, request, *args, **kwargs))
+        return wrapped
+    return decorator
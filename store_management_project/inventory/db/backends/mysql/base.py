@@ -0,0 +1,16 @@
+# inventory/db/backends/mysql/base.py
+"""
+MySQL backend with a bounded, process-wide connection pool (see inventory.db.pool).
+Use as ENGINE 'inventory.db.backends.mysql' with CONN_MAX_AGE = 0 and a POOL dict.
+"""
+
+from django.db.backends.mysql import base
+
+from inventory.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+
+    @staticmethod
+    def check_connection(raw):
+        raw.ping()
@@ -0,0 +1,13 @@
+# inventory/db/backends/sqlite3/base.py
+"""
+SQLite backend with the same connection pool as inventory.db.backends.mysql,
+for trying the pooled setup without a MySQL server. File databases only.
+"""
+
+from django.db.backends.sqlite3 import base
+
+from inventory.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,207 @@
+# inventory/db/pool.py
+
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """No pooled connection became free within the pool's timeout."""
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of raw DB-API connections, shared by every
+    thread of the process (WSGI worker threads and the threads ASGI runs
+    sync code in alike).
+
+    At most `size` connections are open at once; acquire() waits up to
+    `timeout` seconds for one to be released. Connections older than
+    `max_age` seconds are retired, and one that sat idle for more than
+    `check_after` seconds is health-checked with check(raw) before reuse.
+    """
+
+    def __init__(self, size=10, timeout=5.0, max_age=None, check_after=30.0, check=None):
+        self.size = size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.check_after = check_after
+        self.check = check
+        self._idle = deque()  # (raw, opened at, idle since), most recently released last
+        self._opened_at = {}
+        self._open = 0
+        self._cond = threading.Condition()
+        self.created = self.reused = self.waits = self.discarded = 0
+
+    def acquire(self, connect):
+        """
+        Returns: (raw connection, reused). connect() opens a new one when the
+        pool has none idle and is below its size.
+        Raises: PoolTimeout when the pool stays exhausted for `timeout` seconds.
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                if self._idle:
+                    raw, opened_at, idle_since = self._idle.pop()
+                elif self._open < self.size:
+                    self._open += 1
+                    raw = None
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"All {self.size} pooled connections are in use.")
+                    self.waits += 1
+                    self._cond.wait(remaining)
+                    continue
+
+            # 1. Reuse an idle connection, unless it is too old or fails its health check
+            if raw is not None:
+                if self._usable(raw, opened_at, idle_since):
+                    with self._cond:
+                        self.reused += 1
+                    return raw, True
+                self._discard(raw)
+                continue
+
+            # 2. Open a new one in the slot reserved above
+            try:
+                raw = connect()
+            except BaseException:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._opened_at[id(raw)] = time.monotonic()
+                self.created += 1
+            return raw, False
+
+    def release(self, raw, reusable=True):
+        """Hands a connection back; one that is not reusable (or too old) is closed instead."""
+        opened_at = self._opened_at.get(id(raw), 0)
+        if not reusable or self._expired(opened_at):
+            self._discard(raw)
+            return
+        with self._cond:
+            self._idle.append((raw, opened_at, time.monotonic()))
+            self._cond.notify()
+
+    def close_idle(self):
+        """Closes every idle connection (in-use ones are closed when released with reusable=False)."""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for raw, _, _ in idle:
+            self._discard(raw)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+                'created': self.created,
+                'reused': self.reused,
+                'waits': self.waits,
+                'discarded': self.discarded,
+            }
+
+    def _expired(self, opened_at):
+        return self.max_age is not None and time.monotonic() - opened_at > self.max_age
+
+    def _usable(self, raw, opened_at, idle_since):
+        if self._expired(opened_at):
+            return False
+        if self.check is None or time.monotonic() - idle_since <= self.check_after:
+            return True
+        try:
+            self.check(raw)
+        except Exception:
+            return False
+        return True
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._opened_at.pop(id(raw), None)
+            self._open -= 1
+            self.discarded += 1
+            self._cond.notify()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool_for(settings_dict, check=None):
+    """
+    The process-wide pool for one database. Pools are keyed by where they
+    connect to, so a renamed database (the test runner's test_ NAME) gets
+    its own pool. Sized by settings_dict['POOL']: SIZE, TIMEOUT, MAX_AGE
+    and CHECK_AFTER (seconds).
+    """
+    key = tuple(str(settings_dict.get(part)) for part in ('ENGINE', 'NAME', 'HOST', 'PORT', 'USER'))
+    with _pools_lock:
+        if key not in _pools:
+            options = settings_dict.get('POOL') or {}
+            _pools[key] = ConnectionPool(
+                size=options.get('SIZE', 10),
+                timeout=options.get('TIMEOUT', 5.0),
+                max_age=options.get('MAX_AGE'),
+                check_after=options.get('CHECK_AFTER', 30.0),
+                check=check,
+            )
+        return _pools[key]
+
+
+def all_pools():
+    with _pools_lock:
+        return list(_pools.values())
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    DatabaseWrapper mixin that takes raw connections from pool_for() instead
+    of opening one on every connect(), and hands them back on close().
+
+    Pair it with CONN_MAX_AGE = 0: Django then closes, i.e. returns, the
+    connection at the end of every request, so connections never stay
+    pinned to a thread. That is what makes the pool safe under ASGI, where
+    sync code runs on short-lived threads. A reused connection keeps the
+    session state of its first connect() (init_command, isolation level),
+    so that setup is not run again.
+    """
+
+    @staticmethod
+    def check_connection(raw):
+        raw.cursor().execute('SELECT 1')
+
+    @property
+    def pool(self):
+        return pool_for(self.settings_dict, check=self.check_connection)
+
+    def get_new_connection(self, conn_params):
+        raw, self._pool_reused = self.pool.acquire(
+            lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params)
+        )
+        return raw
+
+    def init_connection_state(self):
+        if not getattr(self, '_pool_reused', False):
+            super().init_connection_state()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # Only hand back a connection in a known state: no open transaction, no broken link
+        reusable = not self.in_atomic_block and (not self.errors_occurred or self.is_usable())
+        if reusable and not self.autocommit:
+            try:
+                self.connection.rollback()
+            except self.Database.Error:
+                reusable = False
+        self.pool.release(self.connection, reusable)
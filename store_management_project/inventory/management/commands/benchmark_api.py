@@ -0,0 +1,50 @@
+# inventory/management/commands/benchmark_api.py
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from inventory import bench
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates a synthetic store and measures query count, wall time and peak memory of the "
+        "API hot paths. Everything runs in a transaction that is rolled back, so the database is "
+        "left untouched. Compares against (or, with --update-baseline, rewrites) "
+        "inventory/bench_baseline.json."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1, help="Data scale (1 = 50 products, 200 bills).")
+        parser.add_argument('--repeat', type=int, default=3, help="Timed runs per scenario (median is kept).")
+        parser.add_argument('--tolerance', type=float, default=3.0,
+                            help="Allowed wall-time/memory growth over the baseline (x).")
+        parser.add_argument('--update-baseline', action='store_true', help="Store these results as the baseline.")
+
+    def handle(self, *args, **options):
+        scale = options['scale']
+        # The suite drives the API through the DRF test client ('testserver' host)
+        with override_settings(ALLOWED_HOSTS=['testserver']), transaction.atomic():
+            results = bench.run(scale, options['repeat'])
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{'scenario':<20}{'queries':>8}{'wall ms':>10}{'peak KiB':>10}")
+        for name, measured in results.items():
+            self.stdout.write(
+                f"{name:<20}{measured['queries']:>8}{measured['wall_ms']:>10.2f}{measured['peak_kb']:>10}"
+            )
+
+        if options['update_baseline']:
+            bench.save_baseline(scale, results)
+            self.stdout.write(self.style.SUCCESS(f"Baseline for scale {scale} written to {bench.BASELINE_PATH}."))
+            return
+
+        baseline = bench.load_baseline(scale)
+        if baseline is None:
+            self.stdout.write(f"No baseline stored for scale {scale}; rerun with --update-baseline to record one.")
+            return
+        problems = bench.regressions(results, baseline, options['tolerance'])
+        if problems:
+            raise CommandError("Regressions against the baseline:\n" + "\n".join(problems))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
@@ -0,0 +1,40 @@
+# inventory/management/commands/benchmark_async.py
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from inventory import bench
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests the dashboard read endpoints with concurrent clients: the sync DRF views "
+        "(a thread per request, as under WSGI) against their async variants under /api/async/ "
+        "(through the ASGI handler). Read-only: runs against the data already in the database "
+        "(a temporary 'bench-async' user is created for the token and removed afterwards)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint and mode.")
+        parser.add_argument('--concurrency', type=int, default=20, help="Requests in flight at once.")
+
+    def handle(self, *args, **options):
+        user, created = User.objects.get_or_create(username='bench-async')
+        token = f'Bearer {RefreshToken.for_user(user).access_token}'
+        try:
+            # The test clients send the 'testserver' host
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                results = bench.run_concurrent(token, options['requests'], options['concurrency'])
+        finally:
+            if created:
+                user.delete()
+
+        self.stdout.write(f"{'scenario':<18}{'mode':<7}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}")
+        for name, modes in results.items():
+            for mode, summary in modes.items():
+                self.stdout.write(
+                    f"{name:<18}{mode:<7}{summary['requests_per_s']:>9.1f}"
+                    f"{summary['p50_ms']:>10.2f}{summary['p95_ms']:>10.2f}"
+                )
@@ -0,0 +1,103 @@
+# inventory/management/commands/benchmark_checkout.py
+
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.test import APIClient
+
+from inventory.models import Product, Purchase, SaleInvoice, Stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Drives many parallel POS checkouts (POST /api/sales/) against the configured "
+        "database and reports throughput, latency and invoice-number collisions. "
+        "With --upload N the bills go through the offline-till endpoint (POST /api/sales/bulk/) N at a time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tills', type=int, default=8, help="Number of concurrent tills (threads).")
+        parser.add_argument('--sales', type=int, default=200, help="Total number of bills to post.")
+        parser.add_argument('--lines', type=int, default=3, help="Line items per bill.")
+        parser.add_argument('--upload', type=int, default=0, help="Bills per bulk upload (0 = one request per bill).")
+        parser.add_argument('--keep', action='store_true', help="Keep the generated products and invoices.")
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        lines = options['lines']
+        sales = options['sales']
+
+        # 1. Fixture: a few products with enough stock for every bill
+        user = User.objects.create_user(f'bench-{tag}', password=uuid.uuid4().hex)
+        products = []
+        for i in range(lines):
+            product = Product.objects.create(name=f'Benchmark {tag} #{i}', base_price=Decimal('1.00'))
+            Stock.objects.create(product=product, quantity=0)
+            Purchase.objects.create(
+                product=product, purchase_quantity=sales, unit_purchase_price=Decimal('1.00'),
+                batch_number_input=f'BENCH-{tag}',
+            )
+            products.append(product)
+
+        payload = {
+            'customer_name': 'Benchmark',
+            'items': [
+                {'product': p.id, 'sold_quantity': 1, 'unit_sale_price': '2.00'} for p in products
+            ],
+        }
+
+        def post_sale(_):
+            client = APIClient(SERVER_NAME='localhost')
+            client.force_authenticate(user)
+            started = time.perf_counter()
+            try:
+                response = client.post('/api/sales/', payload, format='json')
+                return response.status_code, response.data.get('invoice_number'), time.perf_counter() - started
+            finally:
+                connection.close()
+
+        def post_upload(count):
+            client = APIClient(SERVER_NAME='localhost')
+            client.force_authenticate(user)
+            started = time.perf_counter()
+            try:
+                response = client.post('/api/sales/bulk/', [payload] * count, format='json')
+                per_bill = (time.perf_counter() - started) / count
+                return [
+                    (201 if r['status'] == 'created' else 400, r.get('invoice_number'), per_bill)
+                    for r in response.data['results']
+                ]
+            finally:
+                connection.close()
+
+        # 2. Fire the bills from parallel tills
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['tills']) as pool:
+            upload = options['upload']
+            if upload:
+                sizes = [min(upload, sales - i) for i in range(0, sales, upload)]
+                results = [r for batch in pool.map(post_upload, sizes) for r in batch]
+            else:
+                results = list(pool.map(post_sale, range(sales)))
+        elapsed = time.perf_counter() - started
+
+        # 3. Report
+        ok = [r for r in results if r[0] == 201]
+        numbers = [r[1] for r in ok]
+        latencies = sorted(r[2] * 1000 for r in ok) or [0.0]
+        self.stdout.write(f"Bills posted:        {len(results)} ({len(ok)} ok, {len(results) - len(ok)} failed)")
+        self.stdout.write(f"Wall time:           {elapsed:.2f}s ({len(ok) / elapsed:.1f} bills/s)")
+        p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+        self.stdout.write(f"Latency p50 / p95:   {statistics.median(latencies):.1f}ms / {p95:.1f}ms")
+        self.stdout.write(f"Duplicate numbers:   {len(numbers) - len(set(numbers))}")
+
+        if not options['keep']:
+            SaleInvoice.objects.filter(invoice_number__in=numbers).delete()
+            Product.objects.filter(id__in=[p.id for p in products]).delete()
+            user.delete()
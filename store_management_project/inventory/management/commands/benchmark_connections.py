@@ -0,0 +1,36 @@
+# inventory/management/commands/benchmark_connections.py
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from inventory import bench
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests connection handling against the configured database: a new connection per "
+        "request (CONN_MAX_AGE=0), Django's persistent connections (CONN_MAX_AGE=60) and the "
+        "bounded pool (inventory.db.backends.*). Only runs SELECT 1 (or --query); no data is written."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help="Concurrent clients (also the pool size).")
+        parser.add_argument('--requests', type=int, default=100, help="Requests per client.")
+        parser.add_argument('--query', default='SELECT 1', help="Statement each request runs.")
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        settings_dict = connections[options['database']].settings_dict
+        if settings_dict['ENGINE'] not in {*bench.POOLED_ENGINES, *bench.POOLED_ENGINES.values()}:
+            raise CommandError(f"No pooled variant of {settings_dict['ENGINE']}.")
+        if connections[options['database']].vendor == 'sqlite' and connections[options['database']].is_in_memory_db():
+            raise CommandError("An in-memory SQLite database cannot be shared between connections.")
+
+        results = bench.connection_load(settings_dict, options['threads'], options['requests'], options['query'])
+
+        self.stdout.write(f"{'profile':<12}{'connections':>12}{'req/s':>10}{'avg ms':>10}")
+        for label, measured in results.items():
+            self.stdout.write(
+                f"{label:<12}{measured['connections_opened']:>12}"
+                f"{measured['requests_per_s']:>10.1f}{measured['avg_ms']:>10.3f}"
+            )
@@ -0,0 +1,17 @@
+# inventory/management/commands/rebuild_inventory_snapshot.py
+
+from django.core.management.base import BaseCommand
+
+from inventory.models import InventorySnapshot
+
+
+class Command(BaseCommand):
+    help = "Recomputes the dashboard InventorySnapshot from the Product, Stock, Batch and SaleInvoice tables."
+
+    def handle(self, *args, **options):
+        snapshot = InventorySnapshot.rebuild()
+        self.stdout.write(
+            f"Products: {snapshot.total_products} | Stock value: {snapshot.total_stock_value} | "
+            f"Low stock: {snapshot.low_stock_count} | Revenue since {snapshot.revenue_window_start:%Y-%m-%d}: "
+            f"{snapshot.recent_revenue} ({snapshot.recent_sales_count} sales)"
+        )
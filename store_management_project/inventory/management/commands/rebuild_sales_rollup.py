@@ -0,0 +1,27 @@
+# inventory/management/commands/rebuild_sales_rollup.py
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from inventory.models import DailySalesRollup
+
+
+class Command(BaseCommand):
+    help = "Backfills or rebuilds the DailySalesRollup table from SaleItem history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help="First day to rebuild (YYYY-MM-DD).")
+        parser.add_argument('--to', dest='date_to', help="Last day to rebuild (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        dates = {}
+        for option in ('date_from', 'date_to'):
+            value = options[option]
+            if value and parse_date(value) is None:
+                raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD.")
+            dates[option] = parse_date(value) if value else None
+
+        with transaction.atomic():
+            written = DailySalesRollup.rebuild(**dates)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} rollup rows."))
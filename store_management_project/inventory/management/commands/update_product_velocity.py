@@ -0,0 +1,24 @@
+# inventory/management/commands/update_product_velocity.py
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from inventory.models import ProductVelocity
+
+
+class Command(BaseCommand):
+    help = "Folds the days of sales since the last run into ProductVelocity (run nightly)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--through', help="Last day to process (YYYY-MM-DD, default yesterday).")
+        parser.add_argument('--rebuild', action='store_true', help="Recompute every product from scratch.")
+
+    def handle(self, *args, **options):
+        through = options['through']
+        if through and parse_date(through) is None:
+            raise CommandError(f"Invalid date '{through}', expected YYYY-MM-DD.")
+
+        with transaction.atomic():
+            days = ProductVelocity.update(through=parse_date(through) if through else None, rebuild=options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(f"Processed {days} day(s) of sales."))
@@ -0,0 +1,33 @@
+# inventory/management/commands/verify_stock_ledger.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.models import StockMovement
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes Stock.quantity and Batch.quantity from the StockMovement ledger in one pass "
+        "and reports every row that drifted. With --fix the rows are rewritten to the ledger values "
+        "(rows are re-checked under lock first, so it is safe while the tills are selling)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Rewrite drifted rows to the ledger values.")
+        parser.add_argument('--limit', type=int, default=50, help="Maximum number of drifted rows to list.")
+
+    def handle(self, *args, **options):
+        drift = StockMovement.reconcile(fix=options['fix'])
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Stock and Batch quantities match the ledger."))
+            return
+
+        for model, row_id, recorded, expected in drift[:options['limit']]:
+            self.stdout.write(f"{model} {row_id}: recorded {recorded}, ledger {expected}")
+        if len(drift) > options['limit']:
+            self.stdout.write(f"... and {len(drift) - options['limit']} more")
+
+        if options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"Rewrote {len(drift)} rows from the ledger."))
+        else:
+            raise CommandError(f"{len(drift)} rows drifted from the ledger; rerun with --fix to repair them.")
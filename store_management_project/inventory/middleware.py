@@ -0,0 +1,107 @@
+# inventory/middleware.py
+
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+# Most recent instrumented requests, newest last (deque appends are thread-safe)
+recent_requests = deque(maxlen=getattr(settings, 'QUERY_STATS_BUFFER_SIZE', 500))
+
+
+class QueryCollector:
+    """
+    Database execute wrapper counting and timing every statement of a request.
+
+    Statements are grouped by their SQL text, which still has the parameter
+    placeholders in it, so the same query run for every row of a list (an N+1)
+    shows up as one signature with a high count.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.signatures = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.signatures[sql] += 1
+
+    def duplicates(self, threshold):
+        """Returns [(sql, times run)] for statements run at least `threshold` times, most repeated first."""
+        return [(sql, count) for sql, count in self.signatures.most_common() if count >= threshold]
+
+
+class QueryStatsMiddleware:
+    """
+    Opt-in per-request instrumentation (QUERY_STATS_ENABLED).
+
+    Records the query count, total DB time, repeated statements (likely N+1s),
+    the time DRF spends rendering the response data and the total time of
+    every request. The figures go out as a Server-Timing header and into the
+    `recent_requests` ring buffer behind /api/admin/query-stats/.
+
+    Bodies of streaming responses are produced after the middleware returns,
+    so their queries are not counted.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_STATS_ENABLED', False):
+            # Removes the middleware from the stack: no overhead at all when off
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.duplicate_threshold = getattr(settings, 'QUERY_STATS_DUPLICATE_THRESHOLD', 3)
+
+    def __call__(self, request):
+        collector = QueryCollector()
+        request._query_stats_render = 0.0
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(collector))
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        render = request._query_stats_render
+        duplicates = collector.duplicates(self.duplicate_threshold)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={collector.duration * 1000:.1f};desc="{collector.count} queries"',
+            f'dup;desc="{len(duplicates)} repeated statements"',
+            f'serialize;dur={render * 1000:.1f}',
+            f'app;dur={(total - collector.duration - render) * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+        match = getattr(request, 'resolver_match', None)
+        recent_requests.append({
+            'at': timezone.now(),
+            'view': (match.view_name or match._func_path) if match else None,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': collector.count,
+            'db_ms': round(collector.duration * 1000, 2),
+            'serialize_ms': round(render * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'duplicates': [{'sql': sql[:300], 'count': count} for sql, count in duplicates],
+        })
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered (serialized to JSON) right after this hook
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._query_stats_render += time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:31
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def seed_invoice_sequence(apps, schema_editor):
+    """Start the counter after the highest legacy INV-<id> invoice number."""
+    SaleInvoice = apps.get_model('inventory', 'SaleInvoice')
+    InvoiceSequence = apps.get_model('inventory', 'InvoiceSequence')
+    last_id = SaleInvoice.objects.aggregate(last=Max('id'))['last'] or 0
+    InvoiceSequence.objects.get_or_create(name='sale_invoice', defaults={'next_value': last_id + 1})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_alter_purchase_product_alter_saleitem_product'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('next_value', models.BigIntegerField(default=1)),
+            ],
+        ),
+        migrations.AlterModelOptions(
+            name='batch',
+            options={'ordering': ['expiry_date', 'purchase_date']},
+        ),
+        migrations.RunPython(seed_invoice_sequence, migrations.RunPython.noop),
+    ]
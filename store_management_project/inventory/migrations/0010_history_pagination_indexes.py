@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_invoicesequence'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'name'], name='product_active_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['purchase_date', 'id'], name='purchase_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saleinvoice',
+            index=models.Index(fields=['sale_date', 'id'], name='saleinvoice_date_id_idx'),
+        ),
+    ]
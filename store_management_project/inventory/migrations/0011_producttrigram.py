@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_trigrams(apps, schema_editor):
+    """Index the names of products that already exist."""
+    Product = apps.get_model('inventory', 'Product')
+    ProductTrigram = apps.get_model('inventory', 'ProductTrigram')
+    rows = []
+    for product_id, name in Product.objects.values_list('id', 'name').iterator():
+        text = ' '.join(name.lower().split())
+        grams = {text[i:i + 3] for i in range(len(text) - 2)}
+        rows.extend(ProductTrigram(product_id=product_id, trigram=gram) for gram in grams)
+    ProductTrigram.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_history_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='inventory.product')),
+            ],
+            options={
+                'unique_together': {('trigram', 'product')},
+            },
+        ),
+        migrations.RunPython(build_trigrams, migrations.RunPython.noop),
+    ]
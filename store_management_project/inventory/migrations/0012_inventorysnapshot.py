@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:35
+
+from django.db import migrations, models
+from django.db.models import DecimalField, F, Sum
+
+
+def build_snapshot(apps, schema_editor):
+    """Seed the snapshot row; the recent-revenue window is filled on first read."""
+    Product = apps.get_model('inventory', 'Product')
+    Stock = apps.get_model('inventory', 'Stock')
+    Batch = apps.get_model('inventory', 'Batch')
+    InventorySnapshot = apps.get_model('inventory', 'InventorySnapshot')
+    InventorySnapshot.objects.update_or_create(pk=1, defaults=dict(
+        total_products=Product.objects.count(),
+        total_stock_value=Batch.objects.filter(quantity__gt=0).aggregate(
+            total=Sum(F('quantity') * F('cost_price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+        )['total'] or 0,
+        low_stock_count=Stock.objects.filter(quantity__lte=F('low_stock_threshold'), quantity__gt=0).count(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_producttrigram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventorySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_products', models.IntegerField(default=0)),
+                ('total_stock_value', models.DecimalField(decimal_places=2, default=0, help_text='Sum of quantity x cost_price over in-stock batches.', max_digits=14)),
+                ('low_stock_count', models.IntegerField(default=0)),
+                ('recent_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('recent_sales_count', models.IntegerField(default=0)),
+                ('revenue_window_start', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(build_snapshot, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollup(apps, schema_editor):
+    """Roll up the existing sales history (same as `manage.py rebuild_sales_rollup`)."""
+    SaleItem = apps.get_model('inventory', 'SaleItem')
+    DailySalesRollup = apps.get_model('inventory', 'DailySalesRollup')
+    money = DecimalField(max_digits=14, decimal_places=2)
+    sums = dict(
+        invoice_count=Count('invoice', distinct=True),
+        units_sold=Sum('sold_quantity'),
+        revenue=Sum(F('unit_sale_price') * F('sold_quantity'), output_field=money),
+        cost=Sum(F('unit_cost_price') * F('sold_quantity'), output_field=money),
+    )
+    items = SaleItem.objects.annotate(date=TruncDate('invoice__sale_date'))
+    rows = [
+        DailySalesRollup(date=row['date'], product_id=row['product'], category_id=row['product__category'],
+                         **{field: row[field] for field in sums})
+        for row in items.values('date', 'product', 'product__category').annotate(**sums).order_by()
+    ]
+    rows += [
+        DailySalesRollup(date=row['date'], **{field: row[field] for field in sums})
+        for row in items.values('date').annotate(**sums).order_by()
+    ]
+    DailySalesRollup.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_inventorysnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('invoice_count', models.IntegerField(default=0)),
+                ('units_sold', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('category', models.ForeignKey(blank=True, help_text='Product category at the time of sale (denormalized).', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inventory.category')),
+                ('product', models.ForeignKey(blank=True, help_text='NULL for the day-total row.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='inventory.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'product'], name='dailysales_date_product_idx'), models.Index(fields=['product', 'date'], name='dailysales_product_date_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_rollup, migrations.RunPython.noop),
+    ]
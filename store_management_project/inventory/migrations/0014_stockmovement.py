@@ -0,0 +1,52 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def open_ledger(apps, schema_editor):
+    """Opening movements so the ledger starts out matching current Stock and Batch quantities."""
+    Batch = apps.get_model('inventory', 'Batch')
+    Stock = apps.get_model('inventory', 'Stock')
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+
+    movements = [
+        StockMovement(product_id=product_id, batch_id=batch_id, quantity=quantity, reason='opening')
+        for batch_id, product_id, quantity in Batch.objects.exclude(quantity=0).values_list(
+            'id', 'product_id', 'quantity'
+        ).iterator(chunk_size=2000)
+    ]
+    # Stock not accounted for by any batch (drift, or stock entered by hand)
+    in_batches = dict(Batch.objects.order_by().values('product_id').annotate(
+        total=Sum('quantity')
+    ).values_list('product_id', 'total'))
+    for product_id, quantity in Stock.objects.values_list('product_id', 'quantity').iterator(chunk_size=2000):
+        unbatched = quantity - in_batches.get(product_id, 0)
+        if unbatched:
+            movements.append(StockMovement(product_id=product_id, quantity=unbatched, reason='opening'))
+    StockMovement.objects.bulk_create(movements, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_dailysalesrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(help_text='Signed change: positive into stock, negative out of it.')),
+                ('reason', models.CharField(choices=[('opening', 'Opening balance'), ('purchase', 'Purchase received'), ('purchase_edit', 'Purchase quantity corrected'), ('purchase_void', 'Purchase deleted'), ('sale', 'Sale')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('batch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='movements', to='inventory.batch')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='inventory.product')),
+                ('purchase', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='inventory.purchase')),
+                ('sale_invoice', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='inventory.saleinvoice')),
+            ],
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def flag_low_stock(apps, schema_editor):
+    Stock = apps.get_model('inventory', 'Stock')
+    Stock.objects.filter(quantity__gt=0, quantity__lte=F('low_stock_threshold')).update(is_low=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_stockmovement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='is_low',
+            field=models.BooleanField(db_index=True, default=False, editable=False, help_text='In stock but at/under threshold; maintained on every write so low-stock lookups use an index.'),
+        ),
+        migrations.CreateModel(
+            name='LowStockEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_low', models.BooleanField()),
+                ('quantity', models.IntegerField()),
+                ('low_stock_threshold', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.product')),
+            ],
+        ),
+        migrations.RunPython(flag_low_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0015_stock_is_low'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='batch',
+            index=models.Index(fields=['product', 'expiry_date', 'purchase_date'], name='batch_product_fefo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='batch',
+            index=models.Index(fields=['expiry_date'], name='batch_expiry_idx'),
+        ),
+    ]
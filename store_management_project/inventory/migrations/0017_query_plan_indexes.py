@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0016_batch_expiry_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='batch',
+            index=models.Index(fields=['quantity', 'cost_price'], name='batch_in_stock_value_idx'),
+        ),
+    ]
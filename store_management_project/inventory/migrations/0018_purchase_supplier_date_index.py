@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0017_query_plan_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['supplier', 'purchase_date', 'purchase_quantity', 'unit_purchase_price'], name='purchase_supplier_date_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0018_purchase_supplier_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductVelocity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('units_per_day', models.DecimalField(decimal_places=3, default=0, max_digits=10)),
+                ('reorder_point', models.IntegerField(default=0, help_text='Units expected to sell over the lead time plus safety days.')),
+                ('last_sale_date', models.DateField(blank=True, null=True)),
+                ('as_of', models.DateField(help_text='Last day of sales folded into the average.')),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='velocity', to='inventory.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Product velocities',
+            },
+        ),
+    ]
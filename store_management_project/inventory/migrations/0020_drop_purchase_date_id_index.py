@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:58
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0019_productvelocity'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='purchase',
+            name='purchase_date_id_idx',
+        ),
+    ]
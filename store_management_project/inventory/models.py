@@ -1,11 +1,20 @@
+import math
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
 from django.db import models
 from django.core.validators import MinValueValidator
-from django.db.models import F
+from django.db.models import Count, DecimalField, F, Max, Q, Sum, Value
+from django.db.models.functions import TruncDate
 from django.db import transaction 
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.utils import timezone 
 
+from .cache import catalogue_cache
+
 # --- Base Models ---
 
 class Category(models.Model):
@@ -42,10 +51,36 @@ class Product(models.Model):
     # Field used for soft deletion/deactivation - Set to True for active inventory
     is_active = models.BooleanField(default=True) 
 
+    class Meta:
+        indexes = [
+            # Active catalogue listing / cursor pagination by name
+            models.Index(fields=['is_active', 'name'], name='product_active_name_idx'),
+            # The same on SQLite, which cannot search an index for the bare
+            # `WHERE is_active` Django renders there for is_active=True
+            models.Index(fields=['name'], condition=Q(is_active=True), name='product_active_name_part_idx'),
+        ]
+
     def __str__(self):
         cat = self.category.name if self.category else 'N/A'
         return f"{self.name} ({cat})"
     
+def name_trigrams(text):
+    """Lower-cased 3-character substrings of text, used by the product search index."""
+    text = ' '.join(text.lower().split())
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ProductTrigram(models.Model):
+    """Trigram side table for indexed substring search on Product.name (MySQL and SQLite)."""
+    product = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='trigrams')
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        unique_together = ('trigram', 'product')
+
+    def __str__(self):
+        return f"{self.trigram!r} -> {self.product_id}"
+
 class Stock(models.Model):
     """Tracks total stock quantity, batch-derived updates, expiry info, and low-stock alerts."""
     product = models.OneToOneField(
@@ -62,9 +97,20 @@ class Stock(models.Model):
         null=True, blank=True,
         help_text="Optional global expiry date (if not using batch-level expiries)."
     )
+    is_low = models.BooleanField(
+        default=False, db_index=True, editable=False,
+        help_text="In stock but at/under threshold; maintained on every write so low-stock lookups use an index."
+    )
 
     class Meta:
         verbose_name_plural = "Stock"
+        indexes = [
+            # Low-stock lookups on SQLite, which cannot search the is_low index for
+            # the bare `WHERE is_low` Django renders there for is_low=True, but
+            # reads this one (low rows only). MySQL has no partial indexes and
+            # gets `is_low = true`, which its is_low index serves.
+            models.Index(fields=['product'], condition=Q(is_low=True), name='stock_low_product_idx'),
+        ]
 
     def __str__(self):
         return f"Stock for {self.product.name} ({self.quantity} units)"
@@ -72,6 +118,35 @@ class Stock(models.Model):
     @property
     def is_low_stock(self):
         return self.quantity <= self.low_stock_threshold
+
+    # What the low-stock feed shows besides is_low
+    FEED_FIELDS = ('quantity', 'low_stock_threshold')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # As read, so save() can tell whether the low-stock feed has anything new
+        instance._saved_feed_values = {field: instance.__dict__.get(field) for field in cls.FEED_FIELDS}
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Keep the indexed flag, the low-stock feed and the snapshot in step with
+        # quantity/threshold edits made outside the StockLedger (admin, fixtures)
+        was_low = self.is_low
+        self.is_low = bool(low_stock_flag(self.quantity, self.low_stock_threshold))
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'is_low'}
+        super().save(*args, **kwargs)
+
+        # Feed every change a low-stock list would show (as StockLedger.save does), not every save
+        saved = getattr(self, '_saved_feed_values', {})
+        changed = self.is_low != was_low or any(
+            getattr(self, field) != saved.get(field) for field in self.FEED_FIELDS
+        )
+        if (self.is_low or was_low) and changed:
+            LowStockEvent.objects.create(**LowStockEvent.fields_for(self))
+        self._saved_feed_values = {field: getattr(self, field) for field in self.FEED_FIELDS}
+        InventorySnapshot.adjust(low_stock_count=int(self.is_low) - int(was_low))
     
 class Supplier(models.Model):
     """Information about product suppliers."""
@@ -96,6 +171,14 @@ class Batch(models.Model):
         unique_together = ('product', 'batch_number') 
         # Order by expiry date (FEFO) for easy stock deduction later
         ordering = ['expiry_date', 'purchase_date']
+        indexes = [
+            # FEFO allocation: a product's batches already in deduction order
+            models.Index(fields=['product', 'expiry_date', 'purchase_date'], name='batch_product_fefo_idx'),
+            # Near-expiry report: range scan over the expiry horizon across products
+            models.Index(fields=['expiry_date'], name='batch_expiry_idx'),
+            # Stock value: covers the in-stock range, so sold-out batches are never read
+            models.Index(fields=['quantity', 'cost_price'], name='batch_in_stock_value_idx'),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.batch_number} ({self.quantity})"
@@ -122,6 +205,15 @@ class Purchase(models.Model):
         related_name='source_purchases'
     )
 
+    class Meta:
+        indexes = [
+            # Supplier analytics: a supplier's purchases by date, covering the summed columns
+            models.Index(
+                fields=['supplier', 'purchase_date', 'purchase_quantity', 'unit_purchase_price'],
+                name='purchase_supplier_date_idx',
+            ),
+        ]
+
     def __str__(self):
         return f"Purchase: {self.product.name} - {self.purchase_quantity} units on {self.purchase_date}"
 
@@ -137,9 +229,23 @@ class SaleInvoice(models.Model):
     tax_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     final_total = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
 
+    class Meta:
+        indexes = [
+            # Sale history cursor pagination and date-range reports
+            models.Index(fields=['sale_date', 'id'], name='saleinvoice_date_id_idx'),
+        ]
+
     def __str__(self):
         return f"Invoice #{self.invoice_number} ({self.sale_date.strftime('%Y-%m-%d %H:%M')})"
 
+class InvoiceSequence(models.Model):
+    """Counter row from which invoice numbers are reserved in blocks."""
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.name} (next {self.next_value})"
+
 class SaleItem(models.Model):
     """Details of products sold within a SaleInvoice, supporting batch-level tracking."""
     invoice = models.ForeignKey(
@@ -175,6 +281,659 @@ class SaleItem(models.Model):
         return f"Sale: {self.product.name} x {self.sold_quantity}"
 
 
+# ----------------------------------------------------
+# MATERIALIZED DASHBOARD SUMMARY
+# ----------------------------------------------------
+
+def batch_value(quantity, cost_price):
+    """Stock value a batch contributes (batches at or below zero count as nothing)."""
+    return max(quantity, 0) * Decimal(cost_price)
+
+
+def low_stock_flag(quantity, threshold):
+    """1 if a stock level counts as low on the dashboard (in stock but at/under threshold), else 0."""
+    return 1 if 0 < quantity <= threshold else 0
+
+
+class InventorySnapshot(models.Model):
+    """
+    Single-row summary read by the dashboard instead of aggregating on every load.
+
+    Stock/sale write paths push deltas through adjust(); recent revenue covers
+    sales since revenue_window_start (midnight RECENT_DAYS days ago) and is
+    rolled forward by current() once a day. `manage.py rebuild_inventory_snapshot`
+    recomputes everything from the source tables.
+    """
+    total_products = models.IntegerField(default=0)
+    total_stock_value = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0,
+        help_text="Sum of quantity x cost_price over in-stock batches."
+    )
+    low_stock_count = models.IntegerField(default=0)
+    recent_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    recent_sales_count = models.IntegerField(default=0)
+    revenue_window_start = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    SINGLETON_ID = 1
+    RECENT_DAYS = 7
+
+    def __str__(self):
+        return f"Inventory snapshot ({self.updated_at:%Y-%m-%d %H:%M})"
+
+    @classmethod
+    def adjust(cls, **deltas):
+        """
+        Adds the given deltas to the snapshot once the current transaction commits.
+
+        Applying them after commit keeps the single snapshot row out of the
+        checkout/purchase transactions, so it is never a lock every till waits on.
+        """
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        def apply():
+            cls.objects.filter(pk=cls.SINGLETON_ID).update(
+                updated_at=timezone.now(),
+                **{
+                    field: F(field) + Value(delta, output_field=cls._meta.get_field(field))
+                    for field, delta in deltas.items()
+                }
+            )
+            catalogue_cache.bump('snapshot')
+        transaction.on_commit(apply)
+
+    @classmethod
+    def window_start(cls):
+        start_day = timezone.localdate() - timedelta(days=cls.RECENT_DAYS)
+        return timezone.make_aware(datetime.combine(start_day, time.min))
+
+    @classmethod
+    def _recent_sales(cls, since):
+        totals = SaleInvoice.objects.filter(sale_date__gte=since).aggregate(
+            recent_revenue=Sum('final_total'), recent_sales_count=Count('id')
+        )
+        totals['recent_revenue'] = totals['recent_revenue'] or 0
+        return totals
+
+    @classmethod
+    def rebuild(cls):
+        """Recomputes every figure from the source tables."""
+        window_start = cls.window_start()
+        values = dict(
+            total_products=Product.objects.count(),
+            total_stock_value=Batch.objects.filter(quantity__gt=0).aggregate(
+                total=Sum(F('quantity') * F('cost_price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+            )['total'] or 0,
+            low_stock_count=Stock.objects.filter(is_low=True).count(),
+            revenue_window_start=window_start,
+            **cls._recent_sales(window_start),
+        )
+        snapshot, _ = cls.objects.update_or_create(pk=cls.SINGLETON_ID, defaults=values)
+        catalogue_cache.bump('snapshot')
+        return snapshot
+
+    @classmethod
+    def current(cls):
+        """Returns the snapshot, rolling the recent-revenue window forward when the day changes."""
+        snapshot = cls.objects.filter(pk=cls.SINGLETON_ID).first()
+        if snapshot is None:
+            return cls.rebuild()
+
+        window_start = cls.window_start()
+        if snapshot.revenue_window_start != window_start:
+            recent = cls._recent_sales(window_start)
+            cls.objects.filter(pk=cls.SINGLETON_ID).update(revenue_window_start=window_start, **recent)
+            catalogue_cache.bump('snapshot')
+            snapshot.revenue_window_start = window_start
+            for field, value in recent.items():
+                setattr(snapshot, field, value)
+        return snapshot
+
+
+@receiver(post_save, sender=Product)
+def count_new_product(sender, instance, created, **kwargs):
+    if created:
+        InventorySnapshot.adjust(total_products=1)
+
+
+@receiver(post_delete, sender=Product)
+def uncount_deleted_product(sender, instance, **kwargs):
+    InventorySnapshot.adjust(total_products=-1)
+
+
+@receiver(post_delete, sender=Stock)
+def uncount_deleted_stock(sender, instance, **kwargs):
+    InventorySnapshot.adjust(low_stock_count=-low_stock_flag(instance.quantity, instance.low_stock_threshold))
+
+
+@receiver(post_delete, sender=Batch)
+def unvalue_deleted_batch(sender, instance, **kwargs):
+    InventorySnapshot.adjust(total_stock_value=-batch_value(instance.quantity, instance.cost_price))
+
+
+@receiver(post_delete, sender=SaleInvoice)
+def unrecord_deleted_sale(sender, instance, **kwargs):
+    window_start = InventorySnapshot.window_start()
+    if instance.sale_date and instance.sale_date >= window_start:
+        InventorySnapshot.adjust(recent_revenue=-instance.final_total, recent_sales_count=-1)
+
+
+# ----------------------------------------------------
+# DAILY SALES ROLLUP
+# ----------------------------------------------------
+
+class DailySalesRollup(models.Model):
+    """
+    Pre-aggregated sales per day: one row per (date, product) plus a day-total
+    row with product=NULL, so margin reports read O(days) rows instead of
+    scanning every SaleItem. The product rows are updated inside the sale
+    transaction; the day total, which every till would otherwise queue on, is
+    added after commit with a single unlocked increment (as InventorySnapshot
+    does).
+
+    Rows are additive: if two tills race to create the same row, readers sum
+    the duplicates, so no uniqueness constraint is needed.
+    """
+    date = models.DateField()
+    product = models.ForeignKey(
+        'Product', on_delete=models.CASCADE, null=True, blank=True, related_name='daily_sales',
+        help_text="NULL for the day-total row."
+    )
+    category = models.ForeignKey(
+        'Category', on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+        help_text="Product category at the time of sale (denormalized)."
+    )
+    invoice_count = models.IntegerField(default=0)
+    units_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'product'], name='dailysales_date_product_idx'),
+            models.Index(fields=['product', 'date'], name='dailysales_product_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.product_id or 'TOTAL'}: {self.revenue}"
+
+    @classmethod
+    def record(cls, lines, sign=1):
+        """
+        Adds sale lines to the rollup.
+
+        lines: iterable of (sale_date, invoice_id, product_id, category_id, quantity,
+        revenue, cost); sign=-1 takes the sales back out. Costs two queries
+        however many invoices, days and lines are recorded at once, plus two
+        per day for the day totals once the transaction commits.
+        """
+        totals = defaultdict(lambda: {'invoices': set(), 'units_sold': 0, 'revenue': Decimal(0), 'cost': Decimal(0)})
+        categories = {}
+        for sale_date, invoice_id, product_id, category_id, quantity, revenue, cost in lines:
+            day = timezone.localdate(sale_date)
+            for key in ((day, product_id), (day, None)):
+                totals[key]['invoices'].add(invoice_id)
+                totals[key]['units_sold'] += quantity
+                totals[key]['revenue'] += revenue
+                totals[key]['cost'] += cost
+            categories[product_id] = category_id
+        if not totals:
+            return
+        day_totals = {day: totals.pop((day, None)) for day, product_id in list(totals) if product_id is None}
+
+        existing = {
+            (row.date, row.product_id): row
+            for row in cls.objects.select_for_update().filter(
+                date__in={day for day, _ in totals}, product_id__in={product_id for _, product_id in totals},
+            ).order_by('date', 'product_id', 'id')
+        }
+
+        to_update, to_create = [], []
+        for (day, product_id), delta in totals.items():
+            row = existing.get((day, product_id))
+            if row is None:
+                row = cls(date=day, product_id=product_id, category_id=categories.get(product_id))
+                to_create.append(row)
+            else:
+                to_update.append(row)
+            row.invoice_count += sign * len(delta['invoices'])
+            row.units_sold += sign * delta['units_sold']
+            row.revenue += sign * delta['revenue']
+            row.cost += sign * delta['cost']
+
+        if to_update:
+            cls.objects.bulk_update(to_update, ['invoice_count', 'units_sold', 'revenue', 'cost'])
+        if to_create:
+            cls.objects.bulk_create(to_create)
+
+        transaction.on_commit(lambda: cls.add_day_totals(day_totals, sign))
+
+    @classmethod
+    def add_day_totals(cls, day_totals, sign=1):
+        """
+        Adds {day: totals} to the day-total rows, each with one increment in
+        its own statement (no lock outlives it).
+        """
+        for day, delta in day_totals.items():
+            deltas = {
+                'invoice_count': sign * len(delta['invoices']),
+                'units_sold': sign * delta['units_sold'],
+                'revenue': sign * delta['revenue'],
+                'cost': sign * delta['cost'],
+            }
+            # Racing first sales of a day may each create a row; readers sum them,
+            # so only one of them takes the increment
+            row_id = cls.objects.filter(date=day, product__isnull=True).order_by('id').values_list(
+                'id', flat=True
+            ).first()
+            if row_id is None:
+                cls.objects.create(date=day, **deltas)
+                continue
+            cls.objects.filter(pk=row_id).update(**{
+                field: F(field) + Value(value, output_field=cls._meta.get_field(field))
+                for field, value in deltas.items()
+            })
+
+    @classmethod
+    def rebuild(cls, date_from=None, date_to=None):
+        """Recomputes the rollup (optionally for a date range) from SaleItem; returns rows written."""
+        items = SaleItem.objects.annotate(date=TruncDate('invoice__sale_date'))
+        rows = cls.objects.all()
+        # Bounds on sale_date itself (not the truncated date) so the range is an
+        # index search on invoices, joined to their lines through the invoice FK
+        if date_from:
+            items = items.filter(invoice__sale_date__gte=timezone.make_aware(datetime.combine(date_from, time.min)))
+            rows = rows.filter(date__gte=date_from)
+        if date_to:
+            items = items.filter(
+                invoice__sale_date__lt=timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+            )
+            rows = rows.filter(date__lte=date_to)
+
+        money = DecimalField(max_digits=14, decimal_places=2)
+        sums = dict(
+            invoice_count=Count('invoice', distinct=True),
+            units_sold=Sum('sold_quantity'),
+            revenue=Sum(F('unit_sale_price') * F('sold_quantity'), output_field=money),
+            cost=Sum(F('unit_cost_price') * F('sold_quantity'), output_field=money),
+        )
+
+        rows.delete()
+        new_rows = [
+            cls(date=row['date'], product_id=row['product'], category_id=row['product__category'],
+                **{field: row[field] for field in sums})
+            for row in items.values('date', 'product', 'product__category').annotate(**sums).order_by().iterator()
+        ]
+        new_rows += [
+            cls(date=row['date'], **{field: row[field] for field in sums})
+            for row in items.values('date').annotate(**sums).order_by().iterator()
+        ]
+        cls.objects.bulk_create(new_rows, batch_size=1000)
+        return len(new_rows)
+
+
+@receiver(pre_delete, sender=SaleInvoice)
+def remove_deleted_sale_from_rollup(sender, instance, **kwargs):
+    """Takes a deleted invoice's lines back out of the rollup (before its items cascade away)."""
+    DailySalesRollup.record(
+        [
+            (instance.sale_date, instance.id, product_id, category_id, quantity, price * quantity, cost * quantity)
+            for product_id, category_id, quantity, price, cost in instance.items.values_list(
+                'product_id', 'product__category_id', 'sold_quantity', 'unit_sale_price', 'unit_cost_price'
+            )
+        ],
+        sign=-1
+    )
+
+
+# ----------------------------------------------------
+# SALES VELOCITY / REORDER SUGGESTIONS
+# ----------------------------------------------------
+
+class ProductVelocity(models.Model):
+    """
+    Sales velocity per product: an exponential moving average of units sold
+    per day over about REORDER_VELOCITY_SPAN_DAYS days, with the reorder
+    point it implies. `manage.py update_product_velocity` (nightly) folds the
+    DailySalesRollup days after `as_of` into it, so each run reads only the
+    days that are new, never SaleItem.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='velocity')
+    units_per_day = models.DecimalField(max_digits=10, decimal_places=3, default=0)
+    reorder_point = models.IntegerField(
+        default=0, help_text="Units expected to sell over the lead time plus safety days."
+    )
+    last_sale_date = models.DateField(null=True, blank=True)
+    as_of = models.DateField(help_text="Last day of sales folded into the average.")
+
+    class Meta:
+        verbose_name_plural = "Product velocities"
+
+    def __str__(self):
+        return f"Product {self.product_id}: {self.units_per_day}/day as of {self.as_of}"
+
+    @classmethod
+    def update(cls, through=None, rebuild=False):
+        """
+        Folds every day after the last run up to `through` (default:
+        yesterday, today's sales are not complete yet) into the averages.
+        The first run, or a rebuild, starts 4 spans back; older days would
+        weigh under 1/1000. Sales uploaded later for days already folded in
+        are only picked up by a rebuild.
+
+        Returns: The number of days processed.
+        """
+        through = through or timezone.localdate() - timedelta(days=1)
+        span = getattr(settings, 'REORDER_VELOCITY_SPAN_DAYS', 28)
+        if rebuild:
+            cls.objects.all().delete()
+        last = cls.objects.aggregate(last=Max('as_of'))['last']
+        start = last + timedelta(days=1) if last else through - timedelta(days=4 * span - 1)
+        if start > through:
+            return 0
+        days = [start + timedelta(days=offset) for offset in range((through - start).days + 1)]
+
+        # 1. Units sold per product and day (rollup rows are additive, so sum duplicates)
+        sold = defaultdict(dict)
+        for row in DailySalesRollup.objects.filter(
+            date__gte=start, date__lte=through, product__isnull=False
+        ).values('product', 'date').annotate(units=Sum('units_sold')).order_by():
+            sold[row['product']][row['date']] = row['units']
+
+        # 2. Step every average forward one day at a time (a day without sales decays it)
+        rows = {row.product_id: row for row in cls.objects.select_for_update()}
+        new = [cls(product_id=pid, units_per_day=Decimal(0)) for pid in sold.keys() - rows.keys()]
+        alpha = Decimal(2) / (span + 1)
+        horizon = getattr(settings, 'REORDER_LEAD_TIME_DAYS', 7) + getattr(settings, 'REORDER_SAFETY_DAYS', 3)
+        for row in [*rows.values(), *new]:
+            velocity, units_by_day = row.units_per_day, sold.get(row.product_id, {})
+            for day in days:
+                units = units_by_day.get(day, 0)
+                velocity = alpha * units + (1 - alpha) * velocity
+                if units:
+                    row.last_sale_date = day
+            row.units_per_day = velocity.quantize(Decimal('0.001'))
+            row.reorder_point = math.ceil(row.units_per_day * horizon)
+            row.as_of = through
+
+        cls.objects.bulk_update(
+            rows.values(), ['units_per_day', 'reorder_point', 'last_sale_date', 'as_of'], batch_size=1000
+        )
+        cls.objects.bulk_create(new, batch_size=1000)
+        return len(days)
+
+    @staticmethod
+    def suggest(units_per_day, quantity):
+        """
+        Days the stock on hand lasts at this velocity, and the order that
+        tops it up to REORDER_COVER_DAYS of sales past the lead time.
+
+        Returns: (days_of_cover or None when nothing sells, suggested_quantity)
+        """
+        if not units_per_day:
+            return None, 0
+        days_of_cover = round(float(quantity / units_per_day), 1)
+        horizon = getattr(settings, 'REORDER_LEAD_TIME_DAYS', 7) + getattr(settings, 'REORDER_COVER_DAYS', 30)
+        target = math.ceil(units_per_day * horizon)
+        return days_of_cover, max(target - quantity, 0)
+
+
+# ----------------------------------------------------
+# LOW-STOCK FEED
+# ----------------------------------------------------
+
+class LowStockEvent(models.Model):
+    """
+    One change to the low-stock list: a product entering it, leaving it, or
+    changing quantity/threshold while on it. Written alongside Stock updates;
+    clients poll /api/dashboard/low-stock/changes/?since=<id> for new rows.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    is_low = models.BooleanField()
+    quantity = models.IntegerField()
+    low_stock_threshold = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        state = 'low' if self.is_low else 'restocked'
+        return f"Product {self.product_id} {state} ({self.quantity}/{self.low_stock_threshold})"
+
+    @staticmethod
+    def fields_for(stock):
+        return dict(
+            product_id=stock.product_id, is_low=stock.is_low,
+            quantity=stock.quantity, low_stock_threshold=stock.low_stock_threshold,
+        )
+
+
+# ----------------------------------------------------
+# STOCK LEDGER
+# ----------------------------------------------------
+
+class StockMovement(models.Model):
+    """
+    Append-only ledger of every change to stock on hand.
+
+    Stock.quantity is the sum of a product's movements and Batch.quantity the
+    sum of a batch's movements; both are kept up to date by StockLedger.
+    Movements without a batch carry stock that was never linked to one
+    (opening balances only). `manage.py verify_stock_ledger` recomputes both
+    projections from here.
+    """
+    OPENING = 'opening'
+    PURCHASE = 'purchase'
+    PURCHASE_EDIT = 'purchase_edit'
+    PURCHASE_VOID = 'purchase_void'
+    SALE = 'sale'
+    REASON_CHOICES = [
+        (OPENING, 'Opening balance'),
+        (PURCHASE, 'Purchase received'),
+        (PURCHASE_EDIT, 'Purchase quantity corrected'),
+        (PURCHASE_VOID, 'Purchase deleted'),
+        (SALE, 'Sale'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    # RESTRICT: a batch with history can only go away together with its product
+    batch = models.ForeignKey(
+        Batch, on_delete=models.RESTRICT, null=True, blank=True, related_name='movements'
+    )
+    quantity = models.IntegerField(help_text="Signed change: positive into stock, negative out of it.")
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    purchase = models.ForeignKey(
+        Purchase, on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements'
+    )
+    sale_invoice = models.ForeignKey(
+        SaleInvoice, on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_reason_display()}: {self.quantity:+d} x product {self.product_id}"
+
+    @classmethod
+    def balances(cls):
+        """
+        Folds the ledger into balances in one pass (grouped by the database).
+
+        Returns: ({product_id: quantity}, {batch_id: quantity}).
+        """
+        stock_totals, batch_totals = defaultdict(int), defaultdict(int)
+        grouped = cls.objects.order_by().values('product_id', 'batch_id').annotate(
+            total=Sum('quantity')
+        ).values_list('product_id', 'batch_id', 'total')
+        for product_id, batch_id, total in grouped.iterator(chunk_size=2000):
+            stock_totals[product_id] += total
+            if batch_id is not None:
+                batch_totals[batch_id] += total
+        return stock_totals, batch_totals
+
+    @classmethod
+    def reconcile(cls, fix=False):
+        """
+        Compares every Stock and Batch quantity with the ledger, streaming both tables.
+
+        The scan takes no locks, so a sale committing between the ledger read
+        and the row read looks like drift. With fix=True the drifted rows are
+        therefore locked (in the StockLedger's order: Stock by product, then
+        Batch), compared again with their ledger sums, and only rows that still
+        disagree are rewritten, all in one transaction; the dashboard snapshot
+        is then rebuilt.
+
+        Returns: A list of (model, id, recorded quantity, ledger quantity) for each
+        row that drifted (with fix=True: each row that was rewritten).
+        """
+        stock_totals, batch_totals = cls.balances()
+        drift = []
+        for model, totals, key in ((Stock, stock_totals, 'product_id'), (Batch, batch_totals, 'id')):
+            for row in model.objects.only('id', key, 'quantity').order_by('id').iterator(chunk_size=2000):
+                expected = totals.get(getattr(row, key), 0)
+                if row.quantity != expected:
+                    drift.append((model.__name__, row.id, row.quantity, expected))
+        if not (fix and drift):
+            return drift
+
+        with transaction.atomic():
+            stock_ids = [row_id for model, row_id, _, _ in drift if model == 'Stock']
+            batch_ids = [row_id for model, row_id, _, _ in drift if model == 'Batch']
+            product_ids = set(Stock.objects.filter(id__in=stock_ids).values_list('product_id', flat=True))
+            product_ids.update(Batch.objects.filter(id__in=batch_ids).values_list('product_id', flat=True))
+
+            # 1. Lock the rows, then read their ledger sums: no sale can move them in between
+            stocks = list(Stock.objects.select_for_update().filter(product_id__in=product_ids).order_by('product_id'))
+            batches = list(Batch.objects.select_for_update().filter(id__in=batch_ids).order_by(
+                'product_id', 'expiry_date', 'purchase_date', 'id'
+            ))
+            stock_totals = dict(cls.objects.filter(product_id__in=product_ids).order_by().values(
+                'product_id'
+            ).annotate(total=Sum('quantity')).values_list('product_id', 'total'))
+            batch_totals = dict(cls.objects.filter(batch_id__in=batch_ids).order_by().values(
+                'batch_id'
+            ).annotate(total=Sum('quantity')).values_list('batch_id', 'total'))
+
+            # 2. Rewrite only the rows that still disagree
+            drift = []
+            events = []
+            stale_stocks = []
+            for stock in stocks:
+                expected = stock_totals.get(stock.product_id, 0)
+                if stock.id not in stock_ids or stock.quantity == expected:
+                    continue
+                drift.append(('Stock', stock.id, stock.quantity, expected))
+                was_low = stock.is_low
+                stock.quantity = expected
+                stock.is_low = bool(low_stock_flag(stock.quantity, stock.low_stock_threshold))
+                # Same rule as StockLedger.save: entering, leaving, or moving while low (the quantity moved)
+                if stock.is_low or was_low:
+                    events.append(LowStockEvent(**LowStockEvent.fields_for(stock)))
+                stale_stocks.append(stock)
+            stale_batches = []
+            for batch in batches:
+                expected = batch_totals.get(batch.id, 0)
+                if batch.quantity != expected:
+                    drift.append(('Batch', batch.id, batch.quantity, expected))
+                    batch.quantity = expected
+                    stale_batches.append(batch)
+
+            if drift:
+                Stock.objects.bulk_update(stale_stocks, ['quantity', 'is_low'], batch_size=1000)
+                LowStockEvent.objects.bulk_create(events, batch_size=1000)
+                Batch.objects.bulk_update(stale_batches, ['quantity'], batch_size=1000)
+                InventorySnapshot.rebuild()
+                catalogue_cache.invalidate('product')
+        return drift
+
+
+class StockLedger:
+    """
+    The one write path for stock on hand.
+
+    Callers lock the Stock and Batch rows they change (select_for_update) and
+    move stock through move(), which records a StockMovement and applies it to
+    those rows in memory. save() then inserts the movements and writes the
+    rows back with one statement per table, and pushes the resulting stock
+    value and low-stock changes to the dashboard snapshot. Must be used inside
+    transaction.atomic().
+    """
+
+    def __init__(self):
+        self.movements = []
+        self._stocks = {}
+        self._batches = {}
+
+    def track(self, row):
+        """Registers a locked Stock or Batch row before it is changed (re-pricing included)."""
+        if isinstance(row, Stock):
+            self._stocks.setdefault(row.product_id, (row, row.quantity))
+        else:
+            self._batches.setdefault(row.pk, (row, row.quantity, row.cost_price))
+
+    def move(self, stock, batch, quantity, reason, purchase=None, sale_invoice=None):
+        """Records a signed quantity change for a product (and batch, if any)."""
+        self.track(stock)
+        stock.quantity += quantity
+        if batch is not None:
+            self.track(batch)
+            batch.quantity += quantity
+        self.movements.append(StockMovement(
+            product_id=stock.product_id, batch=batch, quantity=quantity, reason=reason,
+            purchase=purchase, sale_invoice=sale_invoice,
+        ))
+
+    def save(self, batch_fields=('quantity',)):
+        """Writes the movements and every tracked row; batch_fields lists the Batch columns to write."""
+        if self.movements:
+            StockMovement.objects.bulk_create(self.movements, batch_size=1000)
+        if self._batches:
+            Batch.objects.bulk_update([row for row, _, _ in self._batches.values()], list(batch_fields))
+        if self._stocks:
+            events = []
+            for row, quantity in self._stocks.values():
+                was_low = row.is_low
+                row.is_low = bool(low_stock_flag(row.quantity, row.low_stock_threshold))
+                # Feed every change a low-stock list would show: entering, leaving, or moving while low
+                if (row.is_low or was_low) and (row.is_low != was_low or row.quantity != quantity):
+                    events.append(LowStockEvent(**LowStockEvent.fields_for(row)))
+            Stock.objects.bulk_update([row for row, _ in self._stocks.values()], ['quantity', 'is_low'])
+            if events:
+                LowStockEvent.objects.bulk_create(events)
+        if self._stocks or self._batches:
+            # bulk_update fires no signals; product payloads embed stock and batches
+            catalogue_cache.invalidate('product')
+
+        InventorySnapshot.adjust(
+            total_stock_value=sum(
+                batch_value(row.quantity, row.cost_price) - batch_value(quantity, cost_price)
+                for row, quantity, cost_price in self._batches.values()
+            ),
+            low_stock_count=sum(
+                low_stock_flag(row.quantity, row.low_stock_threshold)
+                - low_stock_flag(quantity, row.low_stock_threshold)
+                for row, quantity in self._stocks.values()
+            ),
+        )
+
+
+# ----------------------------------------------------
+# PRODUCT SEARCH INDEX
+# ----------------------------------------------------
+
+@receiver(post_save, sender=Product)
+def index_product_name(sender, instance, update_fields=None, **kwargs):
+    """Keeps the ProductTrigram rows in sync with the product name."""
+    if update_fields is not None and 'name' not in update_fields:
+        return
+    ProductTrigram.objects.filter(product=instance).delete()
+    # Trigrams distinct in Python can still collide in the column: MySQL's default
+    # accent-insensitive collation compares 'crè' equal to 'cre'. One row serves both.
+    ProductTrigram.objects.bulk_create(
+        (ProductTrigram(product=instance, trigram=gram) for gram in name_trigrams(instance.name)),
+        ignore_conflicts=True,
+    )
+
+
 # ----------------------------------------------------
 # 🚨 PURCHASE SIGNALS (Stock IN) 🚨
 # ----------------------------------------------------
@@ -190,28 +949,27 @@ def create_batch_and_update_stock(sender, instance, created, **kwargs):
 
         with transaction.atomic():
             try:
-                # 1. ATOMICALLY UPDATE TOTAL STOCK
-                Stock.objects.filter(product=instance.product).update(
-                    quantity=F('quantity') + instance.purchase_quantity
-                )
-                
-                # 2. CREATE/UPDATE BATCH RECORD
+                # 1. LOCK TOTAL STOCK AND THE BATCH BEING TOPPED UP
+                stock = Stock.objects.select_for_update().get(product=instance.product)
                 batch_number = instance.batch_number_input or instance.invoice_number or f'PUR-{instance.id}'
-                expiry_date = instance.expiry_date_input 
-                
-                batch, _ = Batch.objects.update_or_create(
-                    product=instance.product,
-                    batch_number=batch_number,
-                    defaults={
-                        'cost_price': instance.unit_purchase_price,
-                        'expiry_date': expiry_date,
-                    },
-                )
-                
-                # Atomically increment quantity for the batch
-                Batch.objects.filter(id=batch.id).update(
-                    quantity=F('quantity') + instance.purchase_quantity
-                )
+                batch = Batch.objects.select_for_update().filter(
+                    product=instance.product, batch_number=batch_number
+                ).first()
+                if batch is None:
+                    batch = Batch.objects.create(
+                        product=instance.product,
+                        batch_number=batch_number,
+                        cost_price=instance.unit_purchase_price,
+                        expiry_date=instance.expiry_date_input,
+                    )
+
+                # 2. RE-PRICE THE BATCH AND BOOK THE QUANTITY THROUGH THE LEDGER
+                ledger = StockLedger()
+                ledger.track(batch)
+                batch.cost_price = instance.unit_purchase_price
+                batch.expiry_date = instance.expiry_date_input
+                ledger.move(stock, batch, instance.purchase_quantity, StockMovement.PURCHASE, purchase=instance)
+                ledger.save(batch_fields=['quantity', 'cost_price', 'expiry_date'])
 
                 # 3. LINK BATCH BACK TO PURCHASE
                 Purchase.objects.filter(id=instance.id).update(batch_created=batch)
@@ -222,29 +980,24 @@ def create_batch_and_update_stock(sender, instance, created, **kwargs):
 
 
 @receiver(post_delete, sender=Purchase)
-def revert_stock_and_batch(sender, instance, **kwargs):
+def revert_stock_and_batch(sender, instance, origin=None, **kwargs):
     """Handles atomic stock and batch reversal when a Purchase is deleted."""
-    quantity_to_revert = instance.purchase_quantity
-    
-    with transaction.atomic():
-        # 1. ATOMICALLY DECREMENT TOTAL STOCK
-        Stock.objects.filter(product=instance.product).update(
-            quantity=F('quantity') - quantity_to_revert
-        )
-        Stock.objects.filter(product=instance.product, quantity__lt=0).update(quantity=0)
+    # Deleting the product takes its stock, batches and ledger with it
+    if isinstance(origin, Product) or getattr(origin, 'model', None) is Product:
+        return
 
-        # 2. ATOMICALLY REVERT BATCH QUANTITY
-        try:
-            batch_id = instance.batch_created.id
-            
-            Batch.objects.filter(id=batch_id).update(
-                quantity=F('quantity') - quantity_to_revert
-            )
-            
-            # Delete batch if quantity hits zero or less
-            Batch.objects.filter(id=batch_id, quantity__lte=0).delete()
-            
-        except Batch.DoesNotExist:
-            pass
-        except AttributeError:
-            pass
\ No newline at end of file
+    with transaction.atomic():
+        # 1. LOCK TOTAL STOCK AND THE PURCHASE'S BATCH
+        stock = Stock.objects.select_for_update().filter(product_id=instance.product_id).first()
+        if stock is None:
+            return
+        batch = Batch.objects.select_for_update().filter(id=instance.batch_created_id).first()
+
+        # 2. TAKE BACK WHAT IS STILL ON HAND (units already sold stay sold).
+        #    The batch is kept, even when empty: sales and the ledger point at it.
+        on_hand = batch.quantity if batch else stock.quantity
+        quantity_to_revert = min(instance.purchase_quantity, on_hand, stock.quantity)
+        if quantity_to_revert > 0:
+            ledger = StockLedger()
+            ledger.move(stock, batch, -quantity_to_revert, StockMovement.PURCHASE_VOID)
+            ledger.save()
@@ -0,0 +1,42 @@
+# inventory/pagination.py
+
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class OptionalCursorPagination(CursorPagination):
+    """
+    Cursor pagination that only kicks in when the client asks for it
+    (?page_size= or ?cursor=), so existing callers still get a plain list.
+
+    Each subclass must be backed by an index on its ordering fields: the cursor
+    turns every page into an indexed range scan, so deep pages cost the same
+    as the first.
+    """
+    page_size = getattr(settings, 'API_PAGE_SIZE', 50)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 500)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class ProductCursorPagination(OptionalCursorPagination):
+    # Backed by the (is_active, name) index
+    ordering = ('name',)
+
+
+class SaleInvoiceCursorPagination(OptionalCursorPagination):
+    # Backed by the (sale_date, id) index
+    ordering = ('-sale_date', '-id')
+
+
+class PurchaseCursorPagination(OptionalCursorPagination):
+    # The cursor position is taken from the first field alone, so it must be
+    # (near-)unique: a DateField would stall on a day with more purchases than
+    # offset_cutoff. Backed by the primary key; ids follow purchase_date
+    # (auto_now_add), so this is still newest first.
+    ordering = ('-id',)
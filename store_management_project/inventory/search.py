@@ -0,0 +1,108 @@
+# inventory/search.py
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Product, ProductTrigram, Stock, name_trigrams
+
+
+class SearchResultCache:
+    """
+    Small in-process LRU cache for POS search results.
+
+    Entries expire after `ttl` seconds (stock quantities change through bulk
+    updates that fire no signals) and the whole cache is dropped whenever a
+    Product or Stock row is saved or deleted.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+search_cache = SearchResultCache(
+    max_entries=getattr(settings, 'PRODUCT_SEARCH_CACHE_SIZE', 256),
+    ttl=getattr(settings, 'PRODUCT_SEARCH_CACHE_TTL', 5),
+)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Stock)
+@receiver(post_delete, sender=Stock)
+def clear_search_cache(sender, **kwargs):
+    search_cache.clear()
+
+
+def search_products(query, limit):
+    """
+    Returns up to `limit` active products whose name matches `query`, as
+    dicts with id, name, mrp and stock quantity. Prefix matches come first.
+
+    Queries of three or more characters are narrowed through the trigram
+    index (products containing every trigram of the query) before the
+    substring check, so no full scan of Product.name is needed.
+    """
+    query = ' '.join(query.lower().split())
+    key = (query, limit)
+    cached = search_cache.get(key)
+    if cached is not None:
+        return cached
+
+    # The query's whitespace is collapsed (as in the trigram index), so a space
+    # in it matches any run of whitespace in the name
+    if ' ' in query:
+        pattern = r'\s+'.join(re.escape(word) for word in query.split(' '))
+        contains, prefix = Q(name__iregex=pattern), Q(name__iregex='^' + pattern)
+    else:
+        contains, prefix = Q(name__icontains=query), Q(name__istartswith=query)
+
+    products = Product.objects.filter(is_active=True)
+    grams = name_trigrams(query)
+    if grams:
+        candidate_ids = ProductTrigram.objects.filter(trigram__in=grams).values('product').annotate(
+            hits=Count('id')
+        ).filter(hits=len(grams)).values('product')
+        products = products.filter(contains, id__in=candidate_ids)
+    elif query:
+        products = products.filter(prefix)
+
+    results = list(
+        products.annotate(
+            rank=Case(When(prefix, then=Value(0)), default=Value(1), output_field=IntegerField())
+        ).order_by('rank', 'name').values('id', 'name', 'mrp', 'stock__quantity')[:limit]
+    )
+    search_cache.set(key, results)
+    return results
@@ -2,17 +2,19 @@ from django.utils import timezone
 from rest_framework import serializers
 from django.db import transaction
 from decimal import Decimal
-from django.db.models import F
 from django.contrib.auth.models import User
-from django.core.exceptions import ObjectDoesNotExist
 
 from .models import (
     Batch, SaleInvoice, SaleItem, Supplier,
-    Category, Product, Purchase, Stock
+    Category, Product, Purchase, Stock,
+    DailySalesRollup, InventorySnapshot, StockLedger, StockMovement
 )
 
 # 🚨 Import the stock deduction utility that handles atomic FEFO/FIFO logic 🚨
-from .utils import deduct_stock_from_batches 
+from .utils import (
+    build_sale_items, deduct_stock_for_items, invoice_totals,
+    next_invoice_number, receive_goods, rollup_lines
+)
 
 
 # -----------------------------
@@ -62,8 +64,12 @@ class ProductSerializer(serializers.ModelSerializer):
         read_only_fields = ('category_name', 'stock_details', 'active_batches')
 
     def get_active_batches(self, obj):
-        # Optimized: only fetch batches with positive quantity
-        batches = obj.batches.filter(quantity__gt=0).order_by('expiry_date', 'purchase_date')
+        # Use the list prefetched by the view (see active_batches_prefetch) when present,
+        # so listing N products costs one batch query instead of N.
+        batches = getattr(obj, 'prefetched_active_batches', None)
+        if batches is None:
+            # Optimized: only fetch batches with positive quantity
+            batches = obj.batches.filter(quantity__gt=0).order_by('expiry_date', 'purchase_date')
         return BatchSerializer(batches, many=True).data
 
     def create(self, validated_data):
@@ -73,6 +79,16 @@ class ProductSerializer(serializers.ModelSerializer):
         return product
 
 
+# -----------------------------
+# PRODUCT SEARCH SERIALIZER (slim POS payload)
+# -----------------------------
+class ProductSearchResultSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    mrp = serializers.DecimalField(max_digits=10, decimal_places=2)
+    stock_quantity = serializers.IntegerField(source='stock__quantity', allow_null=True)
+
+
 # -----------------------------
 # SUPPLIER SERIALIZER
 # -----------------------------
@@ -117,8 +133,10 @@ class PurchaseSerializer(serializers.ModelSerializer):
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        # 1. Capture old quantity
+        # 1. Capture old quantity and lock the rows the edit changes
         old_quantity = instance.purchase_quantity
+        stock = Stock.objects.select_for_update().filter(product_id=instance.product_id).first()
+        batch = Batch.objects.select_for_update().filter(id=instance.batch_created_id).first()
         
         # 2. Update the Purchase instance
         instance = super().update(instance, validated_data)
@@ -126,31 +144,112 @@ class PurchaseSerializer(serializers.ModelSerializer):
         new_quantity = instance.purchase_quantity
         stock_change = new_quantity - old_quantity
 
-        # 3. Update the associated Batch record
-        if instance.batch_created:
-            Batch.objects.filter(id=instance.batch_created.id).update(
-                quantity=F('quantity') + stock_change,
-                cost_price=instance.unit_purchase_price,
-                batch_number=instance.batch_number_input or instance.invoice_number or instance.batch_created.batch_number,
-                expiry_date=instance.expiry_date_input,
-            )
-            
-            # 4. Defensive check: remove zeroed-out batches
-            Batch.objects.filter(
-                id=instance.batch_created.id, 
-                quantity__lte=0
-            ).delete()
-            
-        # 5. Atomically update the Stock record
-        Stock.objects.filter(product=instance.product).update(quantity=F('quantity') + stock_change)
+        # 3. Units already sold cannot be taken back
+        on_hand = batch.quantity if batch else (stock.quantity if stock else 0)
+        if on_hand + stock_change < 0:
+            raise serializers.ValidationError({
+                'purchase_quantity': f"Only {on_hand} units from this purchase are still in stock; "
+                                     f"the quantity can be lowered by at most that much."
+            })
+
+        # 4. Re-price/re-label the associated Batch record
+        ledger = StockLedger()
+        if batch:
+            ledger.track(batch)
+            batch.cost_price = instance.unit_purchase_price
+            batch.batch_number = instance.batch_number_input or instance.invoice_number or batch.batch_number
+            batch.expiry_date = instance.expiry_date_input
+
+        # 5. Book the quantity correction through the stock ledger (updates Stock, Batch and the snapshot)
+        if stock and stock_change:
+            ledger.move(stock, batch, stock_change, StockMovement.PURCHASE_EDIT, purchase=instance)
+        ledger.save(batch_fields=['quantity', 'cost_price', 'batch_number', 'expiry_date'])
         
         return instance
 
 
+# -----------------------------
+# GOODS RECEIPT (BULK PURCHASE) SERIALIZERS
+# -----------------------------
+class GoodsReceiptLineSerializer(serializers.Serializer):
+    # Plain ids: products are validated in one query for the whole delivery
+    product = serializers.IntegerField()
+    purchase_quantity = serializers.IntegerField(min_value=1)
+    unit_purchase_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+    batch_number_input = serializers.CharField(max_length=50, required=False, allow_null=True, allow_blank=True)
+    expiry_date_input = serializers.DateField(required=False, allow_null=True)
+
+
+class GoodsReceiptSerializer(serializers.Serializer):
+    """A whole supplier delivery, booked with set-based writes (see utils.receive_goods)."""
+    supplier = serializers.PrimaryKeyRelatedField(queryset=Supplier.objects.all(), required=False, allow_null=True)
+    invoice_number = serializers.CharField(max_length=50, required=False, allow_null=True, allow_blank=True)
+    lines = GoodsReceiptLineSerializer(many=True, allow_empty=False)
+
+    def validate(self, data):
+        invoice_number = data.get('invoice_number') or None
+        product_ids = {line['product'] for line in data['lines']}
+        known = set(Product.objects.filter(id__in=product_ids).values_list('id', flat=True))
+        if product_ids - known:
+            raise serializers.ValidationError(
+                f"Unknown product id(s): {', '.join(map(str, sorted(product_ids - known)))}."
+            )
+
+        for line in data['lines']:
+            # Same batch code rule as the Purchase signal, minus the PUR-<id> fallback:
+            # ids of bulk-inserted rows are not known up front on every database.
+            line['batch_number'] = line.get('batch_number_input') or invoice_number
+            if not line['batch_number']:
+                raise serializers.ValidationError(
+                    "Each line needs a batch_number_input when the delivery has no invoice_number."
+                )
+        return data
+
+    def create(self, validated_data):
+        return receive_goods(
+            [
+                {
+                    'product_id': line['product'],
+                    'purchase_quantity': line['purchase_quantity'],
+                    'unit_purchase_price': line['unit_purchase_price'],
+                    'batch_number_input': line.get('batch_number_input') or None,
+                    'batch_number': line['batch_number'],
+                    'expiry_date': line.get('expiry_date_input'),
+                }
+                for line in validated_data['lines']
+            ],
+            supplier=validated_data.get('supplier'),
+            invoice_number=validated_data.get('invoice_number') or None,
+        )
+
+    def to_representation(self, purchases):
+        return {
+            'lines_received': len(purchases),
+            'units_received': sum(p.purchase_quantity for p in purchases),
+            'batches': sorted({p.batch_created_id for p in purchases}),
+        }
+
+
 # -----------------------------
 # SALE ITEM SERIALIZER
 # -----------------------------
+class BillProductField(serializers.PrimaryKeyRelatedField):
+    """
+    Product by id, taken from the bill's products that SaleInvoiceSerializer
+    loads in one query (context['bill_products']) instead of one per line.
+    Ids it does not hold fall back to the usual lookup and its errors.
+    """
+
+    def to_internal_value(self, data):
+        products = self.context.get('bill_products') or {}
+        try:
+            return products[int(data)]
+        except (KeyError, TypeError, ValueError):
+            return super().to_internal_value(data)
+
+
 class SaleItemSerializer(serializers.ModelSerializer):
+    product = BillProductField(queryset=Product.objects.all())
     product_name = serializers.ReadOnlyField(source='product.name')
     item_total = serializers.SerializerMethodField()
 
@@ -188,48 +287,57 @@ class SaleInvoiceSerializer(serializers.ModelSerializer):
             'final_total', 'sale_items'
         ]
 
+    def to_internal_value(self, data):
+        # Every product on the bill in one query, for BillProductField
+        items = data.get('items') if hasattr(data, 'get') else None
+        if isinstance(items, list):
+            ids = {str(item.get('product')) for item in items if isinstance(item, dict)}
+            self.context['bill_products'] = Product.objects.in_bulk([int(pk) for pk in ids if pk.isdigit()])
+        return super().to_internal_value(data)
+
     def validate(self, data):
         """Pre-check validation for basic stock availability."""
         items_data = data.get('items', [])
+
+        # Total requested per product, so repeated lines are checked together
+        requested = {}
+        products = {}
         for item in items_data:
             product = item.get('product')
-            sold_quantity = item.get('sold_quantity')
-            
             if not product:
                 raise serializers.ValidationError("A sale item must contain a product.")
-            
-            try:
-                # Use the Stock object for the initial check
-                current_stock = product.stock.quantity
-                if sold_quantity > current_stock:
-                    raise serializers.ValidationError(
-                        f"Not enough stock for {product.name}. "
-                        f"Requested {sold_quantity}, available {current_stock}."
-                    )
-            except ObjectDoesNotExist:
+            requested[product.id] = requested.get(product.id, 0) + item.get('sold_quantity')
+            products[product.id] = product
+
+        # One query for every product on the bill instead of one per line
+        available = dict(
+            Stock.objects.filter(product_id__in=requested).values_list('product_id', 'quantity')
+        )
+        for product_id, sold_quantity in requested.items():
+            product = products[product_id]
+            if product_id not in available:
                 raise serializers.ValidationError(f"Product {product.name} has no stock record.")
+            current_stock = available[product_id]
+            if sold_quantity > current_stock:
+                raise serializers.ValidationError(
+                    f"Not enough stock for {product.name}. "
+                    f"Requested {sold_quantity}, available {current_stock}."
+                )
 
         return data
 
     @transaction.atomic
     def create(self, validated_data):
         items_data = validated_data.pop('items')
+        lines = [(item['product'].id, item['sold_quantity'], item['unit_sale_price']) for item in items_data]
 
         # --- 1. Calculate and Prepare Invoice Fields ---
-        subtotal = sum(
-            Decimal(item['sold_quantity']) * Decimal(item['unit_sale_price'])
-            for item in items_data
+        subtotal, tax_amount, final_total = invoice_totals(
+            lines, validated_data.get('discount_rate', 0), validated_data.get('tax_rate', 0)
         )
-        discount_rate = Decimal(validated_data.get('discount_rate', 0))
-        tax_rate = Decimal(validated_data.get('tax_rate', 0))
-        discounted_subtotal = subtotal * (Decimal('1') - discount_rate / Decimal('100'))
-        tax_amount = discounted_subtotal * (tax_rate / Decimal('100'))
-        final_total = discounted_subtotal + tax_amount
 
-        # Generate Invoice Number
-        last_invoice = SaleInvoice.objects.order_by('-id').first()
-        new_id = (last_invoice.id if last_invoice else 0) + 1
-        invoice_number = f"INV-{new_id:05d}"
+        # Generate Invoice Number (block-reserved, no per-sale counter lock)
+        invoice_number = next_invoice_number()
 
         # 2. Create the SaleInvoice instance
         invoice = SaleInvoice.objects.create(
@@ -240,44 +348,215 @@ class SaleInvoiceSerializer(serializers.ModelSerializer):
             **validated_data
         )
 
-        # 3. Process each item, deduct stock atomically, and create SaleItems
-        for item_data in items_data:
-            product = item_data['product']
-            sold_quantity = item_data['sold_quantity']
-            unit_sale_price = item_data['unit_sale_price']
-            
-            try:
-                # 💥 CORRECTED LOGIC: Use the atomic utility function
-                deductions = deduct_stock_from_batches(product.id, sold_quantity)
-                
-                # Create one SaleItem for the entire sold quantity, linking to the
-                # first batch used, and using the cost price of that batch.
-                
-                # NOTE: If stock was pulled from multiple batches, this simplified 
-                # SaleItem model loses some COGS accuracy. For full accuracy, you 
-                # would need to create multiple SaleItem records (one per batch deduction). 
-                # For simplicity here, we use the first batch's cost.
-                
-                first_batch_id, _, first_cost = deductions[0]
-                first_batch = Batch.objects.get(id=first_batch_id)
-
-                SaleItem.objects.create(
-                    invoice=invoice,
-                    product=product,
-                    sold_quantity=sold_quantity,
-                    unit_sale_price=unit_sale_price,
-                    unit_cost_price=first_cost, 
-                    batch=first_batch
-                )
+        InventorySnapshot.adjust(recent_revenue=invoice.final_total, recent_sales_count=1)
+
+        # 3. Deduct stock for the whole bill in one locked pass (FEFO)
+        try:
+            all_deductions = deduct_stock_for_items(
+                [(product_id, sold_quantity) for product_id, sold_quantity, _ in lines], sale_invoice=invoice
+            )
+        except Exception as e:
+            # Any failure here triggers an atomic rollback of the entire transaction
+            # (including the SaleInvoice creation).
+            raise serializers.ValidationError({'detail': str(e)})
+
+        # 4. Create all SaleItems in a single INSERT (one per batch with SPLIT_SALE_ITEMS_BY_BATCH)
+        sale_items = build_sale_items(invoice, lines, all_deductions)
+        SaleItem.objects.bulk_create(sale_items)
+
+        # The response renders these rows as they are (no SaleItem/Product re-read per line)
+        products = {item['product'].id: item['product'] for item in items_data}
+        for sale_item in sale_items:
+            sale_item.product = products[sale_item.product_id]
+        invoice._prefetched_objects_cache = {'items': sale_items}
 
-            except Exception as e:
-                # Any failure here triggers an atomic rollback of the entire transaction
-                # (including the SaleInvoice creation).
-                raise serializers.ValidationError({'detail': str(e)})
+        # 5. Fold the bill into the daily sales rollup (last, to keep its row locks short)
+        categories = {item['product'].id: item['product'].category_id for item in items_data}
+        DailySalesRollup.record(rollup_lines(invoice, sale_items, categories))
 
         return invoice
 
 
+# -----------------------------
+# BULK SALE INGEST SERIALIZERS (OFFLINE TILLS)
+# -----------------------------
+class SaleIngestItemSerializer(serializers.Serializer):
+    # Plain ids: products and stock are checked once for the whole upload
+    product = serializers.IntegerField()
+    sold_quantity = serializers.IntegerField(min_value=1)
+    unit_sale_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.00'))
+
+
+class SaleIngestInvoiceSerializer(serializers.Serializer):
+    """One bill from an offline till, booked with the rest of its upload (see utils.ingest_sales)."""
+    customer_name = serializers.CharField(max_length=100, required=False, allow_null=True, allow_blank=True)
+    discount_rate = serializers.DecimalField(max_digits=5, decimal_places=2, required=False, default=Decimal('0.00'))
+    tax_rate = serializers.DecimalField(max_digits=5, decimal_places=2, required=False, default=Decimal('0.00'))
+    # Time of sale at the till; defaults to the upload time
+    sale_date = serializers.DateTimeField(required=False, allow_null=True)
+    items = SaleIngestItemSerializer(many=True, allow_empty=False)
+
+
+# -----------------------------
+# FAST READ SERIALIZERS (.values() rows, hot list endpoints)
+# -----------------------------
+class ValuesSerializer:
+    """
+    Renders .values() rows in exactly the JSON shape of `serializer_class`,
+    without model instances or DRF's per-object field machinery.
+
+    Plain fields are formatted by the ModelSerializer's own field objects
+    (decimals, dates), related fields are the primary keys .values() already
+    returns, and nested or method fields are filled by build_<name>(rows),
+    which gets the whole page at once. Unless asked for in `fields`, those
+    builders (and the queries behind them) are skipped. Like DRF, a dotted
+    source through a null relation ('category.name' without a category)
+    leaves the key out.
+    """
+    serializer_class = None
+    # Prepended to every lookup, to read a related row's columns from a join
+    prefix = ''
+    # Lookups fetched in addition to the serialized columns
+    extra_lookups = ('id',)
+
+    _specs = {}
+
+    def __init__(self, fields=None):
+        self.fields = [name for name in self.field_names() if fields is None or name in fields]
+
+    @classmethod
+    def spec(cls):
+        """
+        {field name: (lookup, formatter, relation lookup)}. lookup is None for
+        fields built by build_<name>(); the key is left out of rows where the
+        relation lookup (if any) is null.
+        """
+        if cls not in ValuesSerializer._specs:
+            spec = {}
+            for name, field in cls.serializer_class().fields.items():
+                if field.write_only:
+                    continue
+                if isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField)):
+                    spec[name] = (None, None, None)
+                elif isinstance(field, serializers.RelatedField):
+                    spec[name] = (cls.prefix + field.source, None, None)
+                else:
+                    relation = None
+                    if len(field.source_attrs) > 1 and not (field.required or field.allow_null):
+                        relation = cls.prefix + '__'.join(field.source_attrs[:-1])
+                    spec[name] = (cls.prefix + '__'.join(field.source_attrs), field.to_representation, relation)
+            ValuesSerializer._specs[cls] = spec
+        return ValuesSerializer._specs[cls]
+
+    @classmethod
+    def field_names(cls):
+        return list(cls.spec())
+
+    @classmethod
+    def lookups(cls):
+        lookups = []
+        wanted = [
+            lookup for column, _, relation in cls.spec().values() for lookup in (column, relation) if lookup
+        ] + [cls.prefix + lookup for lookup in cls.extra_lookups]
+        for lookup in wanted:
+            if lookup not in lookups:
+                lookups.append(lookup)
+        return lookups
+
+    def values(self, queryset):
+        return queryset.prefetch_related(None).values(*self.lookups())
+
+    def to_representation(self, rows):
+        rows = list(rows)
+        spec = self.spec()
+        built = {
+            name: getattr(self, f'build_{name}')(rows)
+            for name in self.fields if spec[name][0] is None
+        }
+        data = []
+        for i, row in enumerate(rows):
+            item = {}
+            for name in self.fields:
+                lookup, formatter, relation = spec[name]
+                if lookup is None:
+                    item[name] = built[name][i]
+                elif relation is None or row[relation] is not None:
+                    value = row[lookup]
+                    item[name] = formatter(value) if formatter and value is not None else value
+            data.append(item)
+        return data
+
+    @staticmethod
+    def group_by(rows, key):
+        groups = {}
+        for row in rows:
+            groups.setdefault(row[key], []).append(row)
+        return groups
+
+
+class StockValuesSerializer(ValuesSerializer):
+    serializer_class = StockSerializer
+    prefix = 'stock__'
+
+
+class BatchValuesSerializer(ValuesSerializer):
+    serializer_class = BatchSerializer
+
+
+class ProductValuesSerializer(ValuesSerializer):
+    serializer_class = ProductSerializer
+    @classmethod
+    def lookups(cls):
+        # stock_details is read from the same row (Stock joined one-to-one, with its id)
+        return super().lookups() + StockValuesSerializer.lookups()
+
+    def build_stock_details(self, rows):
+        details = StockValuesSerializer().to_representation(rows)
+        return [detail if row['stock__id'] is not None else None for row, detail in zip(rows, details)]
+
+    def __init__(self, fields=None, batch_rows=None):
+        super().__init__(fields)
+        # In-stock batch rows (see active_batch_rows) fetched by the caller, if any
+        self.batch_rows = batch_rows
+
+    @staticmethod
+    def active_batch_rows(batches):
+        """Same rows and order as active_batches_prefetch(), as .values() rows of `batches`."""
+        return BatchValuesSerializer().values(batches.filter(quantity__gt=0).order_by('expiry_date', 'purchase_date'))
+
+    def build_active_batches(self, rows):
+        batch_rows = self.batch_rows
+        if batch_rows is None:
+            # One query per page
+            batch_rows = self.active_batch_rows(Batch.objects.filter(product_id__in=[row['id'] for row in rows]))
+        batches = self.group_by(batch_rows, 'product')
+        batch_serializer = BatchValuesSerializer()
+        return [batch_serializer.to_representation(batches.get(row['id'], [])) for row in rows]
+
+
+class SaleItemValuesSerializer(ValuesSerializer):
+    serializer_class = SaleItemSerializer
+    extra_lookups = ('id', 'invoice')
+
+    def build_item_total(self, rows):
+        return [row['unit_sale_price'] * row['sold_quantity'] for row in rows]
+
+
+class SaleInvoiceValuesSerializer(ValuesSerializer):
+    serializer_class = SaleInvoiceSerializer
+
+    def build_sale_items(self, rows):
+        item_serializer = SaleItemValuesSerializer()
+        items = self.group_by(item_serializer.values(
+            SaleItem.objects.filter(invoice_id__in=[row['id'] for row in rows]).order_by('id')
+        ), 'invoice')
+        return [item_serializer.to_representation(items.get(row['id'], [])) for row in rows]
+
+
+class PurchaseValuesSerializer(ValuesSerializer):
+    serializer_class = PurchaseSerializer
+
+
 # -----------------------------
 # USER SERIALIZER
 # -----------------------------
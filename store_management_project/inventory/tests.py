@@ -1,3 +1,1586 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import csv
+import io
+import os
+import re
+import sqlite3
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import ThreadSensitiveContext, async_to_sync
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.db.utils import load_backend
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import (
+    Batch, Category, DailySalesRollup, InventorySnapshot, InvoiceSequence, LowStockEvent, Product, ProductTrigram,
+    ProductVelocity, Purchase, SaleInvoice, SaleItem, Stock, StockMovement, Supplier
+)
+from . import bench, utils
+from .cache import catalogue_cache
+from .db import pool
+from .db.pool import ConnectionPool, PoolTimeout
+from .middleware import QueryCollector, recent_requests
+from .pagination import PurchaseCursorPagination
+from .search import search_cache
+from .utils import InvoiceNumberAllocator, deduct_stock_for_items
+from .serializers import ProductSerializer, PurchaseSerializer, SaleInvoiceSerializer
+from .views import (
+    LowStockChangesView, LowStockListView, ProductViewSet, PurchaseHistoryListView, SaleHistoryListView, SalesExportView,
+    active_batches_prefetch
+)
+
+
+def make_product(name, batches=()):
+    """Creates a product with a Stock record and receives each (batch_number, qty, cost, expiry) via a Purchase."""
+    product = Product.objects.create(name=name, base_price=Decimal('10.00'), mrp=Decimal('12.00'))
+    Stock.objects.create(product=product, quantity=0)
+    for batch_number, quantity, cost, expiry in batches:
+        Purchase.objects.create(
+            product=product, purchase_quantity=quantity, unit_purchase_price=Decimal(cost),
+            batch_number_input=batch_number, expiry_date_input=expiry,
+        )
+    return product
+
+
+class BatchedDeductionTests(TestCase):
+
+    def test_fefo_across_batches(self):
+        product = make_product('Paracetamol', [
+            ('LATE', 5, '2.00', date(2031, 1, 1)),
+            ('EARLY', 3, '1.50', date(2030, 1, 1)),
+        ])
+
+        [deductions] = deduct_stock_for_items([(product.id, 4)])
+
+        early = Batch.objects.get(batch_number='EARLY')
+        late = Batch.objects.get(batch_number='LATE')
+        self.assertEqual(deductions, [(early.id, 3, Decimal('1.50')), (late.id, 1, Decimal('2.00'))])
+        self.assertEqual(early.quantity, 0)
+        self.assertEqual(late.quantity, 4)
+        self.assertEqual(Stock.objects.get(product=product).quantity, 4)
+
+    def test_repeated_product_lines_share_allocation(self):
+        product = make_product('Bandage', [('B1', 5, '1.00', None)])
+
+        deduct_stock_for_items([(product.id, 2), (product.id, 3)])
+
+        self.assertEqual(Stock.objects.get(product=product).quantity, 0)
+        with self.assertRaisesMessage(Exception, 'Insufficient stock'):
+            deduct_stock_for_items([(product.id, 1)])
+
+    def test_query_count_is_flat_in_number_of_lines(self):
+        products = [make_product(f'P{i}', [(f'B{i}', 10, '1.00', None)]) for i in range(20)]
+
+        # savepoint, lock stocks, lock batches, insert movements, bulk update batches, bulk update stocks,
+        # insert low-stock events (10 units is at the default threshold), release
+        with self.assertNumQueries(8):
+            deduct_stock_for_items([(p.id, 1) for p in products[:2]])
+        with self.assertNumQueries(8):
+            deduct_stock_for_items([(p.id, 1) for p in products])
+
+    def test_failure_rolls_back_every_line(self):
+        first = make_product('First', [('F1', 5, '1.00', None)])
+        second = make_product('Second', [('S1', 1, '1.00', None)])
+
+        with self.assertRaises(Exception):
+            deduct_stock_for_items([(first.id, 2), (second.id, 2)])
+
+        self.assertEqual(Stock.objects.get(product=first).quantity, 5)
+        self.assertEqual(Batch.objects.get(batch_number='F1').quantity, 5)
+
+
+class InvoiceNumberAllocatorTests(TestCase):
+
+    def test_block_is_reused_after_commit(self):
+        allocator = InvoiceNumberAllocator('test', block_size=5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first = allocator.next_value()
+        with self.assertNumQueries(0):
+            rest = [allocator.next_value() for _ in range(4)]
+
+        self.assertEqual([first] + rest, [1, 2, 3, 4, 5])
+        self.assertEqual(InvoiceSequence.objects.get(name='test').next_value, 6)
+
+    def test_rolled_back_block_is_never_handed_out(self):
+        allocator = InvoiceNumberAllocator('test', block_size=5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    allocator.next_value()
+                    raise RuntimeError
+
+        # The counter update was rolled back with the block, so it starts over
+        self.assertEqual(allocator.next_value(), 1)
+
+    def test_concurrent_callers_get_unique_numbers(self):
+        allocator = InvoiceNumberAllocator('test', block_size=1000)
+        with self.captureOnCommitCallbacks(execute=True):
+            allocator.next_value()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            numbers = list(pool.map(lambda _: allocator.next_value(), range(800)))
+
+        self.assertEqual(len(set(numbers)), 800)
+
+    def test_continues_after_legacy_numbers(self):
+        SaleInvoice.objects.create(invoice_number='INV-00001')
+        last = SaleInvoice.objects.create(invoice_number='INV-00002')
+
+        self.assertEqual(InvoiceNumberAllocator('fresh').next_value(), last.id + 1)
+
+
+class SaleInvoiceCreateTests(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('cashier', password='x'))
+        # A fresh allocator, so every test reserves its first number block the same way
+        patcher = mock.patch('inventory.utils.invoice_numbers', InvoiceNumberAllocator('sale_invoice'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_invoice_deducts_all_lines(self):
+        a = make_product('Alpha', [('A1', 10, '1.00', None)])
+        b = make_product('Beta', [('B1', 10, '2.00', None)])
+
+        response = self.client.post('/api/sales/', {
+            'customer_name': 'Walk-in',
+            'items': [
+                {'product': a.id, 'sold_quantity': 2, 'unit_sale_price': '5.00'},
+                {'product': b.id, 'sold_quantity': 3, 'unit_sale_price': '6.00'},
+            ],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['subtotal'], '28.00')
+        self.assertEqual(Stock.objects.get(product=a).quantity, 8)
+        self.assertEqual(Stock.objects.get(product=b).quantity, 7)
+        self.assertEqual(SaleItem.objects.count(), 2)
+
+    def test_query_count_is_flat_in_number_of_lines(self):
+        products = [make_product(f'P{i}', [(f'B{i}', 10, '1.00', None)]) for i in range(20)]
+
+        def sell(count):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/sales/', {
+                    'items': [{'product': p.id, 'sold_quantity': 1, 'unit_sale_price': '2.00'} for p in products[:count]],
+                }, format='json')
+            self.assertEqual(response.status_code, 201, response.data)
+            self.assertEqual(len(response.data['sale_items']), count)
+            return len(queries)
+
+        sell(1)  # reserves an invoice number block and creates today's rollup rows
+        self.assertEqual(sell(2), sell(20))
+
+    def test_insufficient_stock_is_rejected(self):
+        a = make_product('Alpha', [('A1', 1, '1.00', None)])
+
+        response = self.client.post('/api/sales/', {
+            'items': [
+                {'product': a.id, 'sold_quantity': 1, 'unit_sale_price': '5.00'},
+                {'product': a.id, 'sold_quantity': 1, 'unit_sale_price': '5.00'},
+            ],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Stock.objects.get(product=a).quantity, 1)
+
+    def _sell_across_two_batches(self, queries=None):
+        product = make_product('Gamma', [
+            ('G-OLD', 2, '1.00', date(2030, 1, 1)),
+            ('G-NEW', 5, '3.00', date(2031, 1, 1)),
+        ])
+        with self.assertNumQueries(queries) if queries is not None else contextlib.nullcontext():
+            response = self.client.post('/api/sales/', {
+                'items': [{'product': product.id, 'sold_quantity': 4, 'unit_sale_price': '5.00'}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return SaleInvoice.objects.get(id=response.data['id'])
+
+    @override_settings(SPLIT_SALE_ITEMS_BY_BATCH=True)
+    def test_split_mode_writes_one_item_per_batch(self):
+        # The response renders both batch rows without reading them (or their product) back
+        invoice = self._sell_across_two_batches(queries=18)
+
+        items = sorted(
+            invoice.items.values_list('batch__batch_number', 'sold_quantity', 'unit_cost_price')
+        )
+        self.assertEqual(items, [('G-NEW', 2, Decimal('3.00')), ('G-OLD', 2, Decimal('1.00'))])
+        self.assertEqual(invoice.subtotal, Decimal('20.00'))
+
+    @override_settings(SPLIT_SALE_ITEMS_BY_BATCH=False)
+    def test_single_item_mode_uses_first_batch_cost(self):
+        invoice = self._sell_across_two_batches()
+
+        items = list(invoice.items.values_list('batch__batch_number', 'sold_quantity', 'unit_cost_price'))
+        self.assertEqual(items, [('G-OLD', 4, Decimal('1.00'))])
+
+
+class ProductListQueryCountTests(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('manager', password='x'))
+
+    def _assert_constant_queries(self, url, make):
+        make(2)
+        with self.assertNumQueries(2):
+            small_response = self.client.get(url)
+        make(10)
+        with self.assertNumQueries(2):
+            large_response = self.client.get(url)
+
+        self.assertGreater(len(large_response.data), len(small_response.data))
+        return large_response
+
+    def test_product_list_prefetches_active_batches(self):
+        def make(count):
+            start = Product.objects.count()
+            for i in range(start, start + count):
+                make_product(f'Item {i:03d}', [(f'B{i}-1', 5, '1.00', None), (f'B{i}-2', 5, '2.00', None)])
+
+        response = self._assert_constant_queries('/api/products/', make)
+        self.assertEqual(len(response.data[0]['active_batches']), 2)
+
+    def test_low_stock_list_prefetches_active_batches(self):
+        def make(count):
+            start = Product.objects.count()
+            for i in range(start, start + count):
+                make_product(f'Low {i:03d}', [(f'L{i}', 3, '1.00', None)])
+
+        response = self._assert_constant_queries('/api/dashboard/low-stock/', make)
+        self.assertEqual(len(response.data[0]['active_batches']), 1)
+
+
+class CursorPaginationTests(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('manager', password='x'))
+        for i in range(5):
+            SaleInvoice.objects.create(invoice_number=f'INV-{i:05d}')
+
+    def test_unpaginated_by_default(self):
+        response = self.client.get('/api/history/sales/')
+
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 5)
+
+    def test_walks_all_pages_newest_first(self):
+        seen = []
+        url = '/api/history/sales/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen += [row['invoice_number'] for row in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(seen, [f'INV-{i:05d}' for i in reversed(range(5))])
+
+
+class ProductSearchTests(APITestCase):
+
+    def setUp(self):
+        search_cache.clear()
+        self.client.force_authenticate(User.objects.create_user('cashier', password='x'))
+        make_product('Paracetamol 500mg', [('P1', 7, '1.00', None)])
+        make_product('Cetirizine 10mg', [('C1', 3, '1.00', None)])
+        make_product('Amoxicillin 250mg')
+
+    def search(self, q):
+        return [row['name'] for row in self.client.get('/api/products/search/', {'q': q}).data]
+
+    def test_substring_and_prefix_matches(self):
+        self.assertEqual(self.search('ceta'), ['Paracetamol 500mg'])
+        self.assertEqual(self.search('0mg'), ['Amoxicillin 250mg', 'Cetirizine 10mg', 'Paracetamol 500mg'])
+        # Prefix matches are listed first
+        self.assertEqual(self.search('ce'), ['Cetirizine 10mg'])
+        self.assertEqual(self.search('CET'), ['Cetirizine 10mg', 'Paracetamol 500mg'])
+
+    def test_query_matches_names_with_repeated_spaces(self):
+        make_product('Vitamin  C 500mg')
+
+        self.assertEqual(self.search('vitamin c'), ['Vitamin  C 500mg'])
+        self.assertEqual(self.search('n c 5'), ['Vitamin  C 500mg'])
+        self.assertEqual(self.search('vi'), ['Vitamin  C 500mg'])
+
+    def test_slim_payload(self):
+        response = self.client.get('/api/products/search/', {'q': 'para'})
+
+        self.assertEqual(response.data, [{
+            'id': Product.objects.get(name='Paracetamol 500mg').id,
+            'name': 'Paracetamol 500mg', 'mrp': '12.00', 'stock_quantity': 7,
+        }])
+
+    def test_renamed_product_is_reindexed(self):
+        product = Product.objects.get(name='Amoxicillin 250mg')
+        product.name = 'Azithromycin 500mg'
+        product.save()
+
+        self.assertFalse(ProductTrigram.objects.filter(product=product, trigram='amo').exists())
+        self.assertEqual(self.search('amox'), [])
+        self.assertEqual(self.search('thro'), ['Azithromycin 500mg'])
+
+    def test_repeated_query_is_served_from_cache(self):
+        self.search('para')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search('para'), ['Paracetamol 500mg'])
+
+
+class InventorySnapshotTests(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('manager', password='x'))
+
+    def assertSnapshotMatchesRebuild(self):
+        snapshot = InventorySnapshot.current()
+        fields = ['total_products', 'total_stock_value', 'low_stock_count', 'recent_revenue', 'recent_sales_count']
+        incremental = {f: getattr(snapshot, f) for f in fields}
+        rebuilt = InventorySnapshot.rebuild()
+        self.assertEqual(incremental, {f: getattr(rebuilt, f) for f in fields})
+        return rebuilt
+
+    def test_write_paths_keep_snapshot_in_sync(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            InventorySnapshot.rebuild()
+            alpha = make_product('Alpha', [('A1', 8, '2.00', None), ('A2', 20, '3.00', None)])
+            beta = make_product('Beta', [('B1', 15, '1.00', None)])
+            make_product('Gamma', [('G1', 4, '1.00', None)])
+            # Re-receiving an existing batch re-prices all of it
+            Purchase.objects.create(product=beta, purchase_quantity=5, unit_purchase_price=Decimal('1.20'),
+                                    batch_number_input='B1')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/sales/', {'items': [
+                {'product': alpha.id, 'sold_quantity': 25, 'unit_sale_price': '5.00'},
+                {'product': beta.id, 'sold_quantity': 1, 'unit_sale_price': '2.00'},
+            ]}, format='json')
+            self.assertEqual(response.status_code, 201, response.data)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            purchase = Purchase.objects.filter(product=beta).first()
+            response = self.client.patch(f'/api/purchases/{purchase.id}/', {
+                'purchase_quantity': 12, 'unit_purchase_price': '0.90',
+            }, format='json')
+            self.assertEqual(response.status_code, 200, response.data)
+            Purchase.objects.filter(product__name='Gamma').delete()
+
+        rebuilt = self.assertSnapshotMatchesRebuild()
+        self.assertEqual(rebuilt.total_products, 3)
+        self.assertEqual(rebuilt.low_stock_count, 1)
+        self.assertEqual(rebuilt.recent_sales_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            alpha.delete()
+        self.assertSnapshotMatchesRebuild()
+
+    def test_dashboard_reads_one_row(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_product('Alpha', [('A1', 4, '2.50', None)])
+        InventorySnapshot.current()
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/dashboard/stats/')
+
+        self.assertEqual(response.data['total_products'], 1)
+        self.assertEqual(response.data['total_stock_value'], Decimal('10.00'))
+        self.assertEqual(response.data['low_stock_count'], 1)
+        self.assertEqual(
+            response.data['recent_revenue_since'],
+            timezone.localdate() - timedelta(days=InventorySnapshot.RECENT_DAYS),
+        )
+
+
+class ProfitMarginTests(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('manager', password='x'))
+        self.alpha = make_product('Alpha', [('A1', 2, '1.00', None), ('A2', 10, '2.00', date(2099, 1, 1))])
+        self.beta = make_product('Beta', [('B1', 10, '3.00', None)])
+
+    def sell(self, *lines):
+        # The day totals are added once the sale commits
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/sales/', {'items': [
+                {'product': product.id, 'sold_quantity': qty, 'unit_sale_price': price} for product, qty, price in lines
+            ]}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def test_day_total_is_not_touched_inside_the_sale(self):
+        self.sell((self.alpha, 1, '5.00'))
+
+        with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as queries:
+            self.client.post('/api/sales/', {'items': [
+                {'product': self.beta.id, 'sold_quantity': 1, 'unit_sale_price': '4.00'}
+            ]}, format='json')
+        self.assertFalse([q['sql'] for q in queries if 'dailysalesrollup' in q['sql'] and 'IS NULL' in q['sql']])
+
+        for callback in callbacks:
+            callback()
+        day_total = DailySalesRollup.objects.get(product__isnull=True)
+        self.assertEqual((day_total.invoice_count, day_total.revenue), (2, Decimal('9.00')))
+
+    @override_settings(SPLIT_SALE_ITEMS_BY_BATCH=True)
+    def test_margins_read_from_rollup(self):
+        self.sell((self.alpha, 3, '5.00'), (self.beta, 1, '4.00'))
+        self.sell((self.alpha, 1, '5.00'))
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/dashboard/margins/')
+
+        [day] = response.data
+        self.assertEqual(day['date'], timezone.localdate())
+        self.assertEqual(day['total_revenue'], Decimal('24.00'))
+        # 2 x 1.00 + 2 x 2.00 (Alpha, split by batch) + 1 x 3.00 (Beta)
+        self.assertEqual(day['total_cost'], Decimal('9.00'))
+        self.assertEqual(day['total_profit'], Decimal('15.00'))
+
+        # The incremental rows agree with a rebuild from SaleItem
+        incremental = sorted(DailySalesRollup.objects.values_list(
+            'product', 'invoice_count', 'units_sold', 'revenue', 'cost'), key=str)
+        DailySalesRollup.rebuild()
+        rebuilt = sorted(DailySalesRollup.objects.values_list(
+            'product', 'invoice_count', 'units_sold', 'revenue', 'cost'), key=str)
+        self.assertEqual(incremental, rebuilt)
+
+    def test_group_by_product_and_date_range(self):
+        self.sell((self.alpha, 1, '5.00'), (self.beta, 2, '4.00'))
+
+        response = self.client.get('/api/dashboard/margins/', {'group_by': 'product'})
+        self.assertEqual(
+            [(row['product__name'], row['total_revenue']) for row in response.data],
+            [('Alpha', Decimal('5.00')), ('Beta', Decimal('8.00'))]
+        )
+
+        response = self.client.get('/api/dashboard/margins/', {'to': '2000-01-01'})
+        self.assertEqual(response.data, [])
+        response = self.client.get('/api/dashboard/margins/', {'from': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_deleted_invoice_is_taken_out(self):
+        self.sell((self.alpha, 1, '5.00'))
+        self.sell((self.beta, 1, '4.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SaleInvoice.objects.order_by('id').first().delete()
+
+        [day] = self.client.get('/api/dashboard/margins/').data
+        self.assertEqual(day['total_revenue'], Decimal('4.00'))
+
+
+class SalesExportTests(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('manager', password='x'))
+        product = make_product('Alpha', [('A1', 50, '1.00', None)])
+        for i in range(5):
+            response = self.client.post('/api/sales/', {
+                'customer_name': f'Customer {i}',
+                'items': [{'product': product.id, 'sold_quantity': i + 1, 'unit_sale_price': '2.00'}],
+            }, format='json')
+            self.assertEqual(response.status_code, 201, response.data)
+
+    def export(self, **params):
+        response = self.client.get('/api/export/sales/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_streams_every_invoice_across_chunks(self):
+        with mock.patch.object(SalesExportView, 'chunk_size', 2):
+            rows = self.export()
+
+        self.assertEqual(rows[0], SalesExportView.INVOICE_HEADER)
+        self.assertEqual([row[2] for row in rows[1:]], [f'Customer {i}' for i in reversed(range(5))])
+
+    def test_item_detail_mode(self):
+        with mock.patch.object(SalesExportView, 'chunk_size', 2):
+            rows = self.export(detail='items')
+
+        self.assertEqual(rows[0], SalesExportView.ITEM_HEADER)
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1][3:], ['Alpha', 'A1', '5', '2.00', '1.00', '10.00'])
+
+    def test_date_range_filter(self):
+        today = timezone.localdate()
+        self.assertEqual(len(self.export(**{'from': today.isoformat(), 'to': today.isoformat()})), 6)
+        self.assertEqual(len(self.export(to='2000-01-01')), 1)
+
+
+class GoodsReceiptTests(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('storekeeper', password='x'))
+        self.supplier = Supplier.objects.create(name='MedSupply')
+
+    def scenario(self, prefix):
+        """Two products (one with no Stock row yet) and the lines of one delivery."""
+        stocked = make_product(f'{prefix} Stocked', [('OLD', 5, '1.00', date(2030, 1, 1))])
+        unstocked = Product.objects.create(name=f'{prefix} New', base_price=Decimal('1.00'))
+        lines = [
+            (stocked, 10, '1.50', 'OLD', date(2031, 1, 1)),  # tops up and re-prices an existing batch
+            (stocked, 4, '2.00', None, None),                # falls back to the delivery invoice number
+            (unstocked, 3, '0.50', 'N1', None),
+            (unstocked, 2, '0.60', 'N1', date(2032, 1, 1)),  # later line re-prices the batch again
+        ]
+        return [stocked, unstocked], lines
+
+    def state(self, products):
+        return {
+            'stock': sorted(Stock.objects.filter(product__in=products).values_list('product__name', 'quantity')),
+            'batches': sorted(Batch.objects.filter(product__in=products).values_list(
+                'product__name', 'batch_number', 'quantity', 'cost_price', 'expiry_date')),
+            'purchases': sorted(Purchase.objects.filter(product__in=products).values_list(
+                'product__name', 'purchase_quantity', 'batch_created__batch_number', 'batch_number_input')),
+        }
+
+    def test_bulk_receipt_matches_signal_path(self):
+        products, lines = self.scenario('X')
+        for product, quantity, price, batch_number, expiry in lines:
+            Purchase.objects.create(
+                product=product, supplier=self.supplier, purchase_quantity=quantity,
+                unit_purchase_price=Decimal(price), invoice_number='DEL-1',
+                batch_number_input=batch_number, expiry_date_input=expiry,
+            )
+        expected = self.state(products)
+        Product.objects.filter(id__in=[p.id for p in products]).delete()
+
+        products, lines = self.scenario('X')
+        response = self.client.post('/api/purchases/bulk/', {
+            'supplier': self.supplier.id,
+            'invoice_number': 'DEL-1',
+            'lines': [
+                {'product': product.id, 'purchase_quantity': quantity, 'unit_purchase_price': price,
+                 'batch_number_input': batch_number, 'expiry_date_input': expiry}
+                for product, quantity, price, batch_number, expiry in lines
+            ],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['lines_received'], 4)
+        self.assertEqual(self.state(products), expected)
+
+    def test_query_count_is_flat_in_delivery_size(self):
+        products = [make_product(f'P{i}') for i in range(30)]
+
+        def receive(count, tag):
+            return self.client.post('/api/purchases/bulk/', {
+                'invoice_number': tag,
+                'lines': [{'product': p.id, 'purchase_quantity': 1, 'unit_purchase_price': '1.00'}
+                          for p in products[:count]],
+            }, format='json')
+
+        # One unit each lands every product on the low-stock list: one INSERT of feed events
+        with self.assertNumQueries(12):
+            self.assertEqual(receive(3, 'DEL-A').status_code, 201)
+        with self.assertNumQueries(12):
+            self.assertEqual(receive(30, 'DEL-B').status_code, 201)
+
+    def test_rejects_unknown_products_and_unresolvable_batches(self):
+        product = make_product('Alpha')
+
+        response = self.client.post('/api/purchases/bulk/', {
+            'invoice_number': 'DEL-1',
+            'lines': [{'product': 999, 'purchase_quantity': 1, 'unit_purchase_price': '1.00'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/api/purchases/bulk/', {
+            'lines': [{'product': product.id, 'purchase_quantity': 1, 'unit_purchase_price': '1.00'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Purchase.objects.exists())
+
+
+class SaleIngestTests(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('till', password='x'))
+        # Blocks adopted by earlier tests point at counter rows that were rolled back
+        patcher = mock.patch('inventory.utils.invoice_numbers', InvoiceNumberAllocator('sale_invoice'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def bill(self, *lines, **fields):
+        return dict(fields, items=[
+            {'product': product.id, 'sold_quantity': quantity, 'unit_sale_price': price}
+            for product, quantity, price in lines
+        ])
+
+    def test_bills_succeed_or_fail_on_their_own(self):
+        product = make_product('Alpha', [('A1', 5, '1.00', None)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/sales/bulk/', [
+                self.bill((product, 3, '2.00'), customer_name='First', tax_rate='10.00'),
+                self.bill((product, 3, '2.00')),  # only 2 left after the first bill
+                {'items': []},
+                self.bill((product, 2, '2.00')),
+            ], format='json')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'failed', 'failed', 'created'])
+        self.assertIn('Insufficient stock', response.data['results'][1]['errors']['detail'])
+        self.assertEqual(response.data['results'][0]['final_total'], '6.60')
+
+        self.assertEqual(Stock.objects.get(product=product).quantity, 0)
+        numbers = list(SaleInvoice.objects.values_list('invoice_number', flat=True))
+        self.assertEqual(len(numbers), 2)
+        self.assertEqual(len(set(numbers)), 2)
+        day_total = DailySalesRollup.objects.get(product__isnull=True)
+        self.assertEqual((day_total.invoice_count, day_total.units_sold), (2, 5))
+
+    def test_fefo_carries_across_bills_and_keeps_till_time(self):
+        product = make_product('Beta', [
+            ('LATE', 5, '2.00', date(2031, 1, 1)),
+            ('EARLY', 3, '1.50', date(2030, 1, 1)),
+        ])
+        sold_at = timezone.now() - timedelta(days=3)
+
+        response = self.client.post('/api/sales/bulk/', [
+            self.bill((product, 2, '5.00'), sale_date=sold_at.isoformat()),
+            self.bill((product, 2, '5.00')),
+        ], format='json')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        first, second = (SaleInvoice.objects.get(id=r['id']) for r in response.data['results'])
+        self.assertEqual(first.sale_date, sold_at)
+        self.assertEqual(
+            sorted(first.items.values_list('batch__batch_number', 'sold_quantity')), [('EARLY', 2)]
+        )
+        self.assertEqual(
+            sorted(second.items.values_list('batch__batch_number', 'sold_quantity')), [('EARLY', 1), ('LATE', 1)]
+        )
+        self.assertEqual(
+            DailySalesRollup.objects.get(product=product, date=timezone.localdate(sold_at)).units_sold, 2
+        )
+
+    def test_query_count_is_flat_in_upload_size(self):
+        products = [make_product(f'P{i}', [('B', 100, '1.00', None)]) for i in range(3)]
+
+        def upload(count):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/sales/bulk/', [
+                    self.bill(*[(p, 1, '2.00') for p in products]) for _ in range(count)
+                ], format='json')
+            self.assertEqual(response.data['created'], count)
+            return len(queries)
+
+        upload(1)  # creates the invoice counter and today's rollup rows
+        self.assertEqual(upload(2), upload(20))
+
+    def test_allocation_failure_rejects_only_its_bill(self):
+        alpha = make_product('Alpha', [('A1', 10, '1.00', None)])
+        beta = make_product('Beta', [('B1', 10, '1.00', None)])
+        allocate = utils.BatchAllocator.allocate
+
+        def drifted(allocator, product_id, quantity, sale_invoice=None):
+            # Beta's batches disagree with its Stock row, which can_allocate() does not catch
+            if product_id == beta.id:
+                raise Exception("CRITICAL ERROR: Failed to fully deduct stock for Beta.")
+            return allocate(allocator, product_id, quantity, sale_invoice)
+
+        with mock.patch.object(utils.BatchAllocator, 'allocate', drifted):
+            response = self.client.post('/api/sales/bulk/', [
+                self.bill((alpha, 1, '2.00')),
+                self.bill((alpha, 2, '2.00'), (beta, 1, '2.00')),
+                self.bill((alpha, 3, '2.00')),
+            ], format='json')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'failed', 'created'])
+        self.assertIn('Failed to fully deduct', response.data['results'][1]['errors']['detail'])
+        # The failed bill's Alpha line was undone along with it
+        self.assertEqual(Stock.objects.get(product=alpha).quantity, 6)
+        self.assertEqual(Batch.objects.get(product=alpha).quantity, 6)
+        self.assertEqual(StockMovement.reconcile(), [])
+
+    def test_numbers_are_reserved_before_stock_is_locked(self):
+        # Same lock order as a single sale: InvoiceSequence, then Stock and Batch
+        product = make_product('Gamma', [('G1', 1, '1.00', None)])
+        calls = []
+        numbers = utils.next_invoice_numbers
+        allocator = utils.BatchAllocator
+        with mock.patch('inventory.utils.next_invoice_numbers', lambda count: calls.append('numbers') or numbers(count)), \
+                mock.patch('inventory.utils.BatchAllocator', lambda *args, **kwargs: calls.append('stock') or allocator(*args, **kwargs)):
+            response = self.client.post('/api/sales/bulk/', [
+                self.bill((product, 1, '2.00')),
+                self.bill((product, 1, '2.00')),  # rejected: its number is left unused
+            ], format='json')
+
+        self.assertEqual(calls, ['numbers', 'stock'])
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'failed'])
+
+
+class StockLedgerTests(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('auditor', password='x'))
+        patcher = mock.patch('inventory.utils.invoice_numbers', InvoiceNumberAllocator('sale_invoice'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sell(self, product, quantity):
+        response = self.client.post('/api/sales/', {
+            'items': [{'product': product.id, 'sold_quantity': quantity, 'unit_sale_price': '5.00'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response
+
+    def test_every_write_path_goes_through_the_ledger(self):
+        product = make_product('Ledgered', [('A', 10, '1.00', None)])
+        purchase = Purchase.objects.get(product=product)
+
+        self.client.patch(f'/api/purchases/{purchase.id}/', {'purchase_quantity': 8}, format='json')
+        self.sell(product, 3)
+        self.client.post('/api/sales/bulk/', [
+            {'items': [{'product': product.id, 'sold_quantity': 1, 'unit_sale_price': '5.00'}]},
+        ], format='json')
+        self.client.post('/api/purchases/bulk/', {
+            'invoice_number': 'DEL-1',
+            'lines': [{'product': product.id, 'purchase_quantity': 4, 'unit_purchase_price': '1.20'}],
+        }, format='json')
+
+        self.assertEqual(Stock.objects.get(product=product).quantity, 8)
+        self.assertEqual(
+            list(StockMovement.objects.filter(product=product).order_by('id').values_list('reason', 'quantity')),
+            [('purchase', 10), ('purchase_edit', -2), ('sale', -3), ('sale', -1), ('purchase', 4)],
+        )
+        self.assertEqual(StockMovement.reconcile(), [])
+
+    def test_deleting_a_purchase_only_takes_back_unsold_units(self):
+        product = make_product('Voided', [('A', 5, '1.00', None)])
+        self.sell(product, 2)
+
+        purchase = Purchase.objects.get(product=product)
+        self.assertEqual(self.client.delete(f'/api/purchases/{purchase.id}/').status_code, 204)
+
+        batch = Batch.objects.get(batch_number='A')  # kept: the sale still points at it
+        self.assertEqual((batch.quantity, Stock.objects.get(product=product).quantity), (0, 0))
+        self.assertEqual(StockMovement.objects.filter(reason=StockMovement.PURCHASE_VOID).get().quantity, -3)
+        self.assertEqual(StockMovement.reconcile(), [])
+
+    def test_purchase_cannot_be_lowered_below_units_sold(self):
+        product = make_product('Edited', [('A', 5, '1.00', None)])
+        self.sell(product, 4)
+        purchase = Purchase.objects.get(product=product)
+
+        response = self.client.patch(f'/api/purchases/{purchase.id}/', {'purchase_quantity': 2}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Batch.objects.get(batch_number='A').quantity, 1)
+
+    def test_product_with_history_can_still_be_deleted(self):
+        product = make_product('Gone', [('A', 5, '1.00', None)])
+        self.sell(product, 1)
+
+        product.delete()
+
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_verify_command_reports_and_repairs_drift(self):
+        product = make_product('Drifted', [('A', 5, '1.00', None)])
+        Stock.objects.filter(product=product).update(quantity=7)
+        Batch.objects.filter(product=product).update(quantity=4)
+
+        with self.assertRaises(CommandError):
+            call_command('verify_stock_ledger', stdout=io.StringIO())
+        call_command('verify_stock_ledger', '--fix', stdout=io.StringIO())
+
+        self.assertEqual(Stock.objects.get(product=product).quantity, 5)
+        self.assertEqual(Batch.objects.get(product=product).quantity, 5)
+        self.assertEqual(StockMovement.reconcile(), [])
+
+    def test_fix_does_not_undo_a_sale_made_during_the_scan(self):
+        busy = make_product('Busy', [('B', 5, '1.00', None)])
+        drifted = make_product('Drifted', [('D', 5, '1.00', None)])
+        Stock.objects.filter(product=drifted).update(quantity=7)
+        ledger_before_sale = StockMovement.balances()
+        # The sale commits after the ledger was read, before the rows are: it looks like drift
+        deduct_stock_for_items([(busy.id, 2)])
+
+        with mock.patch.object(StockMovement, 'balances', return_value=ledger_before_sale):
+            fixed = StockMovement.reconcile(fix=True)
+
+        self.assertEqual(fixed, [('Stock', Stock.objects.get(product=drifted).id, 7, 5)])
+        self.assertEqual(Stock.objects.get(product=busy).quantity, 3)
+        self.assertEqual(Batch.objects.get(product=busy).quantity, 3)
+        self.assertEqual(StockMovement.reconcile(), [])
+
+
+# The baseline is recorded with the development (in-memory) cache
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class BenchmarkTests(TestCase):
+    """
+    Hot paths against inventory/bench_baseline.json (see inventory/bench.py).
+
+    INVENTORY_BENCH_SCALE picks the data scale (default 1) and
+    INVENTORY_BENCH_TOLERANCE the allowed wall-time/memory growth (default 3x).
+    """
+
+    def test_hot_paths_stay_within_baseline(self):
+        scale = int(os.environ.get('INVENTORY_BENCH_SCALE', 1))
+        baseline = bench.load_baseline(scale)
+        if baseline is None:
+            self.skipTest(f"No benchmark baseline for scale {scale} (manage.py benchmark_api --update-baseline).")
+
+        with mock.patch('inventory.utils.invoice_numbers', InvoiceNumberAllocator('sale_invoice')):
+            results = bench.run(scale)
+
+        self.assertEqual(set(results), set(baseline))
+        self.assertEqual(bench.regressions(results, baseline, float(os.environ.get('INVENTORY_BENCH_TOLERANCE', 3))), [])
+
+
+@override_settings(QUERY_STATS_ENABLED=True)
+class QueryStatsMiddlewareTests(APITestCase):
+
+    def setUp(self):
+        recent_requests.clear()
+        self.addCleanup(recent_requests.clear)
+        self.admin = User.objects.create_user('admin', password='x', is_staff=True)
+        self.client.force_authenticate(self.admin)
+
+    def test_server_timing_header_and_ring_buffer(self):
+        make_product('Timed')
+
+        response = self.client.get('/api/products/')
+
+        timing = response['Server-Timing']
+        for metric in ('db;dur=', 'serialize;dur=', 'app;dur=', 'total;dur='):
+            self.assertIn(metric, timing)
+        [entry] = recent_requests
+        self.assertEqual((entry['view'], entry['status']), ('product-list', 200))
+        self.assertIn(f'desc="{entry["queries"]} queries"', timing)
+
+    def test_repeated_statements_are_flagged(self):
+        collector = QueryCollector()
+        products = [make_product(f'N{i}') for i in range(3)]
+
+        with connection.execute_wrapper(collector):
+            for product in products:
+                Stock.objects.get(product=product)  # the N+1 shape
+
+        [(sql, count)] = collector.duplicates(threshold=3)
+        self.assertIn('inventory_stock', sql)
+        self.assertEqual(count, 3)
+
+    def test_stats_endpoint_is_admin_only_and_groups_by_view(self):
+        self.client.get('/api/products/')
+        self.client.get('/api/products/')
+        self.client.get('/api/dashboard/stats/')
+
+        response = self.client.get('/api/admin/query-stats/?recent=1')
+
+        self.assertEqual(response.status_code, 200)
+        requests = {row['view']: row['requests'] for row in response.data['views']}
+        self.assertEqual(requests['product-list'], 2)
+        self.assertEqual(requests['dashboard-stats'], 1)
+        self.assertEqual(len(response.data['recent']), 1)
+
+        self.client.force_authenticate(User.objects.create_user('clerk', password='x'))
+        self.assertEqual(self.client.get('/api/admin/query-stats/').status_code, 403)
+
+    @override_settings(QUERY_STATS_ENABLED=False)
+    def test_disabled_by_default(self):
+        response = self.client.get('/api/products/')
+
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(len(recent_requests), 0)
+
+
+class LowStockFeedTests(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('manager', password='x'))
+        patcher = mock.patch('inventory.utils.invoice_numbers', InvoiceNumberAllocator('sale_invoice'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def feed(self, since=None):
+        response = self.client.get('/api/dashboard/low-stock/changes/', {} if since is None else {'since': since})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_polling_returns_only_changes_since_the_cursor(self):
+        low = make_product('Low', [('L', 5, '1.00', None)])
+        plenty = make_product('Plenty', [('P', 50, '1.00', None)])
+
+        start = self.feed()
+        self.assertEqual([c['name'] for c in start['changes']], ['Low'])
+
+        self.client.post('/api/sales/', {
+            'items': [{'product': plenty.id, 'sold_quantity': 45, 'unit_sale_price': '2.00'}],
+        }, format='json')
+        Purchase.objects.create(product=low, purchase_quantity=20, unit_purchase_price=Decimal('1.00'))
+
+        page = self.feed(start['cursor'])
+        self.assertEqual(
+            [(c['name'], c['is_low'], c['quantity']) for c in page['changes']],
+            [('Plenty', True, 5), ('Low', False, 25)],
+        )
+        self.assertEqual(self.feed(page['cursor'])['changes'], [])
+        self.assertEqual(
+            list(Stock.objects.filter(is_low=True).values_list('product__name', flat=True)), ['Plenty']
+        )
+
+    def test_threshold_edit_updates_flag_feed_and_snapshot(self):
+        product = make_product('Edge', [('E', 15, '1.00', None)])
+        InventorySnapshot.rebuild()
+        stock = Stock.objects.get(product=product)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.low_stock_threshold = 20
+            stock.save(update_fields=['low_stock_threshold'])
+
+        self.assertTrue(Stock.objects.get(pk=stock.pk).is_low)
+        self.assertTrue(LowStockEvent.objects.get(product=product).is_low)
+        self.assertEqual(InventorySnapshot.current().low_stock_count, 1)
+
+    def test_saving_an_unchanged_low_row_feeds_nothing(self):
+        product = make_product('Quiet', [('Q', 3, '1.00', None)])
+        stock = Stock.objects.get(product=product)
+        events = LowStockEvent.objects.filter(product=product)
+        count = events.count()
+
+        stock.save()
+        Stock.objects.get(pk=stock.pk).save()
+        self.assertEqual(events.count(), count)
+
+        stock.quantity = 2
+        stock.save()
+        self.assertEqual(events.count(), count + 1)
+
+    def test_rejects_malformed_cursor(self):
+        response = self.client.get('/api/dashboard/low-stock/changes/', {'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+
+class NearExpiryReportTests(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('pharmacist', password='x'))
+        today = timezone.localdate()
+        self.tablets = Category.objects.create(name='Tablets')
+        self.syrups = Category.objects.create(name='Syrups')
+        self.acme = Supplier.objects.create(name='Acme')
+        self.other = Supplier.objects.create(name='Other')
+
+        def receive(product, batch_number, quantity, cost, days, supplier):
+            Purchase.objects.create(
+                product=product, supplier=supplier, purchase_quantity=quantity,
+                unit_purchase_price=Decimal(cost), batch_number_input=batch_number,
+                expiry_date_input=today + timedelta(days=days),
+            )
+
+        self.aspirin = Product.objects.create(name='Aspirin', category=self.tablets, base_price=Decimal('1.00'))
+        self.cough = Product.objects.create(name='Cough Syrup', category=self.syrups, base_price=Decimal('1.00'))
+        receive(self.aspirin, 'A-SOON', 10, '2.00', 5, self.acme)
+        receive(self.aspirin, 'A-LATER', 10, '2.00', 200, self.acme)
+        receive(self.aspirin, 'A-EXPIRED', 4, '1.00', -3, self.other)
+        receive(self.cough, 'C-SOON', 3, '5.00', 20, self.other)
+
+    def report(self, **params):
+        response = self.client.get('/api/reports/near-expiry/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_batches_inside_horizon_with_value_at_risk(self):
+        data = self.report(days=30)
+
+        self.assertEqual([(r['batch_number'], r['days_left']) for r in data['rows']], [('A-SOON', 5), ('C-SOON', 20)])
+        self.assertEqual(data['totals'], {'batches': 2, 'quantity': 13, 'value': Decimal('35.00')})
+
+        with_expired = self.report(days=30, include_expired='true')
+        self.assertEqual(with_expired['totals']['batches'], 3)
+
+    def test_filters_and_grouping(self):
+        self.assertEqual(
+            [r['batch_number'] for r in self.report(category=self.tablets.id, days=365)['rows']],
+            ['A-SOON', 'A-LATER'],
+        )
+        self.assertEqual(
+            [r['batch_number'] for r in self.report(supplier=self.other.id)['rows']], ['C-SOON']
+        )
+        by_supplier = self.report(group_by='supplier', include_expired='1')['rows']
+        self.assertEqual(
+            [(r['supplier_name'], r['batches'], r['value']) for r in by_supplier],
+            [('Other', 2, Decimal('19.00')), ('Acme', 1, Decimal('20.00'))],
+        )
+
+    def test_supplier_filter_follows_the_latest_purchase(self):
+        # Acme tops up the batch Other first delivered: it is now Acme's, as in group_by=supplier
+        Purchase.objects.create(
+            product=self.cough, supplier=self.acme, purchase_quantity=1, unit_purchase_price=Decimal('5.00'),
+            batch_number_input='C-SOON', expiry_date_input=timezone.localdate() + timedelta(days=20),
+        )
+
+        self.assertEqual(self.report(supplier=self.other.id)['rows'], [])
+        self.assertEqual([r['batch_number'] for r in self.report(supplier=self.acme.id)['rows']], ['A-SOON', 'C-SOON'])
+        self.assertEqual(
+            [(r['supplier_name'], r['batches']) for r in self.report(group_by='supplier')['rows']], [('Acme', 2)]
+        )
+
+    def test_rejects_bad_parameters(self):
+        for params in ({'days': '-1'}, {'group_by': 'shelf'}, {'supplier': 'acme'}):
+            self.assertEqual(self.client.get('/api/reports/near-expiry/', params).status_code, 400)
+
+
+class SupplierAnalyticsTests(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('buyer', password='x'))
+        self.acme = Supplier.objects.create(name='Acme')
+        self.beta = Supplier.objects.create(name='Beta')
+        aspirin = Product.objects.create(name='Aspirin', base_price=Decimal('1.00'))
+
+        def receive(supplier, quantity, price, day):
+            purchase = Purchase.objects.create(
+                product=aspirin, supplier=supplier, purchase_quantity=quantity, unit_purchase_price=Decimal(price),
+            )
+            Purchase.objects.filter(pk=purchase.pk).update(purchase_date=day)
+
+        receive(self.acme, 10, '2.00', date(2026, 1, 10))
+        receive(self.acme, 10, '3.00', date(2026, 1, 20))
+        receive(self.acme, 5, '3.00', date(2026, 2, 5))
+        receive(self.beta, 100, '1.00', date(2026, 2, 1))
+
+    def report(self, **params):
+        response = self.client.get('/api/reports/suppliers/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['suppliers']
+
+    def test_spend_volume_and_unit_cost_per_supplier_and_month(self):
+        with self.assertNumQueries(2):
+            suppliers = self.report()
+
+        self.assertEqual([s['name'] for s in suppliers], ['Beta', 'Acme'])
+        acme = suppliers[1]
+        self.assertEqual(
+            (acme['purchases'], acme['quantity'], acme['spend'], acme['avg_unit_cost']),
+            (3, 25, Decimal('65.00'), Decimal('2.60')),
+        )
+        self.assertEqual((acme['first_purchase'], acme['last_purchase']), (date(2026, 1, 10), date(2026, 2, 5)))
+        self.assertEqual(
+            [(row['period'], row['quantity'], row['spend'], row['avg_unit_cost']) for row in acme['periods']],
+            [(date(2026, 1, 1), 20, Decimal('50.00'), Decimal('2.50')),
+             (date(2026, 2, 1), 5, Decimal('15.00'), Decimal('3.00'))],
+        )
+        self.assertEqual(acme['price_trend'], 20.0)
+
+    def test_date_range_supplier_and_period_filters(self):
+        self.assertEqual(
+            [(s['name'], s['quantity']) for s in self.report(**{'from': '2026-01-15', 'to': '2026-02-03'})],
+            [('Beta', 100), ('Acme', 10)],
+        )
+        weekly = self.report(supplier=self.acme.id, period='week')
+        self.assertEqual(len(weekly), 1)
+        self.assertEqual(
+            [row['period'] for row in weekly[0]['periods']],
+            [date(2026, 1, 5), date(2026, 1, 19), date(2026, 2, 2)],
+        )
+
+    def test_rejects_bad_parameters(self):
+        for params in ({'period': 'quarter'}, {'supplier': 'acme'}, {'from': '01/02/2026'}):
+            self.assertEqual(self.client.get('/api/reports/suppliers/', params).status_code, 400)
+
+
+class ProductVelocityTests(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('buyer', password='x'))
+        self.aspirin = make_product('Aspirin', [('A1', 100, '1.00', None)])
+        self.ibuprofen = make_product('Ibuprofen', [('I1', 500, '1.00', None)])
+        self.through = date(2026, 3, 31)
+        for offset in range(112):
+            day = self.through - timedelta(days=offset)
+            self.sold(self.aspirin, day, 10)
+            self.sold(self.ibuprofen, day, 1)
+
+    def sold(self, product, day, units):
+        DailySalesRollup.objects.create(date=day, product=product, units_sold=units)
+
+    def test_first_run_averages_history_and_later_runs_only_fold_in_new_days(self):
+        self.assertEqual(ProductVelocity.update(through=self.through), 112)
+        velocity = ProductVelocity.objects.get(product=self.aspirin)
+        self.assertAlmostEqual(float(velocity.units_per_day), 10, places=2)
+        self.assertEqual((velocity.reorder_point, velocity.as_of), (100, self.through))
+
+        self.assertEqual(ProductVelocity.update(through=self.through), 0)
+
+        # A late upload for a day already folded in is left for a rebuild
+        self.sold(self.aspirin, self.through - timedelta(days=5), 1000)
+        self.sold(self.aspirin, self.through + timedelta(days=1), 39)
+        self.assertEqual(ProductVelocity.update(through=self.through + timedelta(days=1)), 1)
+        alpha = Decimal(2) / 29
+        expected = (alpha * 39 + (1 - alpha) * velocity.units_per_day).quantize(Decimal('0.001'))
+        velocity.refresh_from_db()
+        self.assertEqual(velocity.units_per_day, expected)
+        self.assertEqual(velocity.last_sale_date, self.through + timedelta(days=1))
+
+        ProductVelocity.update(through=self.through + timedelta(days=1), rebuild=True)
+        self.assertGreater(ProductVelocity.objects.get(product=self.aspirin).units_per_day, expected + 40)
+
+    def test_suggestions_are_served_from_the_velocity_table(self):
+        ProductVelocity.update(through=self.through)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/reorder-suggestions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(s['name'], s['quantity'], s['reorder_point'], s['days_of_cover'], s['suggested_quantity'])
+             for s in response.data],
+            [('Aspirin', 100, 100, 10.0, 270)],
+        )
+
+        everything = self.client.get('/api/reorder-suggestions/', {'all': 'true'}).data
+        self.assertEqual([s['name'] for s in everything], ['Aspirin', 'Ibuprofen'])
+
+        Product.objects.filter(pk=self.aspirin.pk).update(is_active=False)
+        self.assertEqual(self.client.get('/api/reorder-suggestions/').data, [])
+
+    def test_nightly_command(self):
+        out = io.StringIO()
+        call_command('update_product_velocity', '--through', '2026-03-31', stdout=out)
+        self.assertIn('Processed 112 day(s)', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('update_product_velocity', '--through', '31/03/2026')
+
+
+class CatalogueCacheTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        catalogue_cache.reset_stats()
+        self.client.force_authenticate(User.objects.create_user('manager', password='x'))
+
+    def test_list_is_served_from_cache_until_a_write(self):
+        Category.objects.create(name='Tablets')
+
+        self.assertEqual(self.client.get('/api/categories/')['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/categories/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual([c['name'] for c in response.data], ['Tablets'])
+
+        self.client.post('/api/categories/', {'name': 'Syrups'})
+        response = self.client.get('/api/categories/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual([c['name'] for c in response.data], ['Syrups', 'Tablets'])
+
+    def test_product_payloads_follow_stock_and_category_changes(self):
+        category = Category.objects.create(name='Tablets')
+        product = make_product('Aspirin', [('A1', 10, '1.00', None)])
+        Product.objects.filter(pk=product.pk).update(category=category)
+        catalogue_cache.invalidate('product')
+        url = f'/api/products/{product.id}/'
+        self.assertEqual(self.client.get(url).data['stock_details']['quantity'], 10)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        # Stock written through the ledger (bulk_update, no signals)
+        deduct_stock_for_items([(product.id, 4)])
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['stock_details']['quantity'], 6)
+
+        category.name = 'Pills'
+        category.save()
+        self.assertEqual(self.client.get(url).data['category_name'], 'Pills')
+
+    def test_supplier_detail_and_pages_are_keyed_separately(self):
+        supplier = Supplier.objects.create(name='Acme')
+        self.client.get(f'/api/suppliers/{supplier.id}/')
+        self.client.get('/api/suppliers/')
+        self.assertEqual(self.client.get(f'/api/suppliers/{supplier.id}/')['X-Cache'], 'HIT')
+
+        self.client.patch(f'/api/suppliers/{supplier.id}/', {'name': 'Acme Ltd'})
+        self.assertEqual(self.client.get(f'/api/suppliers/{supplier.id}/').data['name'], 'Acme Ltd')
+        self.assertEqual(self.client.get('/api/suppliers/').data[0]['name'], 'Acme Ltd')
+
+    def test_stats_endpoint(self):
+        self.client.get('/api/categories/')
+        self.client.get('/api/categories/')
+        self.assertEqual(self.client.get('/api/admin/cache-stats/').status_code, 403)
+
+        self.client.force_authenticate(User.objects.create_superuser('admin', password='x'))
+        stats = self.client.get('/api/admin/cache-stats/').data['namespaces']['category']
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_ratio']), (1, 1, 0.5))
+
+        self.client.delete('/api/admin/cache-stats/')
+        self.assertEqual(catalogue_cache.stats()['category']['hits'], 0)
+
+
+class ConditionalGetTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(User.objects.create_user('manager', password='x'))
+        self.product = make_product('Aspirin', [('A1', 10, '1.00', None)])
+
+    def revalidate(self, url, response, **headers):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'], **headers)
+
+    def test_product_list_not_modified_without_queries(self):
+        first = self.client.get('/api/products/')
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('no-cache', first['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            response = self.revalidate('/api/products/', first)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], first['ETag'])
+        self.assertEqual(
+            self.client.get('/api/products/', HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304
+        )
+        # Each page/query string has its own validator
+        self.assertEqual(self.revalidate('/api/products/?page_size=1', first).status_code, 200)
+
+        deduct_stock_for_items([(self.product.id, 3)])
+        response = self.revalidate('/api/products/', first)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['stock_details']['quantity'], 7)
+
+    def test_dashboard_stats_follow_snapshot_changes(self):
+        InventorySnapshot.rebuild()  # a first read would build it, which counts as a change
+        first = self.client.get('/api/dashboard/stats/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.revalidate('/api/dashboard/stats/', first).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_product('Ibuprofen', [('I1', 5, '2.00', None)])
+        response = self.revalidate('/api/dashboard/stats/', first)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_low_stock_list(self):
+        first = self.client.get('/api/dashboard/low-stock/')
+        self.assertEqual(self.revalidate('/api/dashboard/low-stock/', first).status_code, 304)
+
+        deduct_stock_for_items([(self.product.id, 9)])
+        response = self.revalidate('/api/dashboard/low-stock/', first)
+        self.assertEqual([row['name'] for row in response.data], ['Aspirin'])
+
+
+class ValuesSerializerTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(User.objects.create_user('manager', password='x'))
+        supplier = Supplier.objects.create(name='Acme')
+        category = Category.objects.create(name='Tablets')
+        self.aspirin = make_product('Aspirin', [('A1', 10, '1.50', date(2030, 1, 1)), ('A2', 5, '2.25', None)])
+        Product.objects.filter(pk=self.aspirin.pk).update(category=category)
+        Purchase.objects.create(
+            product=self.aspirin, supplier=supplier, purchase_quantity=3,
+            unit_purchase_price=Decimal('1.75'), batch_number_input='A3', invoice_number='SUP-1',
+        )
+        Product.objects.create(name='No Stock', base_price=Decimal('1.00'))
+        with mock.patch('inventory.utils.invoice_numbers', InvoiceNumberAllocator('sale_invoice')):
+            self.client.post('/api/sales/', {
+                'customer_name': 'Walk-in', 'tax_rate': '5.00',
+                'items': [{'product': self.aspirin.id, 'sold_quantity': 12, 'unit_sale_price': '3.10'}],
+            }, format='json')
+
+    def assertSameJSON(self, fast, slow):
+        self.assertEqual(JSONRenderer().render(fast), JSONRenderer().render(slow))
+
+    def test_same_json_as_model_serializers(self):
+        products = Product.objects.filter(is_active=True).order_by('name')
+        self.assertSameJSON(self.client.get('/api/products/').data, ProductSerializer(products, many=True).data)
+
+        sales = SaleInvoice.objects.order_by('-sale_date', '-id')
+        self.assertSameJSON(self.client.get('/api/history/sales/').data, SaleInvoiceSerializer(sales, many=True).data)
+
+        purchases = Purchase.objects.order_by('-id')
+        self.assertSameJSON(
+            self.client.get('/api/history/purchases/?page_size=10').data['results'],
+            PurchaseSerializer(purchases, many=True).data,
+        )
+
+    def test_purchase_pages_walk_past_a_busy_day(self):
+        # All purchases share today's date: a date-based cursor could not move past them
+        for number in range(4):
+            Purchase.objects.create(
+                product=self.aspirin, purchase_quantity=1, unit_purchase_price=Decimal('1.00'),
+                batch_number_input=f'D{number}',
+            )
+        seen = []
+        url = '/api/history/purchases/?page_size=1'
+        with mock.patch.object(PurchaseCursorPagination, 'offset_cutoff', 2):
+            for _ in range(10):
+                if not url:
+                    break
+                page = self.client.get(url).data
+                seen.extend(row['id'] for row in page['results'])
+                url = page['next']
+        self.assertEqual(seen, list(Purchase.objects.order_by('-id').values_list('id', flat=True)))
+
+    def test_sparse_fieldsets_skip_nested_queries(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/products/?fields=id,name,stock_details')
+        self.assertEqual(response.data[0], {
+            'id': self.aspirin.id, 'name': 'Aspirin',
+            'stock_details': {'quantity': 6, 'expiry_date': None, 'low_stock_threshold': 10},
+        })
+        self.assertIsNone(response.data[1]['stock_details'])
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/history/sales/?fields=invoice_number,final_total')
+        self.assertEqual(list(response.data[0]), ['invoice_number', 'final_total'])
+
+        response = self.client.get('/api/products/?fields=id,stock')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('stock', response.data['detail'])
+
+
+@skipUnless(connection.vendor == 'sqlite', "Reads SQLite's EXPLAIN QUERY PLAN output.")
+class QueryPlanTests(TestCase):
+    """
+    EXPLAIN QUERY PLAN for the hot query shapes of views.py and utils.py, on
+    bench data with fresh statistics: none may read a whole table. Reading a
+    partial index is allowed (it holds only the matching rows); walking an
+    index (or the primary key, which SQLite reports as a plain SCAN) in order
+    is allowed for sliced (paginated) querysets only.
+    """
+
+    PARTIAL_INDEXES = {
+        index.name for model in apps.get_app_config('inventory').get_models()
+        for index in model._meta.indexes if index.condition is not None
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        with mock.patch('inventory.utils.invoice_numbers', InvoiceNumberAllocator('sale_invoice')):
+            cls.products = bench.generate()
+        # A few products on the low-stock list, as in a real store
+        Stock.objects.filter(product__in=cls.products[:3]).update(quantity=2, is_low=True)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def full_scans(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row[-1] for row in cursor.fetchall()]
+        # Without a temporary sort, a plain SCAN is a walk in primary key order
+        in_key_order = not any('TEMP B-TREE FOR ORDER BY' in step for step in plan)
+        scans = []
+        for step in plan:
+            match = re.match(r'SCAN (?:TABLE )?(inventory_\w+)( USING (?:COVERING )?INDEX (\w+))?', step)
+            if not match or match.group(3) in self.PARTIAL_INDEXES:
+                continue
+            if not ((match.group(2) or in_key_order) and queryset.query.is_sliced):
+                scans.append(step)
+        return scans
+
+    def test_hot_querysets_use_indexes(self):
+        product_ids = [product.id for product in self.products[:3]]
+        since = timezone.now() - timedelta(days=7)
+        today = timezone.localdate()
+        invoice_ids = list(SaleInvoice.objects.values_list('id', flat=True)[:20])
+        querysets = {
+            'product list': ProductViewSet.queryset,
+            'active batches prefetch': active_batches_prefetch().queryset.filter(product_id__in=product_ids),
+            'low stock list': LowStockListView.products(),
+            'low stock feed': Stock.objects.filter(is_low=True).values(
+                *LowStockChangesView.FIELDS.values()
+            ),
+            'sale history page': SaleHistoryListView.queryset.order_by('-sale_date', '-id')[:50],
+            'sale history next page': SaleHistoryListView.queryset.order_by('-sale_date', '-id').filter(
+                sale_date__lt=since
+            )[:50],
+            'purchase history page': PurchaseHistoryListView.queryset.order_by('-id')[:50],
+            'sales export range': SaleInvoice.objects.filter(sale_date__gte=since, sale_date__lt=timezone.now()),
+            'sales export lines': SaleItem.objects.filter(invoice_id__in=invoice_ids).values_list(
+                'invoice_id', 'product__name', 'batch__batch_number'
+            ),
+            'recent revenue': SaleInvoice.objects.filter(sale_date__gte=since),
+            'rollup rebuild range': SaleItem.objects.annotate(date=TruncDate('invoice__sale_date')).filter(
+                invoice__sale_date__gte=since
+            ).values('date', 'product', 'product__category').annotate(units=Sum('sold_quantity')).order_by(),
+            'margins range': DailySalesRollup.objects.filter(date__gte=today - timedelta(days=7), product__isnull=True),
+            'near expiry': Batch.objects.filter(quantity__gt=0, expiry_date__gte=today, expiry_date__lte=today + timedelta(days=90)),
+            'stock value': Batch.objects.filter(quantity__gt=0).order_by().values('quantity', 'cost_price'),
+            'FEFO deduction lock': Batch.objects.filter(product_id__in=product_ids, quantity__gt=0).order_by(
+                'product_id', 'expiry_date', 'purchase_date', 'id'
+            ),
+            'goods receipt batches': Batch.objects.filter(product_id__in=product_ids, batch_number__in=['BENCH-0']),
+            'stock lock': Stock.objects.filter(product_id__in=product_ids).order_by('product_id'),
+            'supplier analytics': Purchase.objects.filter(supplier_id=1, purchase_date__gte=today).values(
+                'supplier', 'purchase_date'
+            ).annotate(units=Sum('purchase_quantity')).order_by('supplier', 'purchase_date'),
+        }
+        for name, queryset in querysets.items():
+            with self.subTest(name):
+                self.assertEqual(self.full_scans(queryset), [])
+
+
+class AsyncDashboardTests(TransactionTestCase):
+    # Committed data: with ASYNC_QUERY_CONCURRENCY the queries run on other connections
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('manager', password='x')
+        self.token = f'Bearer {RefreshToken.for_user(user).access_token}'
+        make_product('Aspirin', [('A1', 4, '1.00', date(2030, 1, 1)), ('A2', 3, '2.00', None)])
+        make_product('Bandage', [('B1', 50, '0.50', None)])
+        make_product('Cough Syrup', [('C1', 2, '3.00', None)])
+        InventorySnapshot.rebuild()
+
+    def assertSameAsSync(self, path):
+        sync = self.client.get(f'/api/{path}', HTTP_AUTHORIZATION=self.token)
+        response = async_to_sync(self.async_client.get)(f'/api/async/{path}', headers={'Authorization': self.token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), sync.json())
+        return response
+
+    def test_same_payloads_as_sync_views(self):
+        for concurrent in (True, False):
+            with self.subTest(concurrent=concurrent), override_settings(ASYNC_QUERY_CONCURRENCY=concurrent):
+                low = self.assertSameAsSync('dashboard/low-stock/')
+                self.assertEqual([p['name'] for p in low.json()], ['Aspirin', 'Cough Syrup'])
+                self.assertEqual(len(low.json()[0]['active_batches']), 2)
+                self.assertSameAsSync('dashboard/stats/')
+                self.assertSameAsSync('dashboard/margins/')
+
+    def test_auth_validation_and_conditional_get(self):
+        get = async_to_sync(self.async_client.get)
+        self.assertEqual(get('/api/async/dashboard/stats/').status_code, 401)
+        auth = {'Authorization': self.token}
+        self.assertEqual(get('/api/async/dashboard/margins/?group_by=shelf', headers=auth).status_code, 400)
+
+        first = get('/api/async/dashboard/low-stock/', headers=auth)
+        again = get('/api/async/dashboard/low-stock/', headers={**auth, 'If-None-Match': first['ETag']})
+        self.assertEqual(again.status_code, 304)
+
+
+@skipUnless(connection.vendor == 'sqlite', "Copies the SQLite test database into a file for the pooled backend.")
+class PooledFanOutTests(TransactionTestCase):
+    """Async fan-out under the pooled backend, with exactly one connection per concurrent request."""
+
+    REQUESTS = 2
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('manager', password='x')
+        self.token = f'Bearer {RefreshToken.for_user(user).access_token}'
+        make_product('Aspirin', [('A1', 4, '1.00', None)])
+
+        # The pooled SQLite backend needs a file database: copy the test database into one
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'pooled.sqlite3')
+        connection.ensure_connection()
+        target = sqlite3.connect(path)
+        connection.connection.backup(target)
+        target.close()
+
+        # Threads started from here on (the requests' and the fan-out's) connect through the pool
+        pooled = {
+            **connections.settings['default'],
+            'ENGINE': 'inventory.db.backends.sqlite3', 'NAME': path,
+            'POOL': {'SIZE': self.REQUESTS, 'TIMEOUT': 2},
+        }
+        for patcher in (mock.patch.dict(connections.settings, {'default': pooled}), mock.patch.dict(pool._pools, clear=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(lambda: [each.close_idle() for each in pool.all_pools()])
+
+    async def fetch(self, path):
+        # Its own sync thread, and so its own request connection, as under an ASGI server
+        async with ThreadSensitiveContext():
+            return await self.async_client.get(path, headers={'Authorization': self.token})
+
+    def test_concurrent_requests_do_not_exhaust_the_pool(self):
+        async def concurrently():
+            return await asyncio.gather(*(self.fetch('/api/async/dashboard/low-stock/') for _ in range(self.REQUESTS)))
+
+        # A fresh event loop thread: under async_to_sync, sync code would all run on this thread
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            responses = executor.submit(asyncio.run, concurrently()).result()
+        self.assertEqual([response.status_code for response in responses], [200] * self.REQUESTS)
+        self.assertEqual(responses[0].json()[0]['name'], 'Aspirin')
+
+
+class FakeConnection:
+
+    def __init__(self, healthy=True):
+        self.healthy = healthy
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def test_reuses_released_connections_up_to_its_size(self):
+        pool = ConnectionPool(size=2, timeout=0.05)
+        first, reused = pool.acquire(FakeConnection)
+        self.assertFalse(reused)
+        pool.release(first)
+        self.assertEqual(pool.acquire(FakeConnection), (first, True))
+
+        second, _ = pool.acquire(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(FakeConnection)
+        self.assertEqual(pool.stats()['in_use'], 2)
+
+        # A broken connection is closed and frees its slot
+        pool.release(second, reusable=False)
+        self.assertTrue(second.closed)
+        self.assertEqual(pool.stats()['created'], 2)
+        self.assertIsNot(pool.acquire(FakeConnection)[0], second)
+
+    def test_idle_connections_are_checked_and_aged_out(self):
+        def check(raw):
+            if not raw.healthy:
+                raise ConnectionError
+        pool = ConnectionPool(size=1, check_after=0, check=check)
+        raw, _ = pool.acquire(FakeConnection)
+        raw.healthy = False
+        pool.release(raw)
+        fresh, reused = pool.acquire(FakeConnection)
+        self.assertFalse(reused)
+        self.assertTrue(raw.closed)
+
+        pool.max_age = 0
+        pool.release(fresh)
+        self.assertTrue(fresh.closed)
+        self.assertEqual(pool.stats()['open'], 0)
+
+    def test_pooled_backend_skips_connection_setup_on_reuse(self):
+        with tempfile.TemporaryDirectory() as directory:
+            settings_dict = {
+                **connections['default'].settings_dict,
+                'ENGINE': 'inventory.db.backends.sqlite3',
+                'NAME': os.path.join(directory, 'pooled.sqlite3'),
+                'POOL': {'SIZE': 1},
+            }
+            wrapper = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, 'pooled')
+            wrapper.ensure_connection()
+            raw = wrapper.connection
+            wrapper.close()
+            wrapper.ensure_connection()
+
+            self.assertIs(wrapper.connection, raw)
+            self.assertEqual((wrapper.pool.stats()['created'], wrapper.pool.stats()['reused']), (1, 1))
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            wrapper.close()
+            wrapper.pool.close_idle()
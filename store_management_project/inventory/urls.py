@@ -2,11 +2,12 @@
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import (CategoryViewSet, ProductViewSet, ProfitMarginView, SupplierViewSet, 
+from . import async_views
+from .views import (CacheStatsView, CategoryViewSet, NearExpiryReportView, ProductViewSet, ProfitMarginView, ReorderSuggestionsView, SupplierAnalyticsView, SupplierViewSet, 
                     PurchaseViewSet, SaleInvoiceViewSet,
-                    DashboardStatsView, LowStockListView,
+                    DashboardStatsView, LowStockChangesView, LowStockListView,
                     PurchaseHistoryListView, SaleHistoryListView, SalesExportView,
-                    RegisterView) 
+                    QueryStatsView, RegisterView) 
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -31,8 +32,19 @@ urlpatterns = [
     # --- Custom API Paths ---
     path('dashboard/stats/', DashboardStatsView.as_view(), name='dashboard-stats'),
     path('dashboard/low-stock/', LowStockListView.as_view(), name='low-stock-list'),
+    path('dashboard/low-stock/changes/', LowStockChangesView.as_view(), name='low-stock-changes'),
     path('history/sales/', SaleHistoryListView.as_view({'get': 'list'}), name='sales-history'),
     path('history/purchases/', PurchaseHistoryListView.as_view({'get': 'list'}), name='purchase-history'),
     path('export/sales/', SalesExportView.as_view(), name='sales-export'),
     path('dashboard/margins/', ProfitMarginView.as_view(), name='profit-margins'),
+    path('reports/near-expiry/', NearExpiryReportView.as_view(), name='near-expiry-report'),
+    path('reports/suppliers/', SupplierAnalyticsView.as_view(), name='supplier-analytics'),
+    path('reorder-suggestions/', ReorderSuggestionsView.as_view(), name='reorder-suggestions'),
+    path('admin/query-stats/', QueryStatsView.as_view(), name='query-stats'),
+    path('admin/cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
+
+    # --- Async (ASGI) variants of the dashboard reads ---
+    path('async/dashboard/stats/', async_views.dashboard_stats, name='async-dashboard-stats'),
+    path('async/dashboard/low-stock/', async_views.low_stock_list, name='async-low-stock-list'),
+    path('async/dashboard/margins/', async_views.profit_margins, name='async-profit-margins'),
 ]
\ No newline at end of file
@@ -1,64 +1,519 @@
 # inventory/utils.py
 
+import threading
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
 from django.db import transaction
-from django.db.models import F
-from django.core.exceptions import ObjectDoesNotExist
-from .models import Product, Batch, Stock # Import your models
+from django.db.models import F, Max
+from .models import (  # Import your models
+    Product, Batch, Stock, Purchase, InvoiceSequence, InventorySnapshot, SaleInvoice, SaleItem,
+    DailySalesRollup, StockLedger, StockMovement
+)
+from .search import search_cache
 
-def deduct_stock_from_batches(product_id, quantity_to_deduct):
+
+class BatchAllocator:
     """
-    Atomically deducts the specified quantity from the product's batches,
-    prioritizing batches by expiry date (FEFO).
-    
-    Returns: A list of (batch_id, deducted_quantity, unit_cost) tuples used in the sale.
-    Raises: Exception if insufficient stock is found.
+    Multi-product FEFO deduction engine.
+
+    Locks every Stock and Batch row needed for a set of products in two ordered
+    queries, computes the FEFO allocation in memory and books it through a
+    StockLedger (one SALE movement per batch touched), which writes the rows
+    back with bulk_update. Must be used inside transaction.atomic().
     """
-    
-    with transaction.atomic():
-        try:
-            # 1. Lock the Stock record for the product to prevent race conditions
-            stock = Stock.objects.select_for_update().get(product_id=product_id)
-        except ObjectDoesNotExist:
-            raise Exception(f"CRITICAL ERROR: Stock record missing for Product ID {product_id}.")
-
-        total_stock = stock.quantity
-        if total_stock < quantity_to_deduct:
-            remaining = total_stock if total_stock is not None else 0
-            raise Exception(f"Insufficient stock for {stock.product.name}. Required {quantity_to_deduct}, but only {remaining} available.")
-        
-        # 2. Lock and order batches (FEFO: Earliest Expiry Date first)
-        batches = Batch.objects.select_for_update().filter(
-            product_id=product_id, 
+
+    def __init__(self, product_ids, strict=True):
+        product_ids = sorted(set(product_ids))
+
+        # 1. Lock all Stock records at once. Ordering by product_id means two
+        #    tills always take the locks in the same sequence (no deadlocks).
+        self.stocks = {
+            stock.product_id: stock
+            for stock in Stock.objects.select_for_update()
+            .filter(product_id__in=product_ids)
+            .order_by('product_id')
+        }
+        missing = [pid for pid in product_ids if pid not in self.stocks]
+        if missing and strict:
+            raise Exception(f"CRITICAL ERROR: Stock record missing for Product ID {missing[0]}.")
+
+        # 2. Lock and order all batches (FEFO: Earliest Expiry Date first, FIFO tiebreaker)
+        self.batches = {pid: [] for pid in product_ids}
+        for batch in Batch.objects.select_for_update().filter(
+            product_id__in=product_ids,
             quantity__gt=0
-        ).order_by('expiry_date', 'purchase_date') # FEFO/FIFO tiebreaker
-        
+        ).order_by('product_id', 'expiry_date', 'purchase_date', 'id'):
+            self.batches[batch.product_id].append(batch)
+
+        self.ledger = StockLedger()
+
+    def _product_name(self, product_id):
+        # Only hit the database for the name when we actually need an error message
+        return Product.objects.filter(id=product_id).values_list('name', flat=True).first()
+
+    def can_allocate(self, product_id, quantity):
+        """True if the locked Stock and Batch rows can cover quantity (nothing is changed)."""
+        stock = self.stocks.get(product_id)
+        return (
+            stock is not None
+            and stock.quantity >= quantity
+            and sum(batch.quantity for batch in self.batches[product_id]) >= quantity
+        )
+
+    def allocate(self, product_id, quantity_to_deduct, sale_invoice=None):
+        """
+        Deducts quantity_to_deduct from the product's locked batches in memory
+        (the movements are linked to sale_invoice, which may still be unsaved).
+
+        Returns: A list of (batch_id, deducted_quantity, unit_cost) tuples.
+        Raises: Exception if insufficient stock is found.
+        """
+        stock = self.stocks[product_id]
+        if stock.quantity < quantity_to_deduct:
+            raise Exception(
+                f"Insufficient stock for {self._product_name(product_id)}. "
+                f"Required {quantity_to_deduct}, but only {stock.quantity} available."
+            )
+
         remaining_to_deduct = quantity_to_deduct
         deductions = []
 
-        # 3. Iterate through batches and deduct stock
-        for batch in batches:
+        for batch in self.batches[product_id]:
             if remaining_to_deduct == 0:
                 break
-                
-            available_in_batch = batch.quantity
-            deduct_amount = min(remaining_to_deduct, available_in_batch)
-            
+
+            deduct_amount = min(remaining_to_deduct, batch.quantity)
             if deduct_amount > 0:
-                # Atomic update for the specific batch
-                Batch.objects.filter(id=batch.id).update(
-                    quantity=F('quantity') - deduct_amount
-                )
-                
+                self.ledger.move(stock, batch, -deduct_amount, StockMovement.SALE, sale_invoice=sale_invoice)
                 deductions.append((batch.id, deduct_amount, batch.cost_price))
                 remaining_to_deduct -= deduct_amount
 
-        # 4. Final total stock update and check
-        if remaining_to_deduct == 0:
-            # Atomic update for the main stock tracker
-            Stock.objects.filter(product_id=product_id).update(
-                quantity=F('quantity') - quantity_to_deduct
+        if remaining_to_deduct != 0:
+            # Should not happen if Stock and Batch totals agree, but handles drift
+            raise Exception(
+                f"CRITICAL ERROR: Failed to fully deduct stock for {self._product_name(product_id)} "
+                f"during transaction commit. Remaining {remaining_to_deduct} units."
+            )
+
+        return deductions
+
+    def allocate_all(self, lines, sale_invoice=None):
+        """
+        Deducts every (product_id, quantity) line, or none of them: if one fails,
+        the lines already allocated are undone in memory before re-raising.
+
+        Returns: One allocate() result per line.
+        Raises: Exception if insufficient stock is found for any line.
+        """
+        product_ids = {product_id for product_id, _ in lines}
+        stock_quantities = {product_id: self.stocks[product_id].quantity for product_id in product_ids}
+        batch_quantities = [(batch, batch.quantity) for product_id in product_ids for batch in self.batches[product_id]]
+        movement_count = len(self.ledger.movements)
+        try:
+            return [self.allocate(product_id, quantity, sale_invoice) for product_id, quantity in lines]
+        except Exception:
+            for product_id, quantity in stock_quantities.items():
+                self.stocks[product_id].quantity = quantity
+            for batch, quantity in batch_quantities:
+                batch.quantity = quantity
+            del self.ledger.movements[movement_count:]
+            raise
+
+    def save(self):
+        """Writes the ledger movements and every touched Batch and Stock row, one statement per table."""
+        if self.ledger.movements:
+            self.ledger.save()
+            # bulk_update fires no signals; drop cached POS search results ourselves
+            search_cache.clear()
+        self.ledger = StockLedger()
+
+
+def deduct_stock_for_items(items, sale_invoice=None):
+    """
+    Atomically deducts stock for a whole list of (product_id, quantity) lines,
+    prioritizing batches by expiry date (FEFO). The ledger movements are
+    linked to sale_invoice when given.
+
+    Returns: A list with one entry per input line, each a list of
+             (batch_id, deducted_quantity, unit_cost) tuples.
+    Raises: Exception if insufficient stock is found for any line.
+    """
+    with transaction.atomic():
+        allocator = BatchAllocator(product_id for product_id, _ in items)
+        results = [allocator.allocate(product_id, quantity, sale_invoice) for product_id, quantity in items]
+        allocator.save()
+        return results
+
+
+def deduct_stock_from_batches(product_id, quantity_to_deduct):
+    """
+    Atomically deducts the specified quantity from the product's batches,
+    prioritizing batches by expiry date (FEFO).
+
+    Returns: A list of (batch_id, deducted_quantity, unit_cost) tuples used in the sale.
+    Raises: Exception if insufficient stock is found.
+    """
+    return deduct_stock_for_items([(product_id, quantity_to_deduct)])[0]
+
+
+def invoice_totals(lines, discount_rate, tax_rate):
+    """
+    Returns (subtotal, tax_amount, final_total) for (product_id, sold_quantity,
+    unit_sale_price) lines, rounded to cents the way the database stores them.
+    """
+    cents = Decimal('0.01')
+    subtotal = sum(
+        (Decimal(sold_quantity) * Decimal(unit_sale_price) for _, sold_quantity, unit_sale_price in lines),
+        Decimal(0)
+    )
+    discount_rate = Decimal(discount_rate)
+    tax_rate = Decimal(tax_rate)
+    discounted_subtotal = subtotal * (Decimal('1') - discount_rate / Decimal('100'))
+    tax_amount = discounted_subtotal * (tax_rate / Decimal('100'))
+    final_total = discounted_subtotal + tax_amount
+    return subtotal.quantize(cents), tax_amount.quantize(cents), final_total.quantize(cents)
+
+
+def build_sale_items(invoice, lines, all_deductions):
+    """
+    Builds (unsaved) SaleItems for (product_id, sold_quantity, unit_sale_price)
+    lines and the matching deduct_stock_for_items() result.
+    """
+    split_by_batch = getattr(settings, 'SPLIT_SALE_ITEMS_BY_BATCH', True)
+    sale_items = []
+    for (product_id, sold_quantity, unit_sale_price), deductions in zip(lines, all_deductions):
+        if split_by_batch:
+            # One SaleItem per batch deduction, each carrying that batch's
+            # cost price, so COGS is exact even when a line spans batches.
+            for batch_id, deducted_quantity, unit_cost in deductions:
+                sale_items.append(SaleItem(
+                    invoice=invoice,
+                    product_id=product_id,
+                    sold_quantity=deducted_quantity,
+                    unit_sale_price=unit_sale_price,
+                    unit_cost_price=unit_cost,
+                    batch_id=batch_id
+                ))
+            continue
+
+        # Create one SaleItem for the entire sold quantity, linking to the
+        # first batch used, and using the cost price of that batch.
+
+        # NOTE: If stock was pulled from multiple batches, this simplified 
+        # SaleItem model loses some COGS accuracy. Enable 
+        # SPLIT_SALE_ITEMS_BY_BATCH to create one SaleItem per batch deduction.
+        first_batch_id, _, first_cost = deductions[0]
+
+        sale_items.append(SaleItem(
+            invoice=invoice,
+            product_id=product_id,
+            sold_quantity=sold_quantity,
+            unit_sale_price=unit_sale_price,
+            unit_cost_price=first_cost,
+            batch_id=first_batch_id
+        ))
+    return sale_items
+
+
+def rollup_lines(invoice, sale_items, categories):
+    """DailySalesRollup.record() lines for an invoice's SaleItems (categories: product_id -> category_id)."""
+    return [
+        (
+            invoice.sale_date, invoice.id, item.product_id, categories.get(item.product_id),
+            item.sold_quantity,
+            item.unit_sale_price * item.sold_quantity, item.unit_cost_price * item.sold_quantity,
+        )
+        for item in sale_items
+    ]
+
+
+def ingest_sales(invoices):
+    """
+    Bulk sales ingestion for offline tills and end-of-day sync.
+
+    invoices: list of dicts with customer_name, discount_rate, tax_rate, an
+    optional sale_date (time of sale at the till) and items as
+    (product_id, sold_quantity, unit_sale_price) tuples.
+
+    Every product's Stock and Batch rows are locked and allocated (FEFO) once
+    for the whole upload. An invoice whose lines cannot all be met is rejected
+    on its own; the others are written with bulk inserts.
+
+    Locks are taken in the same order as a single sale (SaleInvoiceSerializer.create):
+    the InvoiceSequence row first, then Stock and Batch by product_id, so an
+    upload and a till checkout never wait on each other crosswise. Numbers
+    are therefore reserved for every invoice up front; rejected invoices
+    leave gaps at the end of the reservation.
+
+    Returns: One entry per input invoice: the created SaleInvoice, or an error message.
+    """
+    with transaction.atomic():
+        # 1. Invoice numbers before any Stock/Batch lock (see the lock order above)
+        numbers = next_invoice_numbers(len(invoices))
+
+        product_ids = {product_id for data in invoices for product_id, _, _ in data['items']}
+        categories = dict(Product.objects.filter(id__in=product_ids).values_list('id', 'category_id'))
+        allocator = BatchAllocator(categories, strict=False)
+
+        # 2. One allocation pass, invoice by invoice, in upload order
+        results = []
+        accepted = []
+        for data in invoices:
+            requested = defaultdict(int)
+            for product_id, sold_quantity, _ in data['items']:
+                requested[product_id] += sold_quantity
+
+            error = None
+            for product_id, quantity in requested.items():
+                if product_id not in categories:
+                    error = f"Product ID {product_id} does not exist."
+                elif product_id not in allocator.stocks:
+                    error = f"CRITICAL ERROR: Stock record missing for Product ID {product_id}."
+                elif not allocator.can_allocate(product_id, quantity):
+                    error = (
+                        f"Insufficient stock for Product ID {product_id}. Required {quantity}, "
+                        f"but only {allocator.stocks[product_id].quantity} available."
+                    )
+                if error:
+                    break
+            if error:
+                results.append(error)
+                continue
+
+            subtotal, tax_amount, final_total = invoice_totals(
+                data['items'], data.get('discount_rate', 0), data.get('tax_rate', 0)
+            )
+            invoice = SaleInvoice(
+                customer_name=data.get('customer_name'),
+                discount_rate=data.get('discount_rate', 0),
+                tax_rate=data.get('tax_rate', 0),
+                subtotal=subtotal,
+                tax_amount=tax_amount,
+                final_total=final_total,
+            )
+            try:
+                deductions = allocator.allocate_all(
+                    [(product_id, quantity) for product_id, quantity, _ in data['items']], invoice
+                )
+            except Exception as e:
+                # Batch rows that drifted from Stock: this bill fails, the others go on
+                results.append(str(e))
+                continue
+            accepted.append((len(results), data, deductions, invoice))
+            results.append(None)
+        if not accepted:
+            return results
+
+        # 3. Invoices: one INSERT, numbered in upload order
+        new_invoices = [invoice for _, _, _, invoice in accepted]
+        for invoice, number in zip(new_invoices, numbers):
+            invoice.invoice_number = number
+        SaleInvoice.objects.bulk_create(new_invoices)
+        if any(invoice.pk is None for invoice in new_invoices):
+            # bulk_create does not return primary keys on MySQL, so read them back there
+            ids = dict(SaleInvoice.objects.filter(
+                invoice_number__in=[invoice.invoice_number for invoice in new_invoices]
+            ).values_list('invoice_number', 'id'))
+            for invoice in new_invoices:
+                invoice.pk = ids[invoice.invoice_number]
+
+        # The ledger movements point at the invoices, so they are written now
+        allocator.save()
+
+        # Keep the till's time of sale (auto_now_add stamped the upload time)
+        dated = []
+        for _, data, _, invoice in accepted:
+            if data.get('sale_date'):
+                invoice.sale_date = data['sale_date']
+                dated.append(invoice)
+        if dated:
+            SaleInvoice.objects.bulk_update(dated, ['sale_date'])
+
+        # 4. SaleItems for every invoice in one INSERT, then the rollup and snapshot
+        sale_items = []
+        sold_lines = []
+        for index, data, deductions, invoice in accepted:
+            items = build_sale_items(invoice, data['items'], deductions)
+            sale_items.extend(items)
+            sold_lines.extend(rollup_lines(invoice, items, categories))
+            results[index] = invoice
+        SaleItem.objects.bulk_create(sale_items, batch_size=1000)
+        DailySalesRollup.record(sold_lines)
+
+        window_start = InventorySnapshot.window_start()
+        recent = [invoice for invoice in new_invoices if invoice.sale_date >= window_start]
+        InventorySnapshot.adjust(
+            recent_revenue=sum(invoice.final_total for invoice in recent),
+            recent_sales_count=len(recent),
+        )
+        return results
+
+
+def receive_goods(lines, supplier=None, invoice_number=None):
+    """
+    Set-based goods receipt: books a whole supplier delivery in a handful of
+    statements instead of running the Purchase post_save signal per line.
+
+    lines: list of dicts with product_id, purchase_quantity, unit_purchase_price,
+    expiry_date, batch_number_input and batch_number (the resolved batch code). Produces the same Stock and
+    Batch state as creating the Purchases one by one (later lines re-price and
+    re-date a batch they share with earlier lines).
+
+    Returns: The list of Purchase objects created, each with batch_created set.
+    """
+    with transaction.atomic():
+        product_ids = sorted({line['product_id'] for line in lines})
+
+        # 1. Create missing Stock rows, then lock all of them (ordered, like BatchAllocator)
+        Stock.objects.bulk_create(
+            [Stock(product_id=pid, quantity=0) for pid in product_ids], ignore_conflicts=True
+        )
+        stocks = {
+            stock.product_id: stock
+            for stock in Stock.objects.select_for_update().filter(product_id__in=product_ids).order_by('product_id')
+        }
+
+        # 2. Lock the batches this delivery tops up
+        keys = {(line['product_id'], line['batch_number']) for line in lines}
+        batches = {
+            (batch.product_id, batch.batch_number): batch
+            for batch in Batch.objects.select_for_update().filter(
+                product_id__in=product_ids,
+                batch_number__in={batch_number for _, batch_number in keys}
+            ).order_by('id')
+            if (batch.product_id, batch.batch_number) in keys
+        }
+
+        # 3. Create the missing batches empty (one INSERT); the ledger fills them below
+        new_keys = []
+        for line in lines:
+            key = (line['product_id'], line['batch_number'])
+            if key not in batches:
+                batches[key] = Batch(
+                    product_id=key[0], batch_number=key[1], quantity=0,
+                    cost_price=line['unit_purchase_price'], expiry_date=line['expiry_date'],
+                )
+                new_keys.append(key)
+        if new_keys:
+            Batch.objects.bulk_create([batches[key] for key in new_keys])
+            # bulk_create does not return primary keys on MySQL, so read them back there
+            created = set(new_keys)
+            for batch in [] if all(batches[key].id for key in new_keys) else Batch.objects.filter(
+                product_id__in={pid for pid, _ in new_keys},
+                batch_number__in={number for _, number in new_keys}
+            ).only('id', 'product_id', 'batch_number'):
+                key = (batch.product_id, batch.batch_number)
+                if key in created:
+                    batches[key].id = batch.id
+
+        # 4. Record the Purchases without triggering the per-row post_save signal
+        purchases = [
+            Purchase(
+                product_id=line['product_id'], supplier=supplier,
+                purchase_quantity=line['purchase_quantity'],
+                unit_purchase_price=line['unit_purchase_price'],
+                invoice_number=invoice_number,
+                batch_number_input=line.get('batch_number_input'),
+                expiry_date_input=line['expiry_date'],
+                batch_created_id=batches[(line['product_id'], line['batch_number'])].id,
+            )
+            for line in lines
+        ]
+        Purchase.objects.bulk_create(purchases)
+
+        # 5. Book every line through the ledger, in delivery order (later lines
+        #    re-price and re-date a shared batch), then write it all back
+        ledger = StockLedger()
+        for batch in batches.values():
+            ledger.track(batch)
+        for line, purchase in zip(lines, purchases):
+            batch = batches[(line['product_id'], line['batch_number'])]
+            batch.cost_price = line['unit_purchase_price']
+            batch.expiry_date = line['expiry_date']
+            ledger.move(
+                stocks[line['product_id']], batch, line['purchase_quantity'], StockMovement.PURCHASE,
+                # Without returned primary keys (MySQL) the batch alone identifies the delivery
+                purchase=purchase if purchase.pk else None,
             )
-            return deductions
-        else:
-            # Should not happen if the initial check was correct, but handles unexpected failures
-            raise Exception(f"CRITICAL ERROR: Failed to fully deduct stock for {stock.product.name} during transaction commit. Remaining {remaining_to_deduct} units.")
\ No newline at end of file
+        ledger.save(batch_fields=['quantity', 'cost_price', 'expiry_date'])
+
+        # 6. POS search cache
+        search_cache.clear()
+        return purchases
+
+
+class InvoiceNumberAllocator:
+    """
+    Hands out collision-free invoice numbers from blocks reserved per process.
+
+    A block is reserved with a single UPDATE on the InvoiceSequence row, so the
+    counter row is locked once per block instead of once per sale. The rest of
+    the block is only adopted after the reserving transaction commits: if it
+    rolls back, the counter update is rolled back too and the block is dropped
+    (leaving a gap, never a duplicate).
+    """
+
+    def __init__(self, name, block_size=None):
+        self.name = name
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+
+    def _get_block_size(self):
+        return self.block_size or getattr(settings, 'INVOICE_NUMBER_BLOCK_SIZE', 20)
+
+    def _reserve_block(self, size):
+        """Returns the first value of a freshly reserved [start, start + size) range."""
+        updated = InvoiceSequence.objects.filter(name=self.name).update(
+            next_value=F('next_value') + size
+        )
+        if not updated:
+            # First use: continue after the highest legacy INV-<id> number
+            last_id = SaleInvoice.objects.aggregate(last=Max('id'))['last'] or 0
+            InvoiceSequence.objects.get_or_create(name=self.name, defaults={'next_value': last_id + 1})
+            InvoiceSequence.objects.filter(name=self.name).update(next_value=F('next_value') + size)
+
+        end = InvoiceSequence.objects.filter(name=self.name).values_list('next_value', flat=True).get()
+        return end - size
+
+    def _adopt(self, start, end):
+        with self._lock:
+            if self._next >= self._end:
+                self._next, self._end = start, end
+
+    def next_values(self, count):
+        """Returns `count` unused values, reserving a new block only when the current one runs out."""
+        values = []
+        with self._lock:
+            take = min(count, self._end - self._next)
+            if take > 0:
+                values = list(range(self._next, self._next + take))
+                self._next += take
+
+        remaining = count - len(values)
+        if remaining:
+            size = max(remaining, self._get_block_size())
+            start = self._reserve_block(size)
+            values.extend(range(start, start + remaining))
+            if size > remaining:
+                transaction.on_commit(lambda: self._adopt(start + remaining, start + size))
+        return values
+
+    def next_value(self):
+        return self.next_values(1)[0]
+
+
+invoice_numbers = InvoiceNumberAllocator('sale_invoice')
+
+
+def next_invoice_number():
+    """Returns the next INV-xxxxx number (gap-tolerant, never duplicated)."""
+    return f"INV-{invoice_numbers.next_value():05d}"
+
+
+def next_invoice_numbers(count):
+    """Returns `count` INV-xxxxx numbers from as few counter reservations as possible."""
+    return [f"INV-{value:05d}" for value in invoice_numbers.next_values(count)]
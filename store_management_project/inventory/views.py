@@ -1,40 +1,141 @@
 from django.contrib.auth.models import User
-from django.db.models import Sum, F, DecimalField
-from django.db.models.functions import TruncDate
-from django.http import HttpResponse
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from statistics import mean
+from django.conf import settings
+from django.db.models import Count, DecimalField, F, Max, Min, OuterRef, Prefetch, Q, Subquery, Sum
+from django.http import StreamingHttpResponse
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_date
 import csv
 
 # 💥 NEW IMPORT: Necessary for catching the deletion error
 from django.db.models.deletion import ProtectedError 
 
 from rest_framework import views, viewsets, generics, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
-
-from .models import Category, Product, SaleItem, Stock, Supplier, Purchase, SaleInvoice
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+
+from .cache import catalogue_cache, conditional_get, conditional_response
+from .middleware import recent_requests
+from .models import Batch, Category, DailySalesRollup, InventorySnapshot, LowStockEvent, Product, ProductVelocity, SaleItem, Stock, Supplier, Purchase, SaleInvoice
+from .pagination import ProductCursorPagination, PurchaseCursorPagination, SaleInvoiceCursorPagination
+from .search import search_products
+from .utils import ingest_sales
 from .serializers import (
     CategorySerializer, 
     ProductSerializer, 
+    ProductSearchResultSerializer,
     SupplierSerializer, 
     PurchaseSerializer, 
+    GoodsReceiptSerializer,
+    SaleIngestInvoiceSerializer,
     SaleInvoiceSerializer,
-    UserSerializer
+    UserSerializer,
+    ProductValuesSerializer,
+    PurchaseValuesSerializer,
+    SaleInvoiceValuesSerializer,
 )
 
+def parse_date_range(request):
+    """Reads optional ?from= / ?to= (YYYY-MM-DD) params; raises a 400 on bad input."""
+    dates = []
+    for param in ('from', 'to'):
+        value = request.GET.get(param)
+        parsed = parse_date(value) if value else None
+        if value and parsed is None:
+            raise ValidationError({"detail": f"'{param}' must be a date in YYYY-MM-DD format."})
+        dates.append(parsed)
+    return dates
+
+
+def active_batches_prefetch():
+    """Prefetches in-stock batches (FEFO order) into product.prefetched_active_batches."""
+    return Prefetch(
+        'batches',
+        queryset=Batch.objects.filter(quantity__gt=0).order_by('expiry_date', 'purchase_date'),
+        to_attr='prefetched_active_batches'
+    )
+
+
+class CachedReadMixin:
+    """
+    Serves list() and retrieve() from the catalogue cache (see inventory.cache).
+
+    Entries are keyed by the action, the object id and the query string (so
+    each cursor page is cached on its own) and hold the serialized payload.
+    Permissions are checked before list()/retrieve() run, so cached payloads
+    only reach clients allowed to read them. Responses carry X-Cache: HIT/MISS
+    and an ETag, and revalidations of unchanged payloads get a 304.
+    """
+    cache_namespace = None
+
+    def _cached_response(self, key, build):
+        def cached():
+            data, hit = catalogue_cache.get_or_set(
+                self.cache_namespace, f"{key}?{self.request.GET.urlencode()}", lambda: build().data
+            )
+            response = Response(data)
+            response['X-Cache'] = 'HIT' if hit else 'MISS'
+            return response
+        return conditional_response(self.request, (self.cache_namespace,), cached)
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response('list', lambda: super(CachedReadMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(
+            f"detail:{kwargs[self.lookup_url_kwarg or self.lookup_field]}",
+            lambda: super(CachedReadMixin, self).retrieve(request, *args, **kwargs),
+        )
+
+
+class ValuesListMixin:
+    """
+    list() through a ValuesSerializer: rows come from .values() and are
+    rendered in the shape of the viewset's serializer_class, pagination
+    included. ?fields=a,b limits the keys of each object; nested lists left
+    out are not queried at all.
+    """
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        fields = None
+        if request.query_params.get('fields'):
+            fields = [name.strip() for name in request.query_params['fields'].split(',') if name.strip()]
+            unknown = sorted(set(fields) - set(self.values_serializer_class.field_names()))
+            if unknown:
+                raise ValidationError({"detail": f"Unknown fields: {', '.join(unknown)}."})
+        serializer = self.values_serializer_class(fields)
+
+        rows = serializer.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.to_representation(page))
+        return Response(serializer.to_representation(rows))
+
+
 # --- Core CRUD ViewSets ---
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CachedReadMixin, viewsets.ModelViewSet):
+    cache_namespace = 'category'
     queryset = Category.objects.all().order_by('name')
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(CachedReadMixin, ValuesListMixin, viewsets.ModelViewSet):
+    cache_namespace = 'product'
+    values_serializer_class = ProductValuesSerializer
     # ✅ FIX 1: Filter queryset to only retrieve active products (is_active=True)
-    queryset = Product.objects.filter(is_active=True).select_related('category', 'stock').order_by('name')     
+    queryset = Product.objects.filter(is_active=True).select_related('category', 'stock').prefetch_related(
+        active_batches_prefetch()
+    ).order_by('name')
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ProductCursorPagination
 
     # ✅ FIX 2: Override destroy() to handle ProtectedError gracefully
     def destroy(self, request, *args, **kwargs):
@@ -50,7 +151,18 @@ class ProductViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST 
             )
 
-class SupplierViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Slim, indexed name search for the POS: /api/products/search/?q=<text>&limit=<n>."""
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), 50)
+        except ValueError:
+            limit = 20
+        results = search_products(request.query_params.get('q', ''), max(limit, 1))
+        return Response(ProductSearchResultSerializer(results, many=True).data)
+
+class SupplierViewSet(CachedReadMixin, viewsets.ModelViewSet):
+    cache_namespace = 'supplier'
     queryset = Supplier.objects.all().order_by('name')
     serializer_class = SupplierSerializer
     permission_classes = [IsAuthenticated]
@@ -65,11 +177,66 @@ class PurchaseViewSet(viewsets.ModelViewSet):
     serializer_class = PurchaseSerializer
     permission_classes = [IsAuthenticated]
 
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_receive(self, request):
+        """Books a whole supplier delivery at once: POST /api/purchases/bulk/."""
+        serializer = GoodsReceiptSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
 
 class SaleInvoiceViewSet(viewsets.ModelViewSet):
     queryset = SaleInvoice.objects.all().prefetch_related('items__product').order_by('-sale_date')
     serializer_class = SaleInvoiceSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = SaleInvoiceCursorPagination
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_ingest(self, request):
+        """
+        Books a batch of bills from an offline till: POST /api/sales/bulk/ with a list.
+        Each bill succeeds or fails on its own; the response reports one status per bill.
+        """
+        if not isinstance(request.data, list) or not request.data:
+            raise ValidationError({"detail": "Expected a non-empty list of invoices."})
+
+        # 1. Validate every bill on its own so one bad bill does not sink the upload
+        results = [None] * len(request.data)
+        valid = []
+        for index, payload in enumerate(request.data):
+            serializer = SaleIngestInvoiceSerializer(data=payload)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index] = {'index': index, 'status': 'failed', 'errors': serializer.errors}
+
+        # 2. Book the valid bills together (one lock/allocation pass, bulk writes)
+        booked = ingest_sales([
+            {
+                'customer_name': data.get('customer_name') or None,
+                'discount_rate': data['discount_rate'],
+                'tax_rate': data['tax_rate'],
+                'sale_date': data.get('sale_date'),
+                'items': [(item['product'], item['sold_quantity'], item['unit_sale_price']) for item in data['items']],
+            }
+            for _, data in valid
+        ]) if valid else []
+
+        for (index, _), outcome in zip(valid, booked):
+            if isinstance(outcome, SaleInvoice):
+                results[index] = {
+                    'index': index, 'status': 'created', 'id': outcome.id,
+                    'invoice_number': outcome.invoice_number, 'final_total': str(outcome.final_total),
+                }
+            else:
+                results[index] = {'index': index, 'status': 'failed', 'errors': {'detail': outcome}}
+
+        created = sum(1 for result in results if result['status'] == 'created')
+        return Response(
+            {'created': created, 'failed': len(results) - created, 'results': results},
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
+        )
 
 
 # --- Authentication ---
@@ -86,112 +253,523 @@ class DashboardStatsView(views.APIView):
     """API to return aggregated statistics for the dashboard cards."""
     permission_classes = [IsAuthenticated]
 
-    def get(self, request, format=None):
-        # --- 1. Key Metrics ---
-
-        total_products = Product.objects.count()
-
-        # NOTE: Using product__base_price is a simple way, but cost_price from Batches 
-        # would be more accurate for true inventory value.
-        stock_value = Stock.objects.aggregate(
-            total_value=Sum(F('product__base_price') * F('quantity'), output_field=DecimalField())
-        )['total_value'] or 0.00
+    @staticmethod
+    def stats():
+        # Single-row read: the snapshot is maintained incrementally by the
+        # Purchase and sale write paths (see InventorySnapshot).
+        snapshot = InventorySnapshot.current()
+
+        return {
+            'total_products': snapshot.total_products,
+            'total_stock_value': round(snapshot.total_stock_value, 2),
+            'low_stock_count': snapshot.low_stock_count,
+            'recent_revenue': round(snapshot.recent_revenue, 2),
+            'recent_sales_count': snapshot.recent_sales_count,
+            # Recent figures cover whole days: every sale since this date's midnight.
+            'recent_revenue_since': timezone.localdate(snapshot.revenue_window_start),
+        }
 
-        low_stock_count = Stock.objects.filter(
-            quantity__lte=F('low_stock_threshold'), quantity__gt=0
-        ).count()
+    @conditional_get('snapshot')
+    def get(self, request, format=None):
+        return Response(self.stats())
 
-        # --- 2. Sales Metrics (Last 7 Days) ---
-        seven_days_ago = timezone.now() - timedelta(days=7)
 
-        recent_sales = SaleInvoice.objects.filter(sale_date__gte=seven_days_ago)
+class LowStockListView(views.APIView):
+    """API to return a list of products that are currently low on stock."""
+    permission_classes = [IsAuthenticated]
 
-        recent_revenue = recent_sales.aggregate(
-            total=Sum('final_total', output_field=DecimalField())
-        )['total'] or 0.00
+    @staticmethod
+    def products():
+        # Indexed flag, maintained by every stock write (see Stock.is_low)
+        return Product.objects.filter(stock__is_low=True).select_related('stock', 'category')
 
-        recent_sales_count = recent_sales.count()
+    @conditional_get('product')
+    def get(self, request, format=None):
+        serializer = ProductValuesSerializer()
+        return Response(serializer.to_representation(serializer.values(self.products())))
 
-        data = {
-            'total_products': total_products,
-            'total_stock_value': round(stock_value, 2),
-            'low_stock_count': low_stock_count,
-            'recent_revenue': round(recent_revenue, 2),
-            'recent_sales_count': recent_sales_count,
-        }
-        return Response(data)
 
+class LowStockChangesView(views.APIView):
+    """
+    Incremental low-stock feed for cheap polling.
 
-class LowStockListView(views.APIView):
-    """API to return a list of products that are currently low on stock."""
+    Without ?since= it returns every product currently low plus a cursor;
+    with ?since=<cursor> only the changes after it (oldest first, at most
+    `limit` per call, `more` tells the client to ask again). A change with
+    is_low false means the product left the list.
+    """
     permission_classes = [IsAuthenticated]
+    limit = 500
+    FIELDS = {
+        'product': 'product_id', 'name': 'product__name', 'category_name': 'product__category__name',
+        'is_low': 'is_low', 'quantity': 'quantity', 'low_stock_threshold': 'low_stock_threshold',
+    }
+
+    def rows(self, queryset):
+        return [
+            {key: row[field] for key, field in self.FIELDS.items()}
+            for row in queryset.values(*self.FIELDS.values())
+        ]
 
     def get(self, request, format=None):
-        low_stock_products = Product.objects.filter(
-            stock__quantity__lte=F('stock__low_stock_threshold'), 
-            stock__quantity__gt=0
-        ).select_related('stock', 'category')
-
-        serializer = ProductSerializer(low_stock_products, many=True)
-        return Response(serializer.data)
-    
-class SaleHistoryListView(viewsets.ReadOnlyModelViewSet):
+        since = request.query_params.get('since')
+        if since is None:
+            # Cursor first: a change racing with the listing is sent again on the next poll
+            cursor = LowStockEvent.objects.aggregate(last=Max('id'))['last'] or 0
+            # Sorted here: ordering by the joined name would have the database walk
+            # every product in name order instead of seeking the is_low index
+            changes = sorted(
+                self.rows(Stock.objects.filter(is_low=True)), key=lambda row: row['name'].casefold()
+            )
+            return Response({'cursor': cursor, 'more': False, 'changes': changes})
+
+        if not since.isdigit():
+            raise ValidationError({"detail": "'since' must be a cursor returned by this endpoint."})
+        events = LowStockEvent.objects.filter(id__gt=int(since)).order_by('id')
+        ids = list(events.values_list('id', flat=True)[:self.limit + 1])
+        more = len(ids) > self.limit
+        ids = ids[:self.limit]
+        return Response({
+            'cursor': ids[-1] if ids else int(since),
+            'more': more,
+            'changes': self.rows(events.filter(id__in=ids)),
+        })
+
+
+class SaleHistoryListView(ValuesListMixin, viewsets.ReadOnlyModelViewSet):
     """View for listing all past sales."""
     queryset = SaleInvoice.objects.all().prefetch_related('items').order_by('-sale_date')
     serializer_class = SaleInvoiceSerializer
+    values_serializer_class = SaleInvoiceValuesSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = SaleInvoiceCursorPagination
     
-class PurchaseHistoryListView(viewsets.ReadOnlyModelViewSet):
+class PurchaseHistoryListView(ValuesListMixin, viewsets.ReadOnlyModelViewSet):
     """View for listing all past purchases."""
     queryset = Purchase.objects.all().select_related('product', 'supplier', 'batch_created').order_by('-purchase_date')
     serializer_class = PurchaseSerializer
+    values_serializer_class = PurchaseValuesSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PurchaseCursorPagination
     
+class Echo:
+    """Pseudo-buffer for csv.writer: hands each formatted row straight back to the stream."""
+
+    def write(self, value):
+        return value
+
+
 class SalesExportView(views.APIView):
-    """API to export all sales data to a CSV file."""
+    """
+    API to export sales data to a CSV file, streamed in constant memory.
+
+    Query params: from / to (YYYY-MM-DD, inclusive) and detail=items for one
+    row per sold line (product, batch, quantity, prices) instead of per invoice.
+    """
     permission_classes = [IsAuthenticated]
+    chunk_size = 2000
+
+    INVOICE_HEADER = ['Invoice No', 'Date', 'Customer Name', 'Subtotal', 'Tax', 'Total']
+    ITEM_HEADER = [
+        'Invoice No', 'Date', 'Customer Name', 'Product', 'Batch',
+        'Quantity', 'Unit Price', 'Unit Cost', 'Line Total'
+    ]
+
+    def invoice_chunks(self, invoices):
+        """
+        Yields invoices newest first, chunk_size rows at a time, using keyset
+        pagination on the (sale_date, id) index. Unlike .iterator(), this keeps
+        memory flat on MySQL too, where the driver buffers whole result sets.
+        """
+        invoices = invoices.order_by('-sale_date', '-id').values_list(
+            'id', 'invoice_number', 'sale_date', 'customer_name', 'subtotal', 'tax_amount', 'final_total'
+        )
+        last = None
+        while True:
+            page = invoices
+            if last:
+                page = page.filter(Q(sale_date__lt=last[2]) | Q(sale_date=last[2], id__lt=last[0]))
+            rows = list(page[:self.chunk_size])
+            if not rows:
+                return
+            yield rows
+            last = rows[-1]
+
+    def invoice_rows(self, invoices):
+        yield self.INVOICE_HEADER
+        for chunk in self.invoice_chunks(invoices):
+            for _, number, sale_date, customer, subtotal, tax, total in chunk:
+                yield [number, sale_date.strftime('%Y-%m-%d %H:%M'), customer or 'N/A', subtotal, tax, total]
+
+    def item_rows(self, invoices):
+        yield self.ITEM_HEADER
+        for chunk in self.invoice_chunks(invoices):
+            # One query for all lines of this chunk of invoices (uses the invoice FK index)
+            lines = {}
+            for invoice_id, *line in SaleItem.objects.filter(
+                invoice_id__in=[row[0] for row in chunk]
+            ).order_by('id').values_list(
+                'invoice_id', 'product__name', 'batch__batch_number',
+                'sold_quantity', 'unit_sale_price', 'unit_cost_price'
+            ):
+                lines.setdefault(invoice_id, []).append(line)
+
+            for invoice_id, number, sale_date, customer, *_ in chunk:
+                for product, batch, quantity, price, cost in lines.get(invoice_id, []):
+                    yield [
+                        number, sale_date.strftime('%Y-%m-%d %H:%M'), customer or 'N/A',
+                        product, batch or '', quantity, price, cost, price * quantity
+                    ]
 
     def get(self, request, format=None):
-        response = HttpResponse(content_type='text/csv')
+        date_from, date_to = parse_date_range(request)
+
+        # Date bounds as datetimes so the filter stays an index range on sale_date
+        invoices = SaleInvoice.objects.all()
+        if date_from:
+            invoices = invoices.filter(
+                sale_date__gte=timezone.make_aware(datetime.combine(date_from, time.min))
+            )
+        if date_to:
+            invoices = invoices.filter(
+                sale_date__lt=timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+            )
+
+        rows = self.item_rows(invoices) if request.query_params.get('detail') == 'items' else self.invoice_rows(invoices)
+        writer = csv.writer(Echo())
+        response = StreamingHttpResponse((writer.writerow(row) for row in rows), content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename="sales_report.csv"'
+        return response
+    
+class NearExpiryReportView(views.APIView):
+    """
+    In-stock batches expiring within ?days= (default 30) and the quantity and
+    cost value at risk, aggregated in SQL over the batch expiry index.
 
-        writer = csv.writer(response)
-        # Define CSV Header Row
-        writer.writerow(['Invoice No', 'Date', 'Customer Name', 'Subtotal', 'Tax', 'Total'])
+    Query params: days, category, supplier (supplier of the batch's latest
+    purchase), include_expired=true to also count stock already past expiry,
+    and group_by=product|category|supplier (default: one row per batch).
+    """
+    permission_classes = [IsAuthenticated]
 
-        # Fetch data
-        sales = SaleInvoice.objects.all().order_by('-sale_date')
+    GROUPINGS = {
+        'product': ('product', 'product__name'),
+        'category': ('product__category', 'product__category__name'),
+        'supplier': ('supplier', 'supplier_name'),
+    }
 
-        # Write data rows
-        for sale in sales:
-            writer.writerow([
-                sale.invoice_number,
-                sale.sale_date.strftime('%Y-%m-%d %H:%M'),
-                sale.customer_name or 'N/A',
-                sale.subtotal,
-                sale.tax_amount,
-                sale.final_total
-            ])
+    def get(self, request, format=None):
+        group_by = request.query_params.get('group_by')
+        if group_by and group_by not in self.GROUPINGS:
+            raise ValidationError({"detail": f"group_by must be one of: {', '.join(self.GROUPINGS)}."})
+        params = {}
+        for param, default in (('days', 30), ('category', None), ('supplier', None)):
+            value = request.query_params.get(param)
+            if value is not None and not value.isdigit():
+                raise ValidationError({"detail": f"'{param}' must be a whole number."})
+            params[param] = int(value) if value is not None else default
+
+        # 1. In-stock batches inside the horizon (index range scan on expiry_date)
+        today = timezone.localdate()
+        until = today + timedelta(days=params['days'])
+        batches = Batch.objects.filter(quantity__gt=0, expiry_date__lte=until)
+        if request.query_params.get('include_expired', '').lower() not in ('1', 'true', 'yes'):
+            batches = batches.filter(expiry_date__gte=today)
+        if params['category'] is not None:
+            batches = batches.filter(product__category_id=params['category'])
+
+        # The supplier is the latest purchase's, both to filter and to group on
+        latest_purchase = Purchase.objects.filter(batch_created=OuterRef('pk')).order_by('-id')
+        if params['supplier'] is not None or group_by == 'supplier':
+            batches = batches.annotate(supplier=Subquery(latest_purchase.values('supplier')[:1]))
+        if params['supplier'] is not None:
+            batches = batches.filter(supplier=params['supplier'])
+        if group_by == 'supplier':
+            batches = batches.annotate(supplier_name=Subquery(latest_purchase.values('supplier__name')[:1]))
+
+        money = DecimalField(max_digits=14, decimal_places=2)
+        value_at_risk = Sum(F('quantity') * F('cost_price'), output_field=money)
+
+        # 2. Totals and rows, both computed by the database
+        # (aggregates may not reuse the model's field names, hence `units`)
+        totals = batches.aggregate(batches=Count('id'), units=Sum('quantity'), value=value_at_risk)
+        if group_by:
+            rows = list(batches.values(*self.GROUPINGS[group_by]).annotate(
+                batches=Count('id'), units=Sum('quantity'), value=value_at_risk,
+                earliest_expiry=Min('expiry_date'),
+            ).order_by('earliest_expiry', *self.GROUPINGS[group_by]))
+            for row in rows:
+                row['quantity'] = row.pop('units')
+        else:
+            rows = list(batches.values(
+                'id', 'product', 'product__name', 'batch_number', 'expiry_date', 'quantity',
+            ).annotate(
+                value=F('quantity') * F('cost_price')
+            ).order_by('expiry_date', 'product__name', 'id'))
+            for row in rows:
+                row['days_left'] = (row['expiry_date'] - today).days
+
+        return Response({
+            'as_of': today,
+            'until': until,
+            'totals': {
+                'batches': totals['batches'],
+                'quantity': totals['units'] or 0,
+                'value': totals['value'] or 0,
+            },
+            'rows': rows,
+        })
+
+
+class SupplierAnalyticsView(views.APIView):
+    """
+    Spend, volume and average unit cost per supplier and period, aggregated
+    in SQL from Purchase.
+
+    Query params: from / to (YYYY-MM-DD, inclusive), period=day|week|month|year
+    (default month), supplier and product to narrow the purchases down.
+    Suppliers come heaviest spend first, each with its per-period rows and
+    price_trend: the % change in average unit cost from its first period to
+    its last. Purchases whose supplier was deleted are grouped under null.
+    """
+    permission_classes = [IsAuthenticated]
 
-        return response
-    
-class ProfitMarginView(views.APIView):
-    """Calculates total sales revenue and profit margin grouped by date."""
+    # Start of the period a purchase date falls in (weeks start on Monday)
+    PERIODS = {
+        'day': lambda day: day,
+        'week': lambda day: day - timedelta(days=day.weekday()),
+        'month': lambda day: day.replace(day=1),
+        'year': lambda day: day.replace(month=1, day=1),
+    }
+
+    @staticmethod
+    def unit_cost(spend, units):
+        return (spend / units).quantize(Decimal('0.01')) if units else None
+
+    def get(self, request, format=None):
+        period = request.query_params.get('period', 'month')
+        if period not in self.PERIODS:
+            raise ValidationError({"detail": f"period must be one of: {', '.join(self.PERIODS)}."})
+        params = {}
+        for param in ('supplier', 'product'):
+            value = request.query_params.get(param)
+            if value is not None and not value.isdigit():
+                raise ValidationError({"detail": f"'{param}' must be a whole number."})
+            params[param] = int(value) if value is not None else None
+        date_from, date_to = parse_date_range(request)
+
+        purchases = Purchase.objects.all()
+        if date_from:
+            purchases = purchases.filter(purchase_date__gte=date_from)
+        if date_to:
+            purchases = purchases.filter(purchase_date__lte=date_to)
+        if params['supplier'] is not None:
+            purchases = purchases.filter(supplier_id=params['supplier'])
+        if params['product'] is not None:
+            purchases = purchases.filter(product_id=params['product'])
+
+        # 1. Daily sums per supplier, grouped in the order of the covering
+        #    (supplier, purchase_date, quantity, price) index: the database
+        #    streams it without sorting or reading the table. Grouping by a
+        #    truncated date instead would sort, and on SQLite call a Python
+        #    function for every row.
+        money = DecimalField(max_digits=14, decimal_places=2)
+        days = purchases.values('supplier', 'purchase_date').annotate(
+            purchases=Count('id'),
+            units=Sum('purchase_quantity'),
+            spend=Sum(F('purchase_quantity') * F('unit_purchase_price'), output_field=money),
+        ).order_by('supplier', 'purchase_date')
+
+        # 2. Fold the days into periods and supplier totals
+        period_start = self.PERIODS[period]
+        suppliers = {}
+        for day in days:
+            totals = suppliers.setdefault(day['supplier'], {
+                'supplier': day['supplier'], 'purchases': 0, 'quantity': 0, 'spend': Decimal('0'),
+                'first_purchase': day['purchase_date'], 'periods': [],
+            })
+            totals['purchases'] += day['purchases']
+            totals['quantity'] += day['units']
+            totals['spend'] += day['spend']
+            totals['last_purchase'] = day['purchase_date']
+
+            start = period_start(day['purchase_date'])
+            if not totals['periods'] or totals['periods'][-1]['period'] != start:
+                totals['periods'].append({'period': start, 'purchases': 0, 'quantity': 0, 'spend': Decimal('0')})
+            row = totals['periods'][-1]
+            row['purchases'] += day['purchases']
+            row['quantity'] += day['units']
+            row['spend'] += day['spend']
+
+        names = dict(Supplier.objects.filter(id__in=[pk for pk in suppliers if pk]).values_list('id', 'name'))
+        for totals in suppliers.values():
+            totals['name'] = names.get(totals['supplier'])
+            totals['avg_unit_cost'] = self.unit_cost(totals['spend'], totals['quantity'])
+            for row in totals['periods']:
+                row['avg_unit_cost'] = self.unit_cost(row['spend'], row['quantity'])
+            first, last = totals['periods'][0]['avg_unit_cost'], totals['periods'][-1]['avg_unit_cost']
+            totals['price_trend'] = round(float((last - first) / first * 100), 2) if first else None
+
+        return Response({
+            'from': date_from,
+            'to': date_to,
+            'period': period,
+            'suppliers': sorted(suppliers.values(), key=lambda totals: (-totals['spend'], totals['name'] or '')),
+        })
+
+
+class ReorderSuggestionsView(views.APIView):
+    """
+    What to reorder, from the nightly ProductVelocity figures and current
+    stock, in one query: no sales are read at request time.
+
+    By default lists active products selling and at or under their reorder
+    point, fewest days of cover first; ?all=true lists every product with a
+    velocity. Each row has the velocity (units_per_day), days_of_cover and a
+    suggested_quantity to order.
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request, format=None):
-        sales_items = SaleItem.objects.annotate(
-            revenue=F('unit_sale_price') * F('sold_quantity'),
-            cost=F('unit_cost_price') * F('sold_quantity'),
-            profit=F('revenue') - F('cost')
-        ).select_related('invoice')
-
-        daily_margins = sales_items.annotate(
-            date=TruncDate('invoice__sale_date') 
-        ).values('date').annotate(
+        velocities = ProductVelocity.objects.filter(product__is_active=True)
+        if request.query_params.get('all', '').lower() not in ('1', 'true', 'yes'):
+            velocities = velocities.filter(units_per_day__gt=0).filter(
+                Q(product__stock__quantity__lte=F('reorder_point')) | Q(product__stock__isnull=True)
+            )
+
+        suggestions = []
+        for row in velocities.values(
+            'product', 'product__name', 'product__stock__quantity', 'product__stock__low_stock_threshold',
+            'units_per_day', 'reorder_point', 'last_sale_date', 'as_of',
+        ):
+            quantity = row['product__stock__quantity'] or 0
+            days_of_cover, suggested_quantity = ProductVelocity.suggest(row['units_per_day'], quantity)
+            suggestions.append({
+                'product': row['product'],
+                'name': row['product__name'],
+                'quantity': quantity,
+                'low_stock_threshold': row['product__stock__low_stock_threshold'],
+                'units_per_day': row['units_per_day'],
+                'days_of_cover': days_of_cover,
+                'reorder_point': row['reorder_point'],
+                'suggested_quantity': suggested_quantity,
+                'last_sale_date': row['last_sale_date'],
+                'as_of': row['as_of'],
+            })
+
+        # Products that do not sell (no days of cover) last
+        suggestions.sort(key=lambda s: (s['days_of_cover'] is None, s['days_of_cover'] or 0, s['name']))
+        return Response(suggestions)
+
+
+class ProfitMarginView(views.APIView):
+    """
+    Sales revenue, cost and profit per day, read from the DailySalesRollup table.
+
+    Query params: from / to (YYYY-MM-DD, inclusive) and group_by=product|category
+    to break each day down further.
+    """
+    permission_classes = [IsAuthenticated]
+
+    GROUPINGS = {
+        'product': ('product', 'product__name'),
+        'category': ('category', 'category__name'),
+    }
+
+    @classmethod
+    def margins(cls, request):
+        """The per-day (per-group) margin rows as a lazy .values() queryset; raises a 400 on bad params."""
+        group_by = request.GET.get('group_by')
+        if group_by and group_by not in cls.GROUPINGS:
+            raise ValidationError({"detail": f"group_by must be one of: {', '.join(cls.GROUPINGS)}."})
+
+        date_from, date_to = parse_date_range(request)
+        rows = DailySalesRollup.objects.all()
+        if date_from:
+            rows = rows.filter(date__gte=date_from)
+        if date_to:
+            rows = rows.filter(date__lte=date_to)
+
+        if group_by:
+            group_fields = cls.GROUPINGS[group_by]
+            rows = rows.filter(product__isnull=False)
+        else:
+            group_fields = ()
+            rows = rows.filter(product__isnull=True)
+
+        return rows.values('date', *group_fields).annotate(
             total_revenue=Sum('revenue'),
             total_cost=Sum('cost'),
-            total_profit=Sum('profit')
-        ).order_by('-date')
+        ).annotate(
+            total_profit=F('total_revenue') - F('total_cost')
+        ).order_by('-date', *group_fields)
+
+    def get(self, request, format=None):
+        return Response(list(self.margins(request)))
 
-        return Response(list(daily_margins))
\ No newline at end of file
+
+# --- Instrumentation ---
+
+class QueryStatsView(views.APIView):
+    """
+    Per-view SQL and timing figures from the QueryStatsMiddleware ring buffer
+    (admins only). Views are listed by total DB time, heaviest first;
+    ?recent= sets how many raw entries to include (default 50).
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, format=None):
+        entries = list(recent_requests)
+        try:
+            recent = max(int(request.query_params.get('recent', 50)), 0)
+        except ValueError:
+            raise ValidationError({"detail": "'recent' must be a whole number."})
+
+        # 1. Group the buffered requests by view
+        by_view = defaultdict(list)
+        for entry in entries:
+            by_view[entry['view']].append(entry)
+
+        # 2. Summarize each view
+        summary = []
+        for view_name, rows in by_view.items():
+            totals = sorted(row['total_ms'] for row in rows)
+            summary.append({
+                'view': view_name,
+                'requests': len(rows),
+                'avg_queries': round(mean(row['queries'] for row in rows), 1),
+                'max_queries': max(row['queries'] for row in rows),
+                'avg_db_ms': round(mean(row['db_ms'] for row in rows), 2),
+                'total_db_ms': round(sum(row['db_ms'] for row in rows), 2),
+                'avg_serialize_ms': round(mean(row['serialize_ms'] for row in rows), 2),
+                'p95_total_ms': totals[max(0, int(len(totals) * 0.95) - 1)],
+                'requests_with_repeated_queries': sum(1 for row in rows if row['duplicates']),
+            })
+        summary.sort(key=lambda row: row['total_db_ms'], reverse=True)
+
+        return Response({
+            'enabled': getattr(settings, 'QUERY_STATS_ENABLED', False),
+            'buffered_requests': len(entries),
+            'views': summary,
+            'recent': entries[::-1][:recent],
+        })
+
+
+class CacheStatsView(views.APIView):
+    """
+    Catalogue cache hit/miss counters of this process, per namespace (admins
+    only). DELETE resets the counters.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, format=None):
+        return Response({
+            'enabled': catalogue_cache.enabled,
+            'backend': catalogue_cache.alias,
+            'timeout': catalogue_cache.timeout,
+            'namespaces': catalogue_cache.stats(),
+        })
+
+    def delete(self, request, format=None):
+        catalogue_cache.reset_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
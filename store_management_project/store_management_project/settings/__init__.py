@@ -0,0 +1,20 @@
+"""
+Settings package for store_management_project.
+
+DJANGO_ENV picks the profile: 'dev' (the default) or 'prod'. Both build on
+base.py; DJANGO_SETTINGS_MODULE may also name store_management_project.settings.dev
+or .prod directly.
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+DJANGO_ENV = os.environ.get('DJANGO_ENV', 'dev')
+
+if DJANGO_ENV == 'prod':
+    from .prod import *  # noqa: F401,F403
+elif DJANGO_ENV == 'dev':
+    from .dev import *  # noqa: F401,F403
+else:
+    raise ImproperlyConfigured(f"DJANGO_ENV must be 'dev' or 'prod', not {DJANGO_ENV!r}.")
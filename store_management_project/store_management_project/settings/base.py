@@ -0,0 +1,262 @@
+"""
+Settings shared by every profile of store_management_project (see the
+package __init__ for how a profile is picked; dev.py and prod.py build on
+this module).
+
+Generated by 'django-admin startproject' using Django 5.2.8.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.2/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/5.2/ref/settings/
+"""
+
+import os
+from datetime import timedelta
+from pathlib import Path
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+# (prod.py requires DJANGO_SECRET_KEY)
+SECRET_KEY = os.environ.get(
+    'DJANGO_SECRET_KEY', 'django-insecure-7b5%22k0!2_e^we^t%pv_m+8h(-po+0t0d5br*ks8^!d2s_ea%'
+)
+
+# SECURITY WARNING: don't run with debug turned on in production!
+# With DEBUG on, Django also keeps every executed SQL statement in memory.
+DEBUG = False
+
+ALLOWED_HOSTS = []
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'rest_framework',
+    'corsheaders',
+    'inventory',
+    'rest_framework_simplejwt',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    # Per-request SQL/timing stats; inactive unless QUERY_STATS_ENABLED is set
+    'inventory.middleware.QueryStatsMiddleware',
+    # ------------------------------------------------------------------
+    # IMPORTANT: The CorsMiddleware MUST be placed very high, before
+    # any middleware that can generate HTTP responses (like CommonMiddleware).
+    'corsheaders.middleware.CorsMiddleware', 
+    # ------------------------------------------------------------------
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'store_management_project.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'store_management_project.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+#
+# Profile picked by DB_PROFILE:
+#   mysql  (default) MySQL through a bounded, process-wide connection pool
+#          (inventory.db.backends.mysql). CONN_MAX_AGE stays 0 so every
+#          request hands its connection back to the pool, which works the
+#          same under WSGI and ASGI. DB_POOL_SIZE=0 switches to Django's
+#          own persistent connections instead (DB_CONN_MAX_AGE seconds,
+#          health-checked), for WSGI deployments only.
+#   sqlite SQLite stand-in for tests and local work (DB_SQLITE_PATH).
+
+DB_PROFILE = os.environ.get('DB_PROFILE', 'mysql')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+
+if DB_PROFILE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'inventory.db.backends.mysql' if DB_POOL_SIZE else 'django.db.backends.mysql',
+            'NAME': os.environ.get('DB_NAME', 'store_management_db'),
+            'USER': os.environ.get('DB_USER', 'root'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', '1226'),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '3306'),
+            'OPTIONS': {
+                'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+                'charset': 'utf8mb4',
+            },
+            'CONN_MAX_AGE': 0 if DB_POOL_SIZE else int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            # Pool sizing (seconds for TIMEOUT, MAX_AGE and CHECK_AFTER); see inventory.db.pool
+            'POOL': {
+                'SIZE': DB_POOL_SIZE,
+                'TIMEOUT': 5,
+                'MAX_AGE': 1800,
+                'CHECK_AFTER': 30,
+            },
+        }
+    }
+    # MySQL has no partial indexes and skips the SQLite-only ones on the models
+    # (its plain indexes already serve `flag = true`), so their warning is noise
+    SILENCED_SYSTEM_CHECKS = ['models.W037']
+
+
+# Password validation
+# https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/5.2/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/5.2/howto/static-files/
+
+STATIC_URL = 'static/'
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Inventory: write one SaleItem per batch a sale line was drawn from, so each
+# row carries that batch's exact cost price (accurate COGS in profit reports).
+SPLIT_SALE_ITEMS_BY_BATCH = True
+
+# Inventory: invoice numbers each worker process reserves per trip to the
+# InvoiceSequence counter. Larger blocks mean fewer counter locks, larger gaps.
+INVOICE_NUMBER_BLOCK_SIZE = 20
+
+# CORS Headers Configuration
+CORS_ALLOWED_ORIGINS = [
+    "http://localhost:5173", # React development server
+]
+# Or, during initial development, you can use:
+# CORS_ALLOW_ALL_ORIGINS = True
+
+REST_FRAMEWORK = {
+    # Default all views to require login
+    'DEFAULT_PERMISSION_CLASSES': [
+        'rest_framework.permissions.IsAuthenticated', 
+    ],
+    # Configure authentication mechanism
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'rest_framework_simplejwt.authentication.JWTAuthentication',
+    ),
+}
+# POS product search: in-process result cache (entries, seconds to live)
+PRODUCT_SEARCH_CACHE_SIZE = 256
+PRODUCT_SEARCH_CACHE_TTL = 5
+
+# Cursor pagination for catalogue/history lists (opt-in per request via
+# ?page_size= or ?cursor=; clients may ask for up to API_MAX_PAGE_SIZE rows)
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 500
+
+# Per-request SQL/timing instrumentation (inventory.middleware.QueryStatsMiddleware):
+# Server-Timing headers plus the last QUERY_STATS_BUFFER_SIZE requests at
+# /api/admin/query-stats/. A statement run QUERY_STATS_DUPLICATE_THRESHOLD or
+# more times in one request is reported as a likely N+1.
+QUERY_STATS_ENABLED = False
+QUERY_STATS_BUFFER_SIZE = 500
+QUERY_STATS_DUPLICATE_THRESHOLD = 3
+
+# Caches. Local memory is per process: with several workers, point 'default'
+# at a shared backend (Redis/Memcached) so every worker sees the same
+# catalogue cache versions.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'store-management',
+    },
+}
+
+# Read-through cache for category/supplier/product list and detail payloads
+# (inventory.cache): which cache to use and how long an entry lives (seconds).
+# Writes invalidate entries immediately, the timeout only bounds memory use.
+CATALOGUE_CACHE_ENABLED = True
+CATALOGUE_CACHE_ALIAS = 'default'
+CATALOGUE_CACHE_TIMEOUT = 300
+# Async dashboard endpoints (/api/async/, served under ASGI): run a view's
+# independent queries at the same time, each on its own worker thread and DB
+# connection. False runs them one after another on the request's thread.
+ASYNC_QUERY_CONCURRENCY = True
+# Reorder suggestions (inventory.models.ProductVelocity): sales velocity is a
+# moving average of units sold per day over about REORDER_VELOCITY_SPAN_DAYS
+# days. A product needs reordering once its stock falls to the sales expected
+# over the supplier lead time plus REORDER_SAFETY_DAYS; the suggested order
+# covers the lead time plus REORDER_COVER_DAYS of sales.
+REORDER_VELOCITY_SPAN_DAYS = 28
+REORDER_LEAD_TIME_DAYS = 7
+REORDER_SAFETY_DAYS = 3
+REORDER_COVER_DAYS = 30
+# 3. (Optional but Recommended) Configure JWT LIFETIME
+SIMPLE_JWT = {
+    "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60), 
+    "REFRESH_TOKEN_LIFETIME": timedelta(days=7),    
+    "ROTATE_REFRESH_TOKENS": True,                 
+    "ALGORITHM": "HS256",
+    "SIGNING_KEY": SECRET_KEY,
+    "AUTH_HEADER_TYPES": ("Bearer",),
+}
\ No newline at end of file
@@ -0,0 +1,5 @@
+"""Development profile: debug pages, the browsable API and the admin site."""
+
+from .base import *  # noqa: F401,F403
+
+DEBUG = True
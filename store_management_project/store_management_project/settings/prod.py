@@ -0,0 +1,90 @@
+"""
+Production profile: no debug (so no per-request SQL log), JSON-only
+responses, and only the apps and middleware a JWT-authenticated API needs.
+Configured from the environment: DJANGO_SECRET_KEY (required),
+DJANGO_ALLOWED_HOSTS and DJANGO_CORS_ORIGINS (comma-separated),
+DJANGO_CACHE_BACKEND and DJANGO_CACHE_LOCATION, and DJANGO_ADMIN_ENABLED=1
+to keep the admin site.
+"""
+
+import os
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import *  # noqa: F401,F403
+from .base import CATALOGUE_CACHE_ALIAS, CORS_ALLOWED_ORIGINS, INSTALLED_APPS, MIDDLEWARE, REST_FRAMEWORK, SIMPLE_JWT, TEMPLATES
+
+DEBUG = False
+
+if not os.environ.get('DJANGO_SECRET_KEY'):
+    raise ImproperlyConfigured("DJANGO_SECRET_KEY must be set in production.")
+SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+SIMPLE_JWT = {**SIMPLE_JWT, 'SIGNING_KEY': SECRET_KEY}
+
+
+def _env_list(name, default):
+    value = os.environ.get(name)
+    return [item.strip() for item in value.split(',') if item.strip()] if value else default
+
+
+ALLOWED_HOSTS = _env_list('DJANGO_ALLOWED_HOSTS', [])
+CORS_ALLOWED_ORIGINS = _env_list('DJANGO_CORS_ORIGINS', CORS_ALLOWED_ORIGINS)
+
+# Production runs several worker processes, and the catalogue cache's version
+# counters are both its invalidation and the ETags of conditional GETs: they
+# must live in a cache every worker shares, or a worker that missed a bump
+# keeps answering 304 (and serving cached payloads) for stale data. Defaults
+# to a file-based cache, shared by the workers of one host; deployments
+# across hosts point DJANGO_CACHE_BACKEND / DJANGO_CACHE_LOCATION at Redis or
+# Memcached (e.g. django.core.cache.backends.redis.RedisCache).
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get(
+            'DJANGO_CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'store-management-cache')
+        ),
+    },
+}
+PROCESS_LOCAL_CACHE_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+if CACHES[CATALOGUE_CACHE_ALIAS]['BACKEND'] in PROCESS_LOCAL_CACHE_BACKENDS:
+    raise ImproperlyConfigured("The catalogue cache must be shared by all worker processes in production.")
+
+# The API authenticates every request with a JWT, so sessions, messages,
+# CSRF and the auth middleware only serve the admin site: without it (the
+# default) they are not loaded at all.
+ADMIN_ENABLED = os.environ.get('DJANGO_ADMIN_ENABLED') == '1'
+if not ADMIN_ENABLED:
+    ADMIN_ONLY_APPS = {
+        'django.contrib.admin',
+        'django.contrib.sessions',
+        'django.contrib.messages',
+        'django.contrib.staticfiles',
+    }
+    ADMIN_ONLY_MIDDLEWARE = {
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+    }
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in ADMIN_ONLY_APPS]
+    MIDDLEWARE = [middleware for middleware in MIDDLEWARE if middleware not in ADMIN_ONLY_MIDDLEWARE]
+    TEMPLATES = [{
+        **TEMPLATES[0],
+        'OPTIONS': {
+            **TEMPLATES[0]['OPTIONS'],
+            'context_processors': [
+                processor for processor in TEMPLATES[0]['OPTIONS']['context_processors']
+                if not processor.startswith('django.contrib.messages.')
+            ],
+        },
+    }]
+
+# No browsable API: skips template rendering on every response
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+}